@@ -1,19 +1,86 @@
-﻿from cardPack import Deck
-from helper import hand_index_check, money_check, split_check
+﻿from array import array
+
+import events
+from cardPack import Deck, round_seed
+from dealer import Dealer
+from hand import HandPool
+from helper import hand_index_check, money_failed, split_check
+
+# Error codes of BlackJack.apply_actions
+OK = 0
+UNKNOWN_PLAYER = 1
+INVALID_HAND = 2
+INSUFFICIENT_FUNDS = 3
+INVALID_AMOUNT = 4
+CANNOT_DOUBLE = 5
+CANNOT_SPLIT = 6
+HAND_BUSTED = 7
+DECK_EMPTY = 8
+UNKNOWN_ACTION = 9
+NO_ROOM = 10
+ERRORS = {
+    UNKNOWN_PLAYER: "unknown player",
+    INVALID_HAND: "invalid hand index",
+    INSUFFICIENT_FUNDS: "insufficient funds",
+    INVALID_AMOUNT: "bet amount must be greater than zero",
+    CANNOT_DOUBLE: "cannot double",
+    CANNOT_SPLIT: "cannot split",
+    HAND_BUSTED: "hand is busted",
+    DECK_EMPTY: "deck is empty",
+    UNKNOWN_ACTION: "unknown action",
+    NO_ROOM: "no room for another hand or card",
+}
 
 
 class BlackJack:
     """
     BlackJack class manages the core logic of a blackjack game.
     It handles players, the deck, and betting mechanics.
+    Everything that happens is reported as events on the table's bus
+    (events.default_bus prints them; pass events.EventBus() to run silent).
+
+    Seated players take the hands for their splits from the table's hand
+    pool and give them back when their hands are reset; pool_counters()
+    shows how well the pool is reused.
+
+    A table created with a ledger (ledger.Ledger) logs the balance changes
+    of every player it seats.
+
+    A table created with a history (history.HistoryWriter) records every hand
+    played, with its actions, when the round is ended with end_round.
+
+    A table created with a seed is replayable: every round starts from a
+    fresh shoe shuffled with round_seed(seed, round_number), so any round can
+    be rebuilt with BlackJack.replay.
     """
 
-    def __init__(self):
+    def __init__(self, num_decks=1, penetration=None, hit_soft_17=False, bus=None, seed=None, rng=None, deck=None,
+                 history=None, ledger=None):
         # Dictionary to store player objects, keyed by their ID
         self.players = {}
 
-        # Initialize a deck of cards
-        self.deck = Deck()
+        # Initialize a deck of cards (a multi-deck shoe if num_decks > 1), unless one is given
+        self.deck = deck if deck is not None else Deck(num_decks, penetration, rng)
+
+        # Replay seed and number of rounds started so far
+        self.seed = seed
+        self.round_number = 0
+
+        # The house hand; hits soft 17 if hit_soft_17 is set
+        self.dealer = Dealer(hit_soft_17=hit_soft_17, bus=bus)
+
+        # Event bus for table events
+        self.bus = bus if bus is not None else events.default_bus
+
+        # Hand history writer, and the actions of the current round: (player_id, hand_index) -> names
+        self.history = history
+        self.actions = {}
+
+        # Ledger the seated players log their balance changes to
+        self.ledger = ledger
+
+        # Retired hands reused for splits by the seated players
+        self.hand_pool = HandPool()
 
     def add_player(self, player):
         """
@@ -22,10 +89,14 @@ class BlackJack:
         :param player: Player object to add
         """
         if player.id in self.players:
-            print(f"Player {player.name} is already in the game.")
+            self.bus.emit(events.PLAYER_EXISTS, player_id=player.id, name=player.name)
         else:
             self.players[player.id] = player
-            print(f"Player {player.name} has been added to the game.")
+            player.pool = self.hand_pool
+            if self.ledger is not None:
+                player.ledger = self.ledger
+                player._record(0, "seat")
+            self.bus.emit(events.PLAYER_ADDED, player_id=player.id, name=player.name)
 
     def remove_player(self, player_id):
         """
@@ -34,24 +105,153 @@ class BlackJack:
         :param player_id: ID of the player to remove
         """
         if player_id in self.players:
-            del self.players[player_id]
-            print(f"Player with ID {player_id} has been removed.")
+            self.players.pop(player_id).pool = None
+            self.bus.emit(events.PLAYER_REMOVED, player_id=player_id)
         else:
-            print(f"No player with ID {player_id} found.")
+            self.bus.emit(events.PLAYER_NOT_FOUND, player_id=player_id)
 
     def start_game(self):
         """
-        Starts the game by shuffling the deck and dealing two cards to each hand of every player.
+        Starts the game by shuffling the deck and dealing two cards to each hand of every player,
+        then two to the dealer.
+        A shoe with a cut card is only reshuffled once the cut card has come out.
         """
-        self.deck.shuffle()
+        self.round_number += 1
+        self.actions = {}
+        if self.seed is not None:
+            self.deck.seed(round_seed(self.seed, self.round_number))
+            self.deck.reset()
+        elif self.deck.penetration is None:
+            self.deck.shuffle()
+        elif self.deck.cut_card_reached:
+            self.deck.reset()
 
         # Deal two cards to each player's initial hand
         for player in self.players.values():
-            for hand in player.hands:
+            for hand_index, hand in enumerate(player.hands):
                 hand.reset()  # Reset the hand to start fresh
-                player.draw_card(self.deck, 2, hand_index=player.hands.index(hand))
-                print(f"{player.name}'s Hand: {hand.cards} (Total: {hand.get_total()})")
+                player.draw_card(self.deck, 2, hand_index=hand_index)
+                if self.bus.enabled:
+                    self.bus.emit(events.HAND_DEALT, player_id=player.id, name=player.name,
+                                  cards=list(hand.cards), total=hand.get_total())
+
+        self.dealer.reset_hand()
+        self.dealer.draw_card(self.deck)
+        self.dealer.draw_card(self.deck)
+
+    @classmethod
+    def replay(cls, seed, round_number, **options):
+        """
+        Rebuilds a round of a seeded table. Seat the same players in the same
+        order; the next start_game then deals exactly the cards of that round.
+
+        :param seed: Seed of the original table
+        :param round_number: Round to rebuild (1 for the first)
+        :param options: Other BlackJack options of the original table
+        :return: BlackJack instance
+        """
+        game = cls(seed=seed, **options)
+        game.round_number = round_number - 1
+        return game
+
+    def snapshot(self):
+        """
+        Saves the whole table in the compact binary format of the snapshot module.
+
+        :return: bytes
+        """
+        from snapshot import snapshot
+        return snapshot(self)
+
+    @classmethod
+    def restore(cls, buf, bus=None):
+        """
+        Rebuilds a table from BlackJack.snapshot() output.
+
+        :param buf: bytes-like snapshot
+        :param bus: Event bus for the restored table and players
+        :return: BlackJack instance
+        """
+        from snapshot import restore
+        return restore(buf, bus, cls)
+
+    def settle(self, blackjack_payout=1.5):
+        """
+        Settles every hand against the dealer's final hand and ends the round.
+        A blackjack pays blackjack_payout (3:2 by default) unless the dealer
+        also has one; a bust loses; otherwise the higher total wins and equal
+        totals push. Doubled and split hands settle on their own bets.
+
+        All payouts are worked out first from the hands' running totals and
+        then paid to each player in one Player.settle call.
+
+        :param blackjack_payout: Payout for a player blackjack
+        :return: List of net amounts won, one per hand in table order
+        """
+        dealer = self.dealer.hand
+        dealer_blackjack = dealer.blackjack
+        dealer_busted = dealer.busted
+        dealer_total = dealer.hard_total + 10 if dealer.aces and dealer.hard_total <= 11 else dealer.hard_total
+
+        results = []
+        payouts = []
+        for player in self.players.values():
+            payout = 0
+            for hand in player.hands:
+                bet = hand.bet
+                if hand.blackjack:
+                    net = 0 if dealer_blackjack else bet * blackjack_payout
+                elif dealer_blackjack or hand.busted:
+                    net = -bet
+                else:
+                    hard = hand.hard_total
+                    total = hard + 10 if hand.aces and hard <= 11 else hard
+                    if dealer_busted or total > dealer_total:
+                        net = bet
+                    elif total == dealer_total:
+                        net = 0
+                    else:
+                        net = -bet
+                results.append(net)
+                payout += bet + net
+            payouts.append((player, payout))
+
+        # Payouts are never negative (the bets were taken when placed)
+        for player, payout in payouts:
+            player.settle(payout)
+        self.dealer.pay_money(sum(results))
+        self.end_round(results)
+        return results
+
+    def end_round(self, results):
+        """
+        Marks the current round as finished and settled. Writes its hands to
+        the table's history, if it keeps one.
+
+        :param results: Net amounts won, one per hand in table order
+        """
+        if self.history is not None:
+            self.history.record_round(self, results, self.actions)
+
+    def pool_counters(self):
+        """
+        Reuse counters of the table's hand pool.
+
+        :return: Dictionary as returned by HandPool.counters, per round played so far
+        """
+        return self.hand_pool.counters(self.round_number)
 
+    def _log(self, player_id, hand_index, action):
+        if self.history is not None:
+            self.actions.setdefault((player_id, hand_index), []).append(action)
+
+    def play_dealer(self):
+        """
+        Plays out the dealer's hand once the players are done.
+
+        :return: Final total of the dealer's hand
+        """
+        return self.dealer.deal_self(self.deck)
 
     def add_pot(self, player_id, bet_amount, hand_index =0):
         """
@@ -63,15 +263,18 @@ class BlackJack:
         """
         player = self.players[player_id]
 
-        if not money_check(bet_amount, player):
+        if not hand_index_check(hand_index, player, self.bus):
             return
 
-        if not hand_index_check(hand_index, player):
+        # Taking the money is the funds check, so a shared wallet cannot be drained in between
+        try:
+            player.add_money(-bet_amount, "bet")
+        except ValueError:
+            money_failed(player, self.bus)
             return
-
-        player.add_money(-bet_amount)
         player.hands[hand_index].bet = bet_amount
-        print(f"{player.name} placed a bet of {bet_amount}.")
+        self.bus.emit(events.BET_PLACED, player_id=player_id, name=player.name, amount=bet_amount,
+                      hand_index=hand_index)
 
     def double(self, player_id, hand_index=0):
         """
@@ -82,49 +285,172 @@ class BlackJack:
         """
         player = self.players[player_id]
 
-        if not money_check(player.hands[hand_index].bet, player):
+        if not hand_index_check(hand_index, player, self.bus):
             return
 
-        if not hand_index_check(hand_index, player):
-            return
+        if not self._double(player, hand_index):
+            money_failed(player, self.bus)
 
-        player.add_money(-player.hands[hand_index].bet)
+    def _double(self, player, hand_index):
+        """
+        Doubles a hand. Taking the money is the funds check, so another table
+        sharing the player's account cannot take it in between.
+
+        :return: False, with nothing changed, if the player cannot cover the bet
+        """
+        try:
+            player.add_money(-player.hands[hand_index].bet, "double")
+        except ValueError:
+            return False
+        self._log(player.id, hand_index, "double")
         player.hands[hand_index].bet *= 2
         player.draw_card(self.deck, 1, hand_index)
+        return True
 
     def split(self, player_id, hand_index=0):
-        player = self.players[player_id]
+        """
+        Splits a pair into two hands, each with the original bet, and draws
+        a second card to both.
 
-        if split_check(player, hand_index):
-            pass
+        :param hand_index: index of a hand
+        :param player_id: ID of the player
+        """
+        player = self.players[player_id]
 
-        if not money_check(player.hands[hand_index].bet, player):
+        if not hand_index_check(hand_index, player, self.bus):
             return
 
-        if not hand_index_check(hand_index, player):
+        if not split_check(player, hand_index, self.bus):
             return
 
-        player.add_money(-player.hands[hand_index].bet)
+        try:
+            if not self._split(player, hand_index):
+                money_failed(player, self.bus)
+        except IndexError:
+            self.bus.emit(events.CHECK_FAILED, check="split", player_id=player.id, message="no room for another hand")
 
-        new_hand = player.add_hand(player.hands[hand_index].bet)
+    def _split(self, player, hand_index):
+        """
+        Splits a hand. The new hand is taken before the money, and the money
+        the same way as in _double, so a failed split changes nothing.
 
+        :return: False, with nothing changed, if the player cannot cover the bet
+        :raises IndexError: With nothing changed, if the seat has no room for another hand
+        """
+        bet = player.hands[hand_index].bet
+        new_hand = player.add_hand(bet)
+        try:
+            player.add_money(-bet, "split")
+        except ValueError:
+            player.delete_hand(new_hand)
+            return False
+        self._log(player.id, hand_index, "split")
+
+        player.hands[hand_index].from_split = True
+        player.hands[new_hand].from_split = True
+
+        # Popping through the hand's card list keeps its totals in sync
         move_card = player.hands[hand_index].cards.pop(1)
         player.hands[new_hand].add_card(move_card)
 
         player.draw_card(self.deck, 1, hand_index)
-        player.draw_card(self.deck, 1, move_card)
+        player.draw_card(self.deck, 1, new_hand)
+        return True
+
+    def apply_actions(self, commands):
+        """
+        Applies a batch of player commands in order, without printing or
+        emitting check failures. Each command is checked against the table as
+        the earlier commands left it; a failed command changes nothing.
+
+        Actions are "bet" (sets the hand's bet to amount), "hit", "stay",
+        "double" and "split"; amount is ignored except for "bet".
+
+        :param commands: Sequence of (player_id, hand_index, action, amount) tuples
+        :return: array('b') with four entries per command: ok (1 or 0), error code
+                 (OK, UNKNOWN_PLAYER, ...; see ERRORS), hand total and busted flag
+        """
+        results = []
+        add = results.extend
+        players = self.players
+        deck = self.deck
+        for player_id, hand_index, action, amount in commands:
+            player = players.get(player_id)
+            if player is None:
+                add((0, UNKNOWN_PLAYER, 0, 0))
+                continue
+            hands = player.hands
+            if not 0 <= hand_index < len(hands):
+                add((0, INVALID_HAND, 0, 0))
+                continue
+            hand = hands[hand_index]
+            error = OK
+            try:
+                if action == "hit":
+                    if hand.busted:
+                        error = HAND_BUSTED
+                    elif not deck.remaining_cards():
+                        error = DECK_EMPTY
+                    else:
+                        self._log(player_id, hand_index, "hit")
+                        player.draw_card(deck, 1, hand_index)
+                elif action == "stay":
+                    self._log(player_id, hand_index, "stay")
+                elif action == "double":
+                    if len(hand.cards) != 2:
+                        error = CANNOT_DOUBLE
+                    elif not deck.remaining_cards():
+                        error = DECK_EMPTY
+                    elif not self._double(player, hand_index):
+                        error = INSUFFICIENT_FUNDS
+                elif action == "split":
+                    cards = hand.cards
+                    if len(cards) != 2 or cards[0].points != cards[1].points:
+                        error = CANNOT_SPLIT
+                    elif deck.remaining_cards() < 2:
+                        error = DECK_EMPTY
+                    elif not self._split(player, hand_index):
+                        error = INSUFFICIENT_FUNDS
+                elif action == "bet":
+                    if amount <= 0:
+                        error = INVALID_AMOUNT
+                    else:
+                        try:  # Taking the money is the funds check
+                            player.add_money(-amount, "bet")
+                            hand.bet = amount
+                        except ValueError:
+                            error = INSUFFICIENT_FUNDS
+                else:
+                    error = UNKNOWN_ACTION
+            except IndexError:  # A seat of a TableState has fixed hand and card slots
+                error = NO_ROOM
+            hard = hand.hard_total
+            add((not error, error, hard + 10 if hand.aces and hard <= 11 else hard, hand.busted))
+        return array("b", results)
 
     def hit(self, player_id, hand_index=0):
+        """
+        Draws one card to a hand. The hand's busted flag is updated as the card is added.
+
+        :param hand_index: index of a hand
+        :param player_id: ID of the player
+        """
+        self._log(player_id, hand_index, "hit")
         player = self.players[player_id]
         player.draw_card(self.deck, 1, hand_index)
-        if player.hands.is_busted:
-            player.hands.busted = True
+        return player.hands[hand_index].is_busted()
 
     def stay(self, player_id, hand_index=0):
-        player = self.players[player_id]
+        """
+        Ends play on a hand.
 
-        if player.hands.is_busted:
-            player.hands.busted = True
+        :param hand_index: index of a hand
+        :param player_id: ID of the player
+        :return: Final total of the hand
+        """
+        self._log(player_id, hand_index, "stay")
+        player = self.players[player_id]
+        return player.hands[hand_index].get_total()
 
     def sum_of_hands(self, player_id):
         """
@@ -1,9 +1,65 @@
-﻿import unittest
+﻿import asyncio
+import json
+import os
+import random
+import tempfile
+import unittest
 from cardPack import Deck
 from card import Card
 from player import Player
 from hand import Hand
 from BJack import BlackJack
+import BJack
+from dealer import Dealer, dealer_probabilities
+import numpy as np
+import simulator
+import runner
+import optimal
+from card import CARDS
+import events
+import bench
+import instrument
+from table_state import TableState
+from card import value_composition
+from counting import HI_LO, KO, OMEGA_II, CountSystem
+import server
+import loadtest
+import history
+import threading
+import strategy
+import io
+import signal
+import subprocess
+import sys
+import pipeline
+import bankroll
+import copy
+import pickle
+import time
+from ledger import Ledger
+from wallet import Wallet, WalletPlayer
+from rounds import play_round
+class TestCard(unittest.TestCase):
+
+    def test_flyweight_lookup(self):
+        """Tests that the constructor returns the shared card singleton."""
+        card = Card("10", "hearts")
+        self.assertIs(card, Card("10", "hearts"))
+        self.assertIs(card, Card.from_id(card.id))
+        self.assertEqual(card.points, 10)
+        self.assertFalse(card.is_ace)
+
+    def test_ace_values(self):
+        """Tests the precomputed ace value and flag."""
+        ace = Card("A", "spades")
+        self.assertEqual(ace.points, 11)
+        self.assertTrue(ace.is_ace)
+
+    def test_invalid_card(self):
+        """Tests that unknown cards are rejected."""
+        with self.assertRaises(ValueError):
+            Card("1", "hearts")
+
 class TestPlayer(unittest.TestCase):
 
     def setUp(self):
@@ -78,6 +134,56 @@ class TestHand(unittest.TestCase):
         self.hand.get_total()  # Update the busted state
         self.assertTrue(self.hand.is_busted())
 
+    def test_soft_state(self):
+        """Tests the running soft/hard state as cards are added and removed."""
+        self.hand.add_card(Card("A", "hearts"))
+        self.hand.add_card(Card("6", "spades"))
+        self.assertTrue(self.hand.is_soft())
+        self.assertEqual(self.hand.get_total(), 17)
+        self.hand.add_card(Card("9", "clubs"))
+        self.assertFalse(self.hand.is_soft())
+        self.assertEqual(self.hand.get_total(), 16)
+        self.hand.cards.pop()
+        self.assertTrue(self.hand.is_soft())
+        self.assertEqual(self.hand.hard_total, 7)
+        self.assertEqual(self.hand.aces, 1)
+
+    def test_blackjack_flag(self):
+        """Tests that only a two-card 21 outside a split is a blackjack."""
+        self.hand.add_card(Card("A", "hearts"))
+        self.hand.add_card(Card("K", "spades"))
+        self.assertTrue(self.hand.blackjack)
+        self.hand.add_card(Card("2", "clubs"))
+        self.assertFalse(self.hand.blackjack)
+        split_hand = Hand()
+        split_hand.from_split = True
+        split_hand.add_card(Card("A", "clubs"))
+        split_hand.add_card(Card("10", "clubs"))
+        self.assertFalse(split_hand.blackjack)
+
+    def test_removed_card_unbusts(self):
+        """Tests that removing cards recomputes the busted state."""
+        self.hand.cards = [Card("10", "hearts"), Card("K", "spades"), Card("2", "diamonds")]
+        self.assertTrue(self.hand.busted)
+        self.hand.cards.pop()
+        self.assertFalse(self.hand.busted)
+        self.hand.cards *= 2
+        self.assertEqual(self.hand.hard_total, 40)
+        self.assertTrue(self.hand.busted)
+
+    def test_pickle_and_deepcopy(self):
+        """Tests that a hand with cards survives pickling and deep copying."""
+        self.hand.from_split = True
+        self.hand.cards = [Card("A", "hearts"), Card("6", "spades")]
+        for copied in (pickle.loads(pickle.dumps(self.hand)), copy.deepcopy(self.hand)):
+            self.assertEqual([card.id for card in copied.cards], [card.id for card in self.hand.cards])
+            self.assertEqual((copied.bet, copied.get_total(), copied.soft, copied.from_split), (10, 17, True, True))
+            copied.add_card(Card("9", "clubs"))  # Still attached to the copy
+            self.assertEqual(copied.get_total(), 16)
+            self.assertEqual(self.hand.get_total(), 17)
+        cards = pickle.loads(pickle.dumps(self.hand.cards))
+        self.assertEqual(cards._hand.get_total(), 17)
+
     def test_reset(self):
         """Tests resetting the hand."""
         self.hand.cards = [Card("10", "hearts"), Card("5", "spades")]
@@ -98,6 +204,21 @@ class TestDeck(unittest.TestCase):
         self.deck.shuffle()
         self.assertNotEqual(initial_order, self.deck.cards)
 
+    def test_shuffle_matches_stdlib(self):
+        """Tests that a full deck is shuffled exactly like random.shuffle with the same seed."""
+        expected = list(range(52))
+        random.Random(5).shuffle(expected)
+        self.assertEqual([card.id for card in Deck(seed=5).cards], expected)
+
+    def test_set_cards(self):
+        """Tests that setting the cards replaces the undealt cards whatever their number."""
+        for count in (3, 60):
+            cards = [CARDS[card_id % 52] for card_id in range(count)]
+            self.deck.cards = cards
+            self.assertEqual(self.deck.remaining_cards(), count)
+            self.assertEqual(self.deck.cards, cards)
+            self.assertIs(self.deck.draw(), cards[-1])
+
     def test_draw(self):
         """Tests drawing a card from the deck."""
         initial_size = len(self.deck.cards)
@@ -120,6 +241,1299 @@ class TestDeck(unittest.TestCase):
         self.assertEqual(len(self.deck.cards), 52)
         self.assertEqual(len(self.deck.discard_pile), 0)
 
+class TestShoe(unittest.TestCase):
+
+    def setUp(self):
+        """Sets up a six-deck shoe with 75% penetration."""
+        self.shoe = Deck(num_decks=6, penetration=0.75)
+
+    def test_size(self):
+        """Tests that the shoe holds every deck."""
+        self.assertEqual(self.shoe.remaining_cards(), 312)
+        self.assertEqual(self.shoe.cards.count(Card("A", "spades")), 6)
+
+    def test_cut_card(self):
+        """Tests that the cut card comes out after the penetration is dealt."""
+        for _ in range(233):
+            self.shoe.draw()
+        self.assertFalse(self.shoe.cut_card_reached)
+        self.shoe.draw()
+        self.assertTrue(self.shoe.cut_card_reached)
+        self.shoe.reset()
+        self.assertFalse(self.shoe.cut_card_reached)
+        self.assertEqual(self.shoe.remaining_cards(), 312)
+
+    def test_no_cut_card(self):
+        """Tests that a deck without penetration reaches its cut card only when empty."""
+        deck = Deck()
+        for _ in range(51):
+            deck.draw()
+        self.assertFalse(deck.cut_card_reached)
+        deck.draw()
+        self.assertTrue(deck.cut_card_reached)
+
+    def test_reshuffle_between_rounds(self):
+        """Tests that start_game resets the shoe once the cut card is out."""
+        game = BlackJack(num_decks=6, penetration=0.75)
+        while not game.deck.cut_card_reached:
+            game.deck.draw()
+        game.start_game()
+        self.assertEqual(game.deck.remaining_cards(), 310 - 2 * len(game.players))
+
+class TestDealer(unittest.TestCase):
+
+    def test_soft_17_rule(self):
+        """Tests standing on soft 17 (S17) and hitting it (H17)."""
+        for hit_soft_17 in (False, True):
+            dealer = Dealer(hit_soft_17=hit_soft_17)
+            dealer.hand.add_card(Card("A", "hearts"))
+            dealer.hand.add_card(Card("6", "spades"))
+            self.assertEqual(dealer.must_hit(), hit_soft_17)
+
+    def test_deal_self(self):
+        """Tests that the dealer draws until reaching at least 17."""
+        dealer = Dealer()
+        deck = Deck()
+        dealer.deal_self(deck)
+        self.assertGreaterEqual(dealer.get_total(), 17)
+        self.assertFalse(dealer.must_hit())
+
+    def test_empty_deck(self):
+        """Tests that a used-up table without a cut card reports the empty deck instead of raising."""
+        sink = RecordingSink()
+        bus = events.EventBus(sink)
+        game = BlackJack(bus=bus)
+        for seat in range(7):
+            game.add_player(Player(name=f"S{seat}", saldo=100, bus=bus))
+        for _ in range(5):
+            for player in game.players.values():
+                player.reset_hands()
+            game.start_game()
+            game.play_dealer()
+            game.settle()
+        self.assertEqual(game.deck.remaining_cards(), 0)
+        self.assertIn(events.DECK_EMPTY, [event.kind for event in sink.events])
+        self.assertLess(len(game.dealer.hand.cards), 2)
+
+    def test_probabilities(self):
+        """Tests the exact dealer outcome probabilities."""
+        # Ten up with only an Ace and a ten left: blackjack or 20
+        self.assertEqual(dealer_probabilities(9, (1, 0, 0, 0, 0, 0, 0, 0, 0, 1)), (0, 0, 0, 0.5, 0, 0, 0.5))
+        full_deck = (4, 4, 4, 4, 3, 4, 4, 4, 4, 16)  # One deck less a 6 upcard
+        self.assertAlmostEqual(sum(dealer_probabilities(5, full_deck)), 1.0)
+        self.assertGreater(dealer_probabilities(5, full_deck)[5], 0.4)
+
+class TestOptimal(unittest.TestCase):
+
+    def deal(self, player_cards, dealer_cards):
+        """Sets up a table with the given cards dealt from a single deck."""
+        game = BlackJack()
+        player = Player(name="Bot", saldo=100)
+        game.add_player(player)
+        dealt = [Card(*name) for name in player_cards + dealer_cards]
+        game.deck.cards = [card for card in CARDS if card not in dealt]
+        player.hands[0].cards = dealt[:len(player_cards)]
+        game.dealer.hand.cards = dealt[len(player_cards):]
+        return game, player.id
+
+    def test_basic_decisions(self):
+        """Tests that the best actions agree with basic strategy."""
+        up = [("6", "clubs"), ("9", "clubs")]
+        cases = [
+            ([("10", "hearts"), ("K", "spades")], "stay"),
+            ([("6", "hearts"), ("5", "spades")], "double"),
+            ([("8", "hearts"), ("8", "spades")], "split"),
+            ([("A", "hearts"), ("A", "spades")], "split"),
+        ]
+        for cards, action in cases:
+            game, player_id = self.deal(cards, up)
+            self.assertEqual(optimal.best_action(game, player_id), action)
+        game, player_id = self.deal([("10", "hearts"), ("2", "spades")], [("10", "clubs"), ("9", "clubs")])
+        self.assertEqual(optimal.best_action(game, player_id), "hit")
+
+    def test_values(self):
+        """Tests the edge cases of the expected values."""
+        game, player_id = self.deal([("A", "hearts"), ("K", "spades")], [("6", "clubs"), ("9", "clubs")])
+        self.assertEqual(optimal.action_values(game, player_id), {"stay": 1.5})
+        game, player_id = self.deal([("7", "hearts"), ("5", "spades")], [("6", "clubs"), ("9", "clubs")])
+        values = optimal.action_values(game, player_id)
+        self.assertEqual(set(values), {"stay", "hit", "double"})
+        self.assertTrue(-1 <= values["hit"] <= 1)
+
+    def test_no_resplit(self):
+        """Tests that a pair made by a split is not offered another split."""
+        game, player_id = self.deal([("8", "hearts"), ("8", "spades")], [("6", "clubs"), ("9", "clubs")])
+        game.players[player_id].hands[0].from_split = True
+        values = optimal.action_values(game, player_id)
+        self.assertNotIn("split", values)
+        self.assertIn("double", values)
+
+class TestServer(unittest.TestCase):
+
+    def test_load_client(self):
+        """Tests that the load client plays every round on its own table."""
+        async def scenario():
+            game_server = server.GameServer()
+            host, port = await game_server.start()
+            report = await loadtest.run(host, port, clients=20, rounds=5)
+            await game_server.close()
+            return game_server, report
+        game_server, report = asyncio.run(scenario())
+        self.assertEqual(report["rounds"], 100)
+        self.assertEqual(len(game_server.tables), 20)
+        self.assertGreater(report["p99_ms"], 0)
+
+    def test_action_timeout(self):
+        """Tests that open hands are stayed once the action timeout passes."""
+        async def scenario():
+            game_server = server.GameServer(action_timeout=0.05)
+            host, port = await game_server.start()
+            reader, writer = await asyncio.open_connection(host, port)
+            writer.write(b'{"op": "join", "saldo": 100}\n{"op": "bet", "amount": 10}\n')
+            events = []
+            while not events or events[-1].get("event") != "round_over":
+                events.append(json.loads(await asyncio.wait_for(reader.readline(), 2)))
+            writer.close()
+            await game_server.close()
+            return events
+        events = asyncio.run(scenario())
+        self.assertEqual(events[-1]["event"], "round_over")
+
+    def start_round(self):
+        """Seats two players who bet 10 each and opens both their hands."""
+        table = server.Table("t1", 30.0)
+        table.game.deck.seed(4)
+        sessions = [Outbox(), Outbox()]
+        players = [table.seat(session, name, 100) for session, name in zip(sessions, ("Ann", "Bob"))]
+        for player in players:
+            table.bet(player.id, 10)
+        table.open_hands = {(player.id, 0) for player in players}
+        table.deadlines = {player.id: time.monotonic() + 30 for player in players}
+        return table, sessions, players
+
+    def test_leave_mid_round(self):
+        """Tests that a player leaving during a round is settled with it, then removed."""
+        table, sessions, (ann, bob) = self.start_round()
+        table.leave(ann.id)
+        self.assertTrue(table.in_round)
+        self.assertIn(ann.id, table.game.players)
+        table.act(bob.id, "stay", 0)
+        results = table.maybe_finish()
+        self.assertFalse(table.in_round)
+        self.assertNotIn(ann.id, table.game.players)
+        self.assertEqual(ann.saldo, 100 + results[ann.id][0])  # Stake returned with the net
+
+    def test_last_open_hand_leaves(self):
+        """Tests that the round finishes at once when the last open hand leaves."""
+        table, sessions, (ann, bob) = self.start_round()
+        table.act(bob.id, "stay", 0)
+        table.leave(ann.id)
+        self.assertFalse(table.in_round)
+        self.assertEqual(sessions[1].messages[-1]["event"], "round_over")
+
+    def test_deadline_per_player(self):
+        """Tests that only the player who did not act is timed out."""
+        table, sessions, (ann, bob) = self.start_round()
+        table.deadlines[ann.id] = 0
+        table.expire()
+        self.assertEqual(table.open_hands, {(bob.id, 0)})
+        self.assertEqual(sessions[0].messages[-1]["event"], "timeout")
+        self.assertNotEqual(sessions[1].messages[-1]["event"], "timeout")
+
+    def test_betting_deadline(self):
+        """Tests that a player who never bets is unseated and the round starts without them."""
+        table = server.Table("t1", 30.0)
+        sessions = [Outbox(), Outbox()]
+        ann, bob = [table.seat(session, name, 100) for session, name in zip(sessions, ("Ann", "Bob"))]
+        self.assertIsNone(table.deadline)
+        table.bet(ann.id, 10)
+        self.assertFalse(table.in_round)
+        self.assertEqual(table.deadline, table.betting_deadline)
+        table.expire(table.betting_deadline - 1)
+        self.assertIn(bob.id, table.game.players)
+        table.expire(table.betting_deadline + 1)
+        self.assertEqual(table.game.round_number, 1)
+        self.assertNotIn(bob.id, table.game.players)
+        self.assertEqual(sessions[1].messages[-1]["event"], "timeout")
+        self.assertIsNone(sessions[1].table)
+        self.assertIsNone(table.betting_deadline)
+
+class Outbox:
+    """Session stand-in that keeps the messages sent to it."""
+
+    def __init__(self):
+        self.messages = []
+
+    def send(self, message):
+        self.messages.append(message)
+
+class RecordingSink:
+    """Collects events for inspection."""
+
+    def __init__(self):
+        self.events = []
+
+    def handle(self, event):
+        self.events.append(event)
+
+    def close(self):
+        pass
+
+class TestEvents(unittest.TestCase):
+
+    def setUp(self):
+        """Sets up a table that records its events."""
+        self.sink = RecordingSink()
+        self.bus = events.EventBus(self.sink)
+        self.game = BlackJack(bus=self.bus)
+        self.player = Player(name="Eve", saldo=100, bus=self.bus)
+        self.game.add_player(self.player)
+
+    def test_typed_events(self):
+        """Tests that table actions are reported as events."""
+        self.game.start_game()
+        self.game.add_pot(self.player.id, 500)
+        self.game.add_pot(self.player.id, 10)
+        kinds = [event.kind for event in self.sink.events]
+        self.assertEqual(kinds[0], events.PLAYER_ADDED)
+        self.assertEqual(kinds.count(events.CARD_DEALT), 2)
+        self.assertIn(events.HAND_DEALT, kinds)
+        self.assertEqual(kinds[-2:], [events.CHECK_FAILED, events.BET_PLACED])
+        self.assertEqual(self.sink.events[-2].message(), "insufficient funds")
+        self.assertEqual(self.sink.events[-1].message(), "Eve placed a bet of 10.")
+
+    def test_silent_bus(self):
+        """Tests that a bus without real sinks is disabled."""
+        self.assertFalse(events.EventBus().enabled)
+        self.assertFalse(events.EventBus(events.NullSink()).enabled)
+        self.assertTrue(self.bus.enabled)
+
+    def test_jsonl_sink(self):
+        """Tests that the JSONL sink writes buffered events on flush."""
+        path = os.path.join(tempfile.mkdtemp(), "events.jsonl")
+        sink = events.JsonlSink(path, batch_size=100)
+        self.bus.subscribe(sink)
+        self.game.start_game()
+        self.assertEqual(os.path.getsize(path), 0)
+        sink.close()
+        with open(path, encoding="utf-8") as file:
+            records = [json.loads(line) for line in file]
+        self.assertEqual(records[0]["event"], events.CARD_DEALT)
+        self.assertEqual(len(records), 3)
+
+class TestBench(unittest.TestCase):
+
+    def test_run_and_compare(self):
+        """Tests a quick benchmark run and the regression check."""
+        report = bench.run(min_time=0.001, repeats=1, only="deck")
+        self.assertIn("deck_draw", report["results"])
+        self.assertNotIn("round_1_seats", report["results"])
+        baseline = {"results": {"deck_draw": {"ops_per_sec": report["results"]["deck_draw"]["ops_per_sec"] * 2}}}
+        changes = bench.compare(report, baseline, threshold=0.10)
+        self.assertTrue(changes["deck_draw"]["regression"])
+        self.assertEqual(list(changes), ["deck_draw"])
+
+class TestInstrument(unittest.TestCase):
+
+    def setUp(self):
+        """Sets up a silent table with one player."""
+        self.bus = events.EventBus()
+        self.game = BlackJack(bus=self.bus)
+        self.player = Player(name="Ida", saldo=1000, bus=self.bus)
+        self.game.add_player(self.player)
+
+    def tearDown(self):
+        instrument.disable()
+
+    def test_counts_and_export(self):
+        """Tests that timed calls are counted and exported."""
+        registry = instrument.Registry()
+        instrument.enable(registry)
+        self.game.start_game()
+        self.game.hit(self.player.id)
+        snapshot = registry.snapshot()
+        self.assertEqual(snapshot["BlackJack.start_game"]["count"], 1)
+        self.assertEqual(snapshot["BlackJack.hit"]["count"], 1)
+        self.assertEqual(snapshot["Deck.draw"]["count"], 5)
+        self.assertEqual(sum(snapshot["Deck.draw"]["buckets"].values()), 5)
+        text = registry.prometheus()
+        self.assertIn('blackjack_operation_seconds_count{operation="Deck.draw"} 5', text)
+
+    def test_disable_restores_methods(self):
+        """Tests that disabling puts the original methods back."""
+        original = BlackJack.hit
+        instrument.enable(instrument.Registry())
+        self.assertIsNot(BlackJack.hit, original)
+        instrument.disable()
+        self.assertIs(BlackJack.hit, original)
+
+    def test_single_table(self):
+        """Tests that enabling for one table leaves the other tables untimed."""
+        registry = instrument.Registry()
+        other = BlackJack(bus=self.bus)
+        instrument.enable(registry, game=self.game)
+        self.assertIs(type(other).hit, BlackJack.hit)
+        other.start_game()
+        self.assertFalse(any(histogram["count"] for histogram in registry.snapshot().values()))
+        self.game.start_game()
+        self.assertEqual(registry.snapshot()["Deck.draw"]["count"], 4)
+        instrument.disable()
+        self.assertNotIn("hit", vars(self.game))
+        self.assertNotIn("draw", vars(self.game.deck))
+
+    def test_profile_rounds(self):
+        """Tests profiling a number of rounds."""
+        stats = instrument.profile_rounds(self.game, 5)
+        self.assertGreater(stats.total_calls, 0)
+
+class TestTableState(unittest.TestCase):
+
+    def setUp(self):
+        """Sets up a table whose seats live in a TableState."""
+        self.bus = events.EventBus()
+        self.state = TableState(seats=3)
+        self.game = BlackJack(bus=self.bus)
+        self.seats = [self.state.add_seat(f"Seat {n}", 100, self.bus) for n in range(3)]
+        for seat in self.seats:
+            self.game.add_player(seat)
+
+    def test_game_flow_over_views(self):
+        """Tests the BlackJack flow over seat and hand views."""
+        self.game.start_game()
+        seat = self.seats[1]
+        self.game.add_pot(seat.id, 10)
+        self.assertEqual(seat.saldo, 90)
+        self.assertEqual(len(seat.hands[0].cards), 2)
+        self.game.hit(seat.id)
+        totals = self.state.totals()
+        for view in self.seats:
+            self.assertEqual(totals[view.hands[0].hand_id], view.hands[0].get_total())
+        self.assertEqual(self.game.sum_of_hands(seat.id), [seat.hands[0].get_total()])
+
+    def test_split_over_views(self):
+        """Tests splitting a pair stored in the arrays."""
+        seat = self.seats[0]
+        seat.hands[0].add_card(Card("8", "hearts"))
+        seat.hands[0].add_card(Card("8", "diamonds"))
+        seat.hands[0].bet = 10
+        self.game.split(seat.id)
+        self.assertEqual(len(seat.hands), 2)
+        self.assertEqual(seat.hands[1].cards[0], Card("8", "diamonds"))
+        self.assertEqual(len(seat.hands[1].cards), 2)
+        self.assertTrue(seat.hands[1].from_split)
+        self.assertEqual(seat.saldo, 90)
+        seat.delete_hand(0)
+        self.assertEqual(seat.hands[0].cards[0], Card("8", "diamonds"))
+
+    def test_deal(self):
+        """Tests dealing every seat straight into the arrays."""
+        deck = Deck()
+        self.state.deal(deck)
+        self.assertEqual(deck.remaining_cards(), 46)
+        for seat in self.seats:
+            self.assertEqual(len(seat.hands), 1)
+            self.assertEqual(len(seat.hands[0].cards), 2)
+
+    def test_money_and_slots(self):
+        """Tests that seats keep whole balances and reuse their hand slots for splits."""
+        seat = self.seats[0]
+        for _ in range(2):
+            self.state.deal(Deck())
+            seat.hands[0].cards.clear()
+            seat.hands[0].add_card(Card("8", "hearts"))
+            seat.hands[0].add_card(Card("8", "diamonds"))
+            seat.hands[0].bet = 10
+            self.game.split(seat.id)
+            self.assertEqual(self.state.seat_hands[0], 2)
+        self.assertEqual((seat.slots.hits, seat.slots.released), (2, 1))
+        self.assertEqual(seat.hands[1].hand_id, seat.hands[0].hand_id + 1)
+        seat.settle(25.5)
+        self.assertIsInstance(seat.saldo, int)
+        self.assertEqual(seat.saldo, 80 + 25)
+
+    def test_split_on_full_seat(self):
+        """Tests that a split with no free hand slot fails before any money or card is taken."""
+        state = TableState(seats=1, hands_per_seat=1, max_cards=3)
+        game = BlackJack(bus=self.bus)
+        seat = state.add_seat("Full", 100, self.bus)
+        game.add_player(seat)
+        seat.hands[0].add_card(Card("2", "hearts"))
+        seat.hands[0].add_card(Card("2", "diamonds"))
+        seat.hands[0].bet = 10
+        game.split(seat.id)
+        results = game.apply_actions([(seat.id, 0, "split", 0), (seat.id, 0, "hit", 0), (seat.id, 0, "hit", 0)])
+        self.assertEqual(list(results[1::4]), [BJack.NO_ROOM, BJack.OK, BJack.NO_ROOM])
+        self.assertEqual((seat.saldo, len(seat.hands), len(seat.hands[0].cards)), (100, 1, 3))
+        self.assertEqual(game.deck.remaining_cards(), 51)
+        self.assertEqual(state.seat_hands[0], 1)
+
+class TestDeckRandom(unittest.TestCase):
+
+    def test_seeded_decks(self):
+        """Tests that decks with the same seed shuffle alike, independently of each other."""
+        first, second = Deck(seed=11), Deck(seed=11)
+        Deck().shuffle()
+        self.assertEqual(first.cards, second.cards)
+        self.assertNotEqual(first.cards, Deck(seed=12).cards)
+
+    def test_numpy_generator(self):
+        """Tests shuffling with a numpy Generator."""
+        first = Deck(num_decks=2, rng=np.random.default_rng(5))
+        second = Deck(num_decks=2, rng=np.random.default_rng(5))
+        self.assertEqual(first.cards, second.cards)
+        self.assertEqual(sorted(card.id for card in first.cards), sorted(list(range(52)) * 2))
+
+    def test_prepared_shuffles(self):
+        """Tests that reset uses the shoe orders prepared in bulk."""
+        for rng in (np.random.default_rng(2), None):
+            deck = Deck(rng=rng, seed=2)
+            deck.prepare_shuffles(3)
+            orders = [list(order) for order in deck._prepared]
+            for order in orders:
+                deck.reset()
+                self.assertEqual([card.id for card in deck.cards], order)
+
+    def test_replay_round(self):
+        """Tests rebuilding a round from the seed and round number."""
+        bus = events.EventBus()
+
+        def table(game):
+            game.add_player(Player(name="Rey", saldo=100, bus=bus))
+            return game
+
+        game = table(BlackJack(seed=99, bus=bus))
+        for _ in range(3):
+            game.start_game()
+        dealt = [hand.cards[:] for player in game.players.values() for hand in player.hands]
+        replay = table(BlackJack.replay(99, 3, bus=bus))
+        replay.start_game()
+        self.assertEqual([hand.cards[:] for player in replay.players.values() for hand in player.hands], dealt)
+        self.assertEqual(replay.dealer.hand.cards[:], game.dealer.hand.cards[:])
+
+class TestDeckCounting(unittest.TestCase):
+
+    def setUp(self):
+        """Sets up a two-deck shoe tracking three counting systems."""
+        self.deck = Deck(num_decks=2, seed=4, count_systems=(HI_LO, KO, OMEGA_II))
+
+    def expected_count(self, system):
+        """Recomputes a running count from the cards left in the deck."""
+        left = sum(system.tags_by_id[card.id] for card in self.deck.cards)
+        return system.initial(2) + 2 * sum(system.tags_by_id) - left
+
+    def test_counts_follow_draws(self):
+        """Tests the running counts and composition as cards are drawn and returned."""
+        self.assertEqual(self.deck.running_count(KO), -4)
+        for _ in range(30):
+            self.deck.draw()
+        card = self.deck.draw()
+        self.deck.add_card(card)
+        for system in (HI_LO, KO, OMEGA_II):
+            self.assertEqual(self.deck.running_count(system), self.expected_count(system))
+        self.assertEqual(self.deck.composition(), value_composition(self.deck.cards))
+        self.assertEqual(sum(self.deck.rank_counts()), 74)
+        self.assertAlmostEqual(self.deck.true_count(HI_LO), self.deck.running_count(HI_LO) / (74 / 52))
+
+    def test_recycle_and_reset(self):
+        """Tests that returning every card brings the counts back to the start."""
+        for _ in range(50):
+            self.deck.draw()
+        self.deck.recycle_discard_pile()
+        self.assertEqual(self.deck.running_count(HI_LO), 0)
+        self.deck.draw()
+        self.deck.reset()
+        self.assertEqual(self.deck.running_count(OMEGA_II), 0)
+        self.assertEqual(self.deck.composition(), (8, 8, 8, 8, 8, 8, 8, 8, 8, 32))
+
+    def test_add_card_validation(self):
+        """Tests that a card cannot be added when all its copies are in the deck."""
+        with self.assertRaises(ValueError):
+            self.deck.add_card(Card("A", "spades"))
+
+class TestLazyDeck(unittest.TestCase):
+
+    def test_deals_like_eager_deck(self):
+        """Tests that a lazy deck deals the same cards as an eager deck on the same generator."""
+        eager = Deck(num_decks=2, rng=random.Random(4))
+        lazy = Deck(num_decks=2, rng=random.Random(4), lazy=True)
+        self.assertEqual([eager.draw() for _ in range(104)], [lazy.draw() for _ in range(104)])
+        self.assertEqual(eager.rng.getstate(), lazy.rng.getstate())
+
+        eager.reset()
+        lazy.reset()
+        dealt = [(eager.draw(), lazy.draw()) for _ in range(10)]
+        for first, second in dealt[:3]:
+            eager.add_card(first)
+            lazy.add_card(second)
+        self.assertEqual([eager.draw() for _ in range(60)], [lazy.draw() for _ in range(60)])
+        self.assertEqual(eager.cards, lazy.cards)  # Finishes the lazy shuffle
+        self.assertEqual(eager.rng.getstate(), lazy.rng.getstate())
+
+    def test_seeded_rounds_unchanged(self):
+        """Tests that seeded tables play the same rounds with a lazy deck."""
+        bus = events.EventBus()
+        results = []
+        for lazy in (False, True):
+            game = BlackJack(num_decks=6, bus=bus, seed=21, deck=Deck(num_decks=6, lazy=lazy))
+            game.add_player(Player(name="Lee", saldo=1000, bus=bus))
+            results.append([play_round(game) for _ in range(20)])
+        self.assertEqual(results[0], results[1])
+
+    def test_snapshot_keeps_lazy_state(self):
+        """Tests that a restored lazy table continues with the same cards."""
+        game = BlackJack(num_decks=1, bus=events.EventBus(), deck=Deck(rng=random.Random(2), lazy=True))
+        game.deck.draw()
+        restored = BlackJack.restore(game.snapshot())
+        self.assertTrue(restored.deck.lazy)
+        self.assertEqual([game.deck.draw() for _ in range(51)], [restored.deck.draw() for _ in range(51)])
+
+class TestSnapshot(unittest.TestCase):
+
+    def setUp(self):
+        """Sets up a table in the middle of a round."""
+        self.bus = events.EventBus()
+        self.game = BlackJack(num_decks=2, penetration=0.8, bus=self.bus, rng=random.Random(8))
+        self.player = Player(name="Sam", saldo=100, bus=self.bus)
+        self.game.add_player(self.player)
+        self.game.start_game()
+        self.game.add_pot(self.player.id, 25)
+        self.player.hands[0].cards = [Card("8", "hearts"), Card("8", "clubs")]
+        self.game.split(self.player.id)
+
+    def state(self, game):
+        """Everything a continuation depends on."""
+        return (
+            game.deck.cards, game.deck.discard_pile, game.round_number,
+            game.dealer.hand.cards[:],
+            [(p.id, p.name, p.saldo, [(h.cards[:], h.bet, h.busted, h.from_split) for h in p.hands])
+             for p in game.players.values()],
+        )
+
+    def test_round_trip(self):
+        """Tests that a restored table equals the original."""
+        buf = self.game.snapshot()
+        restored = BlackJack.restore(buf, bus=self.bus)
+        self.assertEqual(self.state(restored), self.state(self.game))
+        self.assertTrue(restored.players[self.player.id].hands[1].from_split)
+
+    def test_forks_continue_alike(self):
+        """Tests that forks of one snapshot play on identically and independently."""
+        buf = self.game.snapshot()
+        first, second = BlackJack.restore(buf, self.bus), BlackJack.restore(buf, self.bus)
+        for game in (first, second, self.game):
+            game.hit(self.player.id, 1)
+            game.deck.shuffle()
+        self.assertEqual(self.state(first), self.state(second))
+        self.assertEqual(self.state(first), self.state(self.game))
+        self.assertIsNot(first.players[self.player.id], second.players[self.player.id])
+
+    def test_rejects_garbage(self):
+        """Tests that other data is not loaded."""
+        with self.assertRaises(ValueError):
+            BlackJack.restore(b"nope" + bytes(40))
+        buf = bytearray(self.game.snapshot())
+        buf[4] += 1  # Another format version
+        with self.assertRaises(ValueError):
+            BlackJack.restore(bytes(buf))
+
+    def test_count_systems(self):
+        """Tests that tracked counting systems are restored with their running counts."""
+        self.game.deck.track(HI_LO)
+        self.game.deck.track(KO)
+        restored = BlackJack.restore(self.game.snapshot(), bus=self.bus)
+        self.assertEqual(self.state(restored), self.state(self.game))
+        for system in (HI_LO, KO):
+            self.assertEqual(restored.deck.running_count(system), self.game.deck.running_count(system))
+        self.game.deck.track(CountSystem("Custom", HI_LO.tags))
+        with self.assertRaises(ValueError):
+            self.game.snapshot()
+
+class TestHistory(unittest.TestCase):
+
+    def setUp(self):
+        """Sets up a table that keeps a hand history in a temporary directory."""
+        self.directory = tempfile.mkdtemp()
+        self.bus = events.EventBus()
+        self.writer = history.HistoryWriter(self.directory, batch_size=16)
+        self.game = BlackJack(num_decks=6, penetration=0.75, bus=self.bus, rng=random.Random(3),
+                              history=self.writer)
+        self.players = [Player(name=f"P{seat}", saldo=1000, bus=self.bus) for seat in range(3)]
+        for player in self.players:
+            self.game.add_player(player)
+
+    def test_rows_and_queries(self):
+        """Tests that every hand is recorded and the queries agree with the rounds played."""
+        results = []
+        for _ in range(50):
+            results.extend(play_round(self.game, bet=2))
+        self.writer.close()
+        reader = history.HistoryReader(self.directory, chunk_rows=7)
+        self.assertEqual(len(reader), len(results))
+        self.assertEqual(list(reader.columns["net"]), results)
+        self.assertEqual(reader.columns["round"][-1], 50)
+
+        by_player = reader.net_by_player()
+        for player in self.players:
+            self.assertEqual(by_player[player.id]["hands"], 50)
+            self.assertAlmostEqual(by_player[player.id]["net"], player.saldo - 1000)
+
+        by_upcard = reader.win_rate_by_upcard()
+        self.assertEqual(sum(row["hands"] for row in by_upcard.values()), len(results))
+        wins = sum(net > 0 for net in results)
+        self.assertAlmostEqual(sum(row["hands"] * row["win_rate"] for row in by_upcard.values()), wins)
+
+        by_total = reader.ev_by_start_total()
+        self.assertAlmostEqual(sum(row["ev"] * row["hands"] * 2 for row in by_total.values()), sum(results))
+
+    def test_append_after_torn_batch(self):
+        """Tests that a writer reopened after a torn batch appends rows aligned across the columns."""
+        results = []
+        for _ in range(10):
+            results.extend(play_round(self.game))
+        self.writer.close()
+        for name, extra in (("net", 16), ("round", 8), ("cards", 5)):  # Half-written columns of a crash
+            with open(os.path.join(self.directory, name + ".bin"), "ab") as file:
+                file.write(bytes(range(1, extra + 1)))
+        self.game.history = history.HistoryWriter(self.directory, batch_size=16)
+        for _ in range(10):
+            results.extend(play_round(self.game))
+        self.game.history.close()
+        reader = history.HistoryReader(self.directory)
+        self.assertEqual(len(reader), len(results))
+        self.assertEqual(list(reader.columns["net"]), results)
+        self.assertEqual(list(reader.columns["round"]), [number for number in range(1, 21) for _ in self.players])
+        self.assertTrue(np.all(reader.columns["cards"][:, 0] < len(CARDS)))
+
+    def test_actions_and_append(self):
+        """Tests that actions are recorded and a second writer appends."""
+        player = self.players[0]
+        self.game.start_game()
+        self.game.add_pot(player.id, 10)
+        self.game.hit(player.id)
+        self.game.stay(player.id)
+        self.game.end_round([0, 0, 0])
+        self.writer.close()
+        with history.HistoryWriter(self.directory) as writer:
+            self.game.history = writer
+            self.game.end_round([0, 0, 0])
+        reader = history.HistoryReader(self.directory)
+        self.assertEqual(len(reader), 6)
+        self.assertEqual(list(reader.columns["actions"][0][:3]), [history.ACTIONS["hit"], history.ACTIONS["stay"], 0])
+        self.assertEqual(reader.columns["outcome"][1], history.PUSH)
+
+    def test_failed_actions_and_no_upcard(self):
+        """Tests that failed doubles and splits are not recorded, and rounds without an upcard are skipped."""
+        player = self.players[0]
+        self.game.start_game()
+        self.game.add_pot(player.id, 600)
+        player.hands[0].cards = [Card("8", "hearts"), Card("8", "clubs")]
+        for action in (self.game._double, self.game._split):
+            self.assertFalse(action(player, 0))
+        self.game.dealer.reset_hand()
+        self.game.end_round([0, 0, 0])
+        self.writer.close()
+        reader = history.HistoryReader(self.directory)
+        self.assertEqual(reader.columns["actions"][0][0], 0)
+        self.assertEqual(reader.columns["upcard"][0], history.NO_CARD)
+        self.assertEqual(reader.win_rate_by_upcard(), {})
+
+class TestSettle(unittest.TestCase):
+
+    def setUp(self):
+        """Sets up a table with three players."""
+        self.bus = events.EventBus()
+        self.game = BlackJack(num_decks=6, bus=self.bus)
+        self.players = [Player(name=f"P{seat}", saldo=100, bus=self.bus) for seat in range(3)]
+        for player in self.players:
+            self.game.add_player(player)
+
+    def deal(self, player, hand_index, bet, *cards):
+        """Gives a hand fixed cards and a bet taken from the player."""
+        while len(player.hands) <= hand_index:
+            player.add_hand()
+        player.add_money(-bet)
+        player.hands[hand_index].bet = bet
+        player.hands[hand_index].cards = [Card(value, "hearts") for value in cards]
+
+    def test_payouts(self):
+        """Tests blackjack, win, push, bust, doubled and split hands against a dealer 19."""
+        first, second, third = self.players
+        self.game.dealer.hand.cards = [Card("10", "clubs"), Card("9", "clubs")]
+        self.deal(first, 0, 10, "A", "K")  # Blackjack pays 3:2
+        self.deal(second, 0, 20, "5", "6", "9")  # Doubled 20 wins
+        self.deal(third, 0, 10, "8", "J")  # Split hands: 18 loses
+        self.deal(third, 1, 10, "8", "A")  # 19 pushes
+        self.deal(third, 2, 10, "8", "6", "Q")  # 24 busts
+        third.hands[1].from_split = True
+        results = self.game.settle()
+        self.assertEqual(results, [15, 20, -10, 0, -10])
+        self.assertEqual([player.saldo for player in self.players], [115, 120, 80])
+        self.assertEqual(self.game.dealer.saldo, -15)
+
+    def test_dealer_blackjack_and_bust(self):
+        """Tests that a dealer blackjack beats 21 but pushes a blackjack, and that a bust player loses to a bust dealer."""
+        first, second, third = self.players
+        self.game.dealer.hand.cards = [Card("A", "clubs"), Card("K", "clubs")]
+        self.deal(first, 0, 10, "A", "Q")
+        self.deal(second, 0, 10, "7", "4", "K")
+        self.deal(third, 0, 10, "9", "2")
+        self.assertEqual(self.game.settle(), [0, -10, -10])
+        self.game.dealer.hand.cards = [Card("K", "clubs"), Card("6", "clubs"), Card("9", "clubs")]
+        self.deal(first, 0, 10, "K", "Q", "5")
+        self.deal(second, 0, 10, "2", "3")
+        self.deal(third, 0, 10, "A", "2")
+        self.assertEqual(self.game.settle(), [-10, 10, 10])
+
+    def test_played_rounds_balance(self):
+        """Tests that over played rounds settle pays every seat its hands' results and the dealer the rest."""
+        game = BlackJack(num_decks=6, penetration=0.75, bus=self.bus, rng=random.Random(11))
+        for seat in range(20):
+            game.add_player(Player(name=f"S{seat}", saldo=10 ** 6, bus=self.bus))
+        for _ in range(30):
+            before = {player.id: player.saldo for player in game.players.values()}
+            dealer_before = game.dealer.saldo
+            results = play_round(game, bet=4, stand_on=15)
+            hands = iter(results)
+            for player in game.players.values():
+                self.assertEqual(player.saldo - before[player.id], sum(next(hands) for _ in player.hands))
+            self.assertEqual(game.dealer.saldo - dealer_before, -sum(results))
+
+    def test_rounds_until_deck_empty(self):
+        """Tests that rounds on a table without a cut card finish once the deck runs out."""
+        game = BlackJack(bus=self.bus)
+        player = Player(name="Solo", saldo=1000, bus=self.bus)
+        game.add_player(player)
+        for _ in range(20):
+            play_round(game, stand_on=21)
+        self.assertEqual(game.deck.remaining_cards(), 0)
+        self.assertEqual(player.saldo + game.dealer.saldo, 1000)
+
+class TestWallet(unittest.TestCase):
+
+    def setUp(self):
+        """Sets up a wallet with one account."""
+        self.wallet = Wallet(stripes=4)
+        self.wallet.open("alice", 100)
+
+    def test_reserve_commit_release(self):
+        """Tests that reserved money is held, committed against a payout or released."""
+        self.assertTrue(self.wallet.reserve("alice", 60))
+        self.assertFalse(self.wallet.reserve("alice", 50))
+        self.assertEqual((self.wallet.balance("alice"), self.wallet.available("alice")), (100, 40))
+        self.wallet.commit("alice", 40, payout=80)
+        self.assertEqual((self.wallet.balance("alice"), self.wallet.available("alice")), (140, 120))
+        self.wallet.release("alice", 20)
+        self.assertEqual(self.wallet.available("alice"), 140)
+        with self.assertRaises(ValueError):
+            self.wallet.release("alice", 1)
+        with self.assertRaises(ValueError):
+            self.wallet.open("alice")
+
+    def test_seats_share_account(self):
+        """Tests that seats at two tables bet from the same account."""
+        bus = events.EventBus()
+        first, second = BlackJack(bus=bus), BlackJack(bus=bus)
+        seats = [WalletPlayer("Alice", self.wallet, "alice", bus) for _ in range(2)]
+        first.add_player(seats[0])
+        second.add_player(seats[1])
+        first.add_pot(seats[0].id, 70)
+        second.add_pot(seats[1].id, 70)  # Rejected: only 30 left
+        self.assertEqual(seats[1].hands[0].bet, 0)
+        self.assertEqual(seats[1].saldo, 30)
+        seats[0].reset_hands()  # Unsettled round: the bet is released
+        self.assertEqual(seats[1].saldo, 100)
+
+    def test_ids_unique_across_threads(self):
+        """Tests that players created on many threads get unique IDs."""
+        ids = []
+
+        def create():
+            ids.extend(Player("T", 0, events.EventBus()).id for _ in range(500))
+
+        threads = [threading.Thread(target=create) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(set(ids)), 4000)
+
+    def test_stress_tables_on_threads(self):
+        """Tests that many tables on many threads sharing accounts neither create nor lose money."""
+        wallet = Wallet(stripes=8)
+        accounts = [f"account {number}" for number in range(6)]
+        for account in accounts:
+            wallet.open(account, 1000)
+        bus = events.EventBus()
+        tables = []
+        for table_number in range(12):
+            game = BlackJack(num_decks=6, penetration=0.75, bus=bus, rng=random.Random(table_number))
+            for account in accounts[table_number % 3::2]:
+                game.add_player(WalletPlayer(account, wallet, account, bus))
+            tables.append(game)
+        errors = []
+
+        def play(game):
+            try:
+                for _ in range(150):
+                    for player in game.players.values():
+                        player.reset_hands()
+                    game.start_game()
+                    for player in game.players.values():
+                        game.add_pot(player.id, 10)
+                        if player.hands[0].get_total() in (10, 11):
+                            game.double(player.id)
+                    game.play_dealer()
+                    game.settle()
+            except Exception as error:  # Reported on the main thread
+                errors.append(error)
+
+        threads = [threading.Thread(target=play, args=(game,)) for game in tables]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        balance, reserved = wallet.total()
+        house = sum(game.dealer.saldo for game in tables)
+        self.assertEqual(reserved, 0)
+        self.assertEqual(balance + house, 1000 * len(accounts))
+
+    def test_drained_account_rejects_bets(self):
+        """Tests that tables racing for an almost empty account reject bets instead of raising."""
+        wallet = Wallet(stripes=1)
+        wallet.open("alice", 30)
+        sink = RecordingSink()
+        bus = events.EventBus(sink)
+        tables = []
+        for table_number in range(8):
+            game = BlackJack(num_decks=6, penetration=0.75, bus=bus, rng=random.Random(table_number))
+            game.add_player(WalletPlayer("Alice", wallet, "alice", bus))
+            tables.append(game)
+        errors = []
+
+        def play(game):
+            try:
+                for _ in range(100):
+                    for player in game.players.values():
+                        player.reset_hands()
+                    game.start_game()
+                    for player in game.players.values():
+                        game.add_pot(player.id, 10)
+                        game.double(player.id)
+                        self.assertGreaterEqual(wallet.available("alice"), 0)
+                    game.play_dealer()
+                    game.settle()
+            except Exception as error:  # Reported on the main thread
+                errors.append(error)
+
+        threads = [threading.Thread(target=play, args=(game,)) for game in tables]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertIn("money", [event.fields.get("check") for event in sink.events
+                                if event.kind == events.CHECK_FAILED])
+        balance, reserved = wallet.total()
+        house = sum(game.dealer.saldo for game in tables)
+        self.assertEqual(reserved, 0)
+        self.assertEqual(balance + house, 30)
+
+class TestStrategy(unittest.TestCase):
+
+    def setUp(self):
+        """Sets up the basic strategy preset."""
+        self.strategy = strategy.ChartStrategy.preset()
+
+    def hand(self, *values):
+        hand = Hand()
+        hand.cards = [Card(value, "spades") for value in values]
+        return hand
+
+    def test_strategy_is_abstract(self):
+        """Tests that a strategy must implement decide."""
+        with self.assertRaises(TypeError):
+            strategy.Strategy()
+        self.assertIsInstance(self.strategy, strategy.Strategy)
+
+    def test_basic_decisions(self):
+        """Tests a few well known basic strategy plays."""
+        decide = self.strategy.decide
+        self.assertEqual(decide(self.hand("10", "6"), Card("10", "clubs")), "hit")
+        self.assertEqual(decide(self.hand("10", "6"), Card("6", "clubs")), "stay")
+        self.assertEqual(decide(self.hand("6", "5"), Card("10", "clubs")), "double")
+        self.assertEqual(decide(self.hand("6", "5"), Card("A", "clubs")), "hit")
+        self.assertEqual(decide(self.hand("6", "5"), Card("10", "clubs"), can_double=False), "hit")
+        self.assertEqual(decide(self.hand("A", "7"), Card("4", "clubs"), can_double=False), "stay")
+        self.assertEqual(decide(self.hand("8", "8"), Card("10", "clubs"), can_split=True), "split")
+        self.assertEqual(decide(self.hand("8", "8"), Card("10", "clubs")), "hit")
+        self.assertEqual(decide(self.hand("A", "A"), Card("5", "clubs"), can_split=True), "split")
+        self.assertEqual(decide(self.hand("10", "2", "9"), Card("5", "clubs")), "stay")
+        hit_soft_17 = strategy.ChartStrategy.preset(hit_soft_17=True)
+        self.assertEqual(hit_soft_17.decide(self.hand("6", "5"), Card("A", "clubs")), "double")
+
+    def test_csv_and_deviations(self):
+        """Tests that a CSV chart loads like the preset and that deviations follow the true count."""
+        directory = tempfile.mkdtemp()
+        chart = os.path.join(directory, "chart.csv")
+        with open(chart, "w", encoding="utf-8") as file:
+            file.write(strategy.BASIC_S17)
+        self.assertEqual(strategy.ChartStrategy.from_csv(chart).tables, self.strategy.tables)
+
+        deviations = os.path.join(directory, "deviations.csv")
+        with open(deviations, "w", encoding="utf-8") as file:
+            file.write("# hand,upcard,index,code,direction\nH16,T,0,S,+\nH13,2,-1,H,-\n")
+        counted = strategy.ChartStrategy.from_csv(chart, deviations, HI_LO)
+        ten, two = Card("10", "clubs"), Card("2", "clubs")
+        self.assertEqual(counted.decide(self.hand("10", "6"), ten, true_count=-1.5), "hit")
+        self.assertEqual(counted.decide(self.hand("10", "6"), ten, true_count=0.2), "stay")
+        self.assertEqual(counted.decide(self.hand("10", "3"), two, true_count=-3), "hit")
+        self.assertEqual(counted.decide(self.hand("10", "3"), two, true_count=40), "stay")
+        preset = strategy.ChartStrategy.preset(deviations=strategy.ILLUSTRIOUS_18, count_system=HI_LO)
+        self.assertEqual(preset.decide(self.hand("10", "10"), Card("6", "clubs"), can_split=True, true_count=4),
+                         "split")
+
+    def test_autoplay(self):
+        """Tests that autoplay plays only strategy seats and keeps the money straight."""
+        bus = events.EventBus()
+        game = BlackJack(num_decks=6, penetration=0.75, bus=bus, rng=random.Random(5))
+        bots = [Player(name=f"Bot {seat}", saldo=1000, bus=bus, strategy=self.strategy) for seat in range(5)]
+        human = Player(name="Human", saldo=1000, bus=bus)
+        for player in bots + [human]:
+            game.add_player(player)
+        for _ in range(200):
+            for player in game.players.values():
+                player.reset_hands()
+            game.start_game()
+            for player in game.players.values():
+                game.add_pot(player.id, 10)
+            strategy.autoplay(game)
+            self.assertEqual(len(human.hands[0].cards), 2)
+            for bot in bots:
+                for hand in bot.hands:
+                    total = hand.get_total()
+                    self.assertTrue(total >= 12 or hand.busted or hand.bet == 20 or hand.from_split)
+            game.play_dealer()
+            game.settle()
+        total = sum(player.saldo for player in game.players.values())
+        self.assertEqual(total + game.dealer.saldo, 6000)
+
+    def test_autoplay_splits(self):
+        """Tests that a pair of eights is split into two played hands."""
+        bus = events.EventBus()
+        game = BlackJack(num_decks=6, bus=bus)
+        bot = Player(name="Bot", saldo=100, bus=bus, strategy=self.strategy)
+        game.add_player(bot)
+        game.start_game()
+        game.add_pot(bot.id, 10)
+        bot.hands[0].cards = [Card("8", "hearts"), Card("8", "clubs")]
+        game.dealer.hand.cards = [Card("6", "hearts"), Card("10", "clubs")]
+        strategy.autoplay(game)
+        self.assertGreaterEqual(len(bot.hands), 2)
+        self.assertTrue(all(hand.bet in (10, 20) for hand in bot.hands))
+
+    def test_autoplay_failed_actions(self):
+        """Tests that a split with no free hand slot and a hit on an empty shoe fall back instead of looping."""
+        bus = events.EventBus()
+        game = BlackJack(bus=bus)
+        seat = TableState(seats=1, hands_per_seat=1).add_seat("Bot", 100, bus)
+        seat.strategy = self.strategy
+        game.add_player(seat)
+        game.start_game()
+        game.add_pot(seat.id, 10)
+        hand = seat.hands[0]
+        hand.cards.clear()
+        hand.add_card(Card("8", "hearts"))
+        hand.add_card(Card("8", "clubs"))
+        game.dealer.hand.cards = [Card("6", "hearts"), Card("10", "clubs")]
+        strategy.autoplay(game)
+        self.assertEqual((len(seat.hands), seat.saldo, hand.get_total()), (1, 90, 16))  # Hard 16 stands on a 6
+
+        hand.cards.clear()
+        hand.add_card(Card("10", "hearts"))
+        hand.add_card(Card("2", "clubs"))
+        game.dealer.hand.cards = [Card("10", "hearts"), Card("7", "clubs")]
+        while game.deck.remaining_cards():
+            game.deck.draw()
+        strategy.autoplay(game)
+        self.assertEqual(seat.hands[0].get_total(), 12)
+
+class TestPipeline(unittest.TestCase):
+
+    def setUp(self):
+        """Sets up a silent table with two seats."""
+        self.bus = events.EventBus()
+        self.game = BlackJack(num_decks=6, penetration=0.75, bus=self.bus, rng=random.Random(9))
+        self.players = [Player(name=f"P{seat}", saldo=10 ** 6, bus=self.bus) for seat in range(2)]
+        for player in self.players:
+            self.game.add_player(player)
+
+    def test_stream_and_summary(self):
+        """Tests that records stream through the aggregators into CSV and add up."""
+        summary = pipeline.Summary()
+        out = io.StringIO()
+        records = pipeline.aggregate(pipeline.table_rounds(self.game, 40, bet=5), summary)
+        self.assertIsInstance(records, type(x for x in ()))
+        with pipeline.CsvWriter(out, flush_every=7) as writer:
+            for record in records:
+                writer.write(record)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(lines[0], "round,hands,wagered,net,dealer_total,dealer_cards")
+        self.assertEqual(len(lines), 41)
+        result = summary.result()
+        self.assertEqual(result["rounds"], 40)
+        self.assertEqual(result["net"], sum(player.saldo for player in self.players) - 2 * 10 ** 6)
+
+    def test_stop_event(self):
+        """Tests that an endless stream ends once its stop event is set."""
+        stop = threading.Event()
+        seen = 0
+        for record in pipeline.table_rounds(self.game, stop=stop):
+            seen += 1
+            if record["round"] == 5:
+                stop.set()
+        self.assertEqual(seen, 5)
+
+    def test_cli_interrupt(self):
+        """Tests that python -m BlackJack stops on SIGINT with complete, flushed output."""
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        process = subprocess.Popen([sys.executable, "-m", "BlackJack", "--rounds", "0", "--flush-every", "1"],
+                                   cwd=root, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        first = process.stdout.readline()
+        process.send_signal(signal.SIGINT)
+        # Through the same buffered stream: readline may already hold more lines
+        out = process.stdout.read()
+        err = process.stderr.read()
+        process.wait(timeout=30)
+        process.stdout.close()
+        process.stderr.close()
+        self.assertEqual(process.returncode, 130)
+        records = [json.loads(line) for line in (first + out).splitlines()]
+        summary = json.loads(err)
+        self.assertTrue(summary["interrupted"])
+        self.assertEqual(summary["rounds"], len(records))
+
+
+class TestBankroll(unittest.TestCase):
+
+    def test_online_stats_and_sketch(self):
+        """Tests the streaming estimators against NumPy on the whole data."""
+        values = np.random.default_rng(1).exponential(size=200_000)
+        stats, other = bankroll.OnlineStats(), bankroll.OnlineStats()
+        first, second = bankroll.QuantileSketch(seed=1), bankroll.QuantileSketch(seed=2)
+        for index, chunk in enumerate(np.array_split(values, 50)):
+            (stats if index % 2 else other).update(chunk)
+            (first if index % 2 else second).update(chunk)
+        stats.merge(other)
+        first.merge(second)
+        self.assertEqual(stats.count, len(values))
+        self.assertAlmostEqual(stats.mean, values.mean())
+        self.assertAlmostEqual(stats.variance, values.var(ddof=1))
+        self.assertEqual((stats.min, stats.max), (values.min(), values.max()))
+        self.assertEqual(first.count, len(values))
+        self.assertLess(sum(len(level) for level in first.levels), 2000)
+        for q in (0.05, 0.5, 0.95):
+            rank = np.mean(values <= first.quantile(q))
+            self.assertLess(abs(rank - q), 0.02)
+
+    def test_ruin_and_goal(self):
+        """Tests sessions on pools that always lose or always win."""
+        zeros = np.zeros(10, np.int8)
+        losing = bankroll.run_sessions((zeros, -np.ones(10)), 1000, bankroll=10, max_rounds=50, batch_size=300)
+        self.assertEqual((losing.sessions, losing.ruined), (1000, 1000))
+        self.assertEqual(losing.stats["rounds"].mean, 10)
+        self.assertEqual(losing.stats["drawdown"].max, 10)
+
+        winning = bankroll.run_sessions((zeros, np.ones(10)), 500, bankroll=10, max_rounds=50, win_goal=15,
+                                        spread={0: 1, 3: 4})
+        self.assertEqual((winning.ruined, winning.reached_goal), (0, 500))
+        self.assertEqual(winning.stats["rounds"].max, 5)
+        winning.merge(losing)
+        self.assertEqual(winning.as_dict()["risk_of_ruin"], 1000 / 1500)
+
+    def test_doubles_and_splits_capped(self):
+        """Tests that rounds losing several units cannot take a bankroll below zero."""
+        zeros = np.zeros(10, np.int8)
+        summary = bankroll.run_sessions((zeros, np.full(10, -4.0)), 200, bankroll=10, max_rounds=50)
+        self.assertEqual(summary.ruined, 200)
+        self.assertEqual((summary.stats["final"].min, summary.stats["final"].max), (0, 0))
+        self.assertEqual(summary.stats["rounds"].mean, 3)
+        self.assertEqual(summary.stats["drawdown"].max, 10)
+
+    def test_pool_and_spread(self):
+        """Tests that the round pool holds counts and results, and that the spread bets by count."""
+        counts, units = bankroll.round_pool(300, seed=4)
+        self.assertEqual((len(counts), len(units)), (300, 300))
+        self.assertTrue(np.all(units * 2 == np.round(units * 2)) and np.all(np.abs(units) <= 8))
+        bets = bankroll.bet_table({1: 1, 2: 2, 4: 8})
+        self.assertEqual([bets[count + bankroll.MAX_COUNT] for count in (-3, 1, 2, 3, 4, 9)], [1, 1, 2, 2, 8, 8])
+        summary = bankroll.run_sessions((counts, units), 2000, 50, 100, {1: 1, 2: 4}, seed=2)
+        self.assertEqual(summary.sessions, 2000)
+        self.assertEqual(set(summary.as_dict()["final"]["quantiles"]), {0.05, 0.25, 0.5, 0.75, 0.95})
+
+class TestApplyActions(unittest.TestCase):
+
+    def setUp(self):
+        """Sets up a dealt table that records its events."""
+        self.sink = RecordingSink()
+        self.bus = events.EventBus(self.sink)
+        self.game = BlackJack(num_decks=6, bus=self.bus, rng=random.Random(6))
+        self.player = Player(name="Max", saldo=100, bus=self.bus)
+        self.game.add_player(self.player)
+        self.game.start_game()
+
+    def test_batch(self):
+        """Tests that commands apply in order and report their results compactly."""
+        pid = self.player.id
+        hand = self.player.hands[0]
+        hand.cards = [Card("8", "hearts"), Card("8", "clubs")]
+        results = self.game.apply_actions([
+            (pid, 0, "bet", 30),
+            (pid, 0, "split", 0),
+            (pid, 1, "hit", 0),  # The hand made by the split
+            (pid, 0, "double", 0),
+            (pid, 0, "double", 0),  # No longer two cards
+            (pid, 0, "bet", 1000),
+            (pid, 5, "hit", 0),
+            (-1, 0, "hit", 0),
+            (pid, 0, "surrender", 0),
+        ])
+        rows = [tuple(results[index:index + 4]) for index in range(0, len(results), 4)]
+        self.assertEqual([row[:2] for row in rows], [
+            (1, BJack.OK), (1, BJack.OK), (1, BJack.OK), (1, BJack.OK), (0, BJack.CANNOT_DOUBLE),
+            (0, BJack.INSUFFICIENT_FUNDS), (0, BJack.INVALID_HAND), (0, BJack.UNKNOWN_PLAYER),
+            (0, BJack.UNKNOWN_ACTION),
+        ])
+        self.assertEqual(len(self.player.hands), 2)
+        self.assertEqual(len(self.player.hands[1].cards), 3)
+        self.assertEqual(rows[2][2:], (self.player.hands[1].get_total(), self.player.hands[1].busted))
+        self.assertEqual(rows[3][2], self.player.hands[0].get_total())
+        self.assertEqual(self.player.saldo, 100 - 30 - 30 - 30)
+        self.assertEqual(self.player.hands[0].bet, 60)
+        self.assertNotIn(events.CHECK_FAILED, [event.kind for event in self.sink.events])
+
+    def test_cannot_split_unpaired(self):
+        """Tests that a split of two different cards is refused and changes nothing."""
+        self.player.hands[0].cards = [Card("8", "hearts"), Card("9", "clubs")]
+        results = self.game.apply_actions([(self.player.id, 0, "split", 0)])
+        self.assertEqual(tuple(results[:2]), (0, BJack.CANNOT_SPLIT))
+        self.assertEqual(len(self.player.hands), 1)
+
+class TestPooling(unittest.TestCase):
+
+    def setUp(self):
+        """Sets up a silent table with one player."""
+        self.game = BlackJack(num_decks=6, bus=events.EventBus(), rng=random.Random(2))
+        self.player = Player(name="Max", saldo=1000, bus=self.game.bus)
+        self.game.add_player(self.player)
+
+    def split_pair(self):
+        self.game.start_game()
+        self.game.add_pot(self.player.id, 10)
+        self.player.hands[0].cards = [Card("8", "hearts"), Card("8", "clubs")]
+        self.game.split(self.player.id, 0)
+
+    def test_split_hands_reused(self):
+        """Tests that hands retired by reset_hands are reused by the next split."""
+        self.split_pair()
+        split_hand = self.player.hands[1]
+        self.player.reset_hands()
+        self.assertEqual(split_hand.cards, [])
+        self.split_pair()
+        self.assertIs(self.player.hands[1], split_hand)
+        self.assertEqual(split_hand.bet, 10)
+        self.assertTrue(split_hand.from_split)
+        self.assertEqual(len(split_hand.cards), 2)
+        counters = self.game.pool_counters()
+        self.assertEqual((counters["hits"], counters["misses"], counters["released"]), (1, 1, 1))
+        self.assertEqual(counters["hit_rate"], 0.5)
+        self.assertEqual(counters["avoided_per_round"], 0.5)
+
+    def test_removed_player_leaves_pool(self):
+        """Tests that a player removed from the table no longer uses its pool."""
+        self.game.remove_player(self.player.id)
+        self.player.add_hand()
+        self.player.reset_hands()
+        self.assertEqual(self.game.pool_counters()["released"], 0)
+
+    def test_runner_reuses_table(self):
+        """Tests that a reused runner table plays a chunk exactly like a new one."""
+        runner._tables.clear()
+        fresh = runner.run_chunk(300, 11, {})
+        reused = runner.run_chunk(300, 11, {})
+        self.assertEqual(len(runner._tables), 1)
+        self.assertEqual(fresh.as_dict(), reused.as_dict())
+
+class TestLedger(unittest.TestCase):
+
+    def setUp(self):
+        """Sets up a ledger in a temporary directory."""
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "bankroll.db")
+        self.ledger = Ledger(self.path, flush_interval=0.01, batch_size=4)
+
+    def tearDown(self):
+        self.ledger.close()
+        self.directory.cleanup()
+
+    def test_recover_after_restart(self):
+        """Tests that players are rebuilt with their balances after the ledger is reopened."""
+        bus = events.EventBus()
+        game = BlackJack(num_decks=6, bus=bus, rng=random.Random(8), ledger=self.ledger)
+        players = [Player(f"Seat {seat}", 500, bus) for seat in range(3)]
+        for player in players:
+            game.add_player(player)
+        for _ in range(20):
+            play_round(game, 5)
+        self.ledger.close()
+
+        self.ledger = Ledger(self.path)
+        recovered = self.ledger.players(bus)
+        self.assertEqual({player_id: (player.name, player.saldo) for player_id, player in recovered.items()},
+                         {player.id: (player.name, player.saldo) for player in players})
+        reasons = {reason for _, _, reason in self.ledger.changes(players[0].id)}
+        self.assertTrue({"seat", "bet", "settle"} <= reasons)
+
+        player = recovered[players[0].id]
+        player.add_money(-5)  # Recovered players keep logging
+        self.assertEqual(self.ledger.players()[player.id].saldo, player.saldo)
+
+    def test_double_and_split_logged(self):
+        """Tests that doubles and splits are logged with the balance after them."""
+        game = BlackJack(num_decks=6, bus=events.EventBus(), rng=random.Random(3), ledger=self.ledger)
+        player = Player("Max", 100, game.bus)
+        game.add_player(player)
+        game.start_game()
+        game.add_pot(player.id, 10)
+        player.hands[0].cards = [Card("8", "hearts"), Card("8", "clubs")]
+        game.split(player.id, 0)
+        game.double(player.id, 1)
+        self.assertEqual(self.ledger.changes(player.id), [
+            (0, 100, "seat"), (-10, 90, "bet"), (-10, 80, "split"), (-10, 70, "double"),
+        ])
+
+    def test_seat_views_and_wallet_seats(self):
+        """Tests that rebuilt balances match live SeatView and WalletPlayer balances."""
+        bus = events.EventBus()
+        state = TableState(seats=2)
+        wallet = Wallet()
+        wallet.open("alice", 1000)
+        games = [BlackJack(num_decks=6, bus=bus, rng=random.Random(seed), ledger=self.ledger) for seed in (1, 2)]
+        seats = [state.add_seat(f"Seat {n}", 500, bus) for n in range(2)]
+        for seat in seats:
+            games[0].add_player(seat)
+        for game in games:
+            game.add_player(WalletPlayer("Alice", wallet, "alice", bus))
+        for _ in range(15):
+            for game in games:
+                play_round(game, 10)
+
+        recovered = self.ledger.players()
+        self.assertEqual([recovered[seat.id].saldo for seat in seats], [seat.saldo for seat in seats])
+        self.assertEqual(self.ledger.accounts(), {"alice": wallet.balance("alice")})
+        self.assertEqual(self.ledger.wallet().available("alice"), wallet.balance("alice"))
+        self.assertEqual(len(recovered), 2)  # Wallet seats are kept by account, not by seat
+
 class TestBlackJack(unittest.TestCase):
     def setUp(self):
         """Sets up the test environment."""
@@ -210,5 +1624,74 @@ class TestBlackJack(unittest.TestCase):
         totals = self.game.sum_of_hands(player_id=1)
         self.assertEqual(totals, [21])
 
+class TestSimulator(unittest.TestCase):
+
+    def play_scalar(self, shoe_row, stand_on):
+        """Plays the same round one call at a time through BlackJack."""
+        game = BlackJack()
+        player = Player(name="Sim", saldo=10)
+        game.add_player(player)
+        game.deck.cards = [Card.from_id(int(card_id)) for card_id in shoe_row]
+        game.add_pot(player.id, 1)
+        player.draw_card(game.deck, 2)
+        game.dealer.draw_card(game.deck)
+        game.dealer.draw_card(game.deck)
+        dealer = game.dealer.hand
+        hand = player.hands[0]
+        if not hand.blackjack:
+            while hand.get_total() < stand_on:
+                game.hit(player.id)
+        game.play_dealer()
+        if hand.blackjack:
+            return 0 if dealer.blackjack else 1.5
+        if dealer.blackjack or hand.is_busted():
+            return -1
+        if dealer.is_busted() or hand.get_total() > dealer.get_total():
+            return 1
+        return 0 if hand.get_total() == dealer.get_total() else -1
+
+    def test_matches_scalar_rules(self):
+        """Tests that batch results match BlackJack played on the same shoes."""
+        shoes = simulator.shuffled_shoes(np.random.default_rng(7), 300)
+        net = simulator.simulate_batch(shoes, stand_on=15)
+        expected = [self.play_scalar(row, 15) for row in shoes]
+        self.assertEqual(list(net), expected)
+
+    def test_simulate_summary(self):
+        """Tests that the summary adds up and is reproducible for a seed."""
+        first = simulator.simulate(5000, seed=3, batch_size=1500)
+        self.assertEqual(first["wins"] + first["losses"] + first["pushes"], 5000)
+        self.assertEqual(first, simulator.simulate(5000, seed=3, batch_size=1500))
+
+class TestRunner(unittest.TestCase):
+
+    def test_reproducible_across_worker_counts(self):
+        """Tests that results only depend on the seed and chunk size."""
+        one = runner.run(600, seed=5, workers=1, chunk_size=150)
+        three = runner.run(600, seed=5, workers=3, chunk_size=150)
+        self.assertEqual(one.as_dict(), three.as_dict())
+        self.assertEqual(one.wins + one.losses + one.pushes, 600)
+
+    def test_progress_callback(self):
+        """Tests that progress is reported after every chunk."""
+        calls = []
+        runner.run(250, seed=1, workers=2, chunk_size=100, progress=lambda done, total: calls.append(done))
+        self.assertEqual(calls, [100, 200, 250])
+
+    def test_stats_merge(self):
+        """Tests that merged statistics equal statistics over all results."""
+        results = [1, -1, 0, 1.5, -2, 1, -1]
+        merged, left, right = runner.Stats(), runner.Stats(), runner.Stats()
+        for result in results:
+            merged.add(result)
+        for result in results[:3]:
+            left.add(result)
+        for result in results[3:]:
+            right.add(result)
+        left.merge(right)
+        self.assertEqual(left.wins, merged.wins)
+        self.assertAlmostEqual(left.mean, merged.mean)
+        self.assertAlmostEqual(left.variance, merged.variance)
+
 if __name__ == "__main__":
     unittest.main()
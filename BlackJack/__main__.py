@@ -0,0 +1,16 @@
+﻿"""
+Entry point for python -m BlackJack: runs the headless simulator (see
+simulate.py). The modules import each other flat, so this puts the package
+directory (and the repository root, for helper.py) on sys.path first.
+"""
+import os
+import sys
+
+_here = os.path.dirname(os.path.abspath(__file__))
+for _path in (os.path.dirname(_here), _here):
+    if _path not in sys.path:
+        sys.path.insert(0, _path)
+
+from simulate import main  # noqa: E402
+
+sys.exit(main())
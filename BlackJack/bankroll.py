@@ -0,0 +1,290 @@
+﻿"""
+Bankroll trajectories and risk of ruin, vectorized across sessions.
+
+round_pool() plays rounds at a real table (basic strategy, Hi-Lo count
+kept on the shoe) and records each round's true count and net result per
+unit bet, splits and doubles included. run_sessions() then plays many
+sessions at once with NumPy: every round each open session draws a round
+from the pool, bets by the true count under a bet spread and wins or loses
+that many units. Rounds are drawn independently, so streaks within one shoe
+are not reproduced.
+
+Doubles and splits can lose several units per unit bet, so every bet is
+capped to keep the pool's worst round from taking the bankroll below zero:
+a session short of that money bets less, as a player who cannot cover a
+double or split in full would.
+
+A session ends when it is ruined (bankroll below the smallest bet), reaches
+the win goal or has played max_rounds. Finished sessions go straight into a
+SessionSummary of streaming estimators (OnlineStats, QuantileSketch and
+ruin counters), so memory stays the same however many sessions run, and
+summaries of separate runs can be merged.
+"""
+import math
+
+import numpy as np
+
+from BJack import BlackJack
+from cardPack import Deck
+from counting import HI_LO
+from events import EventBus
+from player import Player
+from rounds import play_round
+from strategy import ChartStrategy
+
+MAX_COUNT = 20  # True counts are clipped to +-MAX_COUNT
+
+
+class OnlineStats:
+    """
+    Mergeable count, mean, variance, minimum and maximum, updated with
+    whole arrays at a time (Chan et al. parallel update).
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def _combine(self, count, mean, m2, low, high):
+        total = self.count + count
+        delta = mean - self.mean
+        self.m2 += m2 + delta * delta * self.count * count / total
+        self.mean += delta * count / total
+        self.count = total
+        self.min = min(self.min, low)
+        self.max = max(self.max, high)
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64).ravel()
+        if values.size:
+            mean = values.mean()
+            self._combine(values.size, mean, float(((values - mean) ** 2).sum()), values.min(), values.max())
+
+    def merge(self, other):
+        if other.count:
+            self._combine(other.count, other.mean, other.m2, other.min, other.max)
+
+    @property
+    def variance(self):
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    def as_dict(self):
+        return {
+            "count": self.count,
+            "mean": self.mean,
+            "stdev": math.sqrt(self.variance),
+            "min": self.min if self.count else None,
+            "max": self.max if self.count else None,
+        }
+
+
+class QuantileSketch:
+    """
+    Mergeable KLL quantile sketch. Keeps O(k log(n / k)) values; rank error
+    is around 1.7 / k.
+
+    :param k: Accuracy parameter (capacity of the top level)
+    :param seed: Seed for the compaction coin flips
+    """
+
+    def __init__(self, k=200, seed=None):
+        self.k = k
+        self.rng = np.random.default_rng(seed)
+        self.levels = [np.empty(0)]
+        self.count = 0
+
+    def _capacity(self, level):
+        depth = len(self.levels) - level - 1
+        return max(2, int(math.ceil(self.k * (2 / 3) ** depth)))
+
+    def _compress(self):
+        level = 0
+        while level < len(self.levels):
+            items = self.levels[level]
+            if len(items) > self._capacity(level):
+                if level + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                items = np.sort(items)
+                # An odd item out stays; every other of the rest moves up with double weight
+                odd = len(items) % 2
+                promoted = items[odd + self.rng.integers(2)::2]
+                self.levels[level] = items[:odd]
+                self.levels[level + 1] = np.concatenate((self.levels[level + 1], promoted))
+                level = 0  # Capacities shrink as levels are added
+                continue
+            level += 1
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64).ravel()
+        if values.size:
+            self.count += values.size
+            self.levels[0] = np.concatenate((self.levels[0], values))
+            self._compress()
+
+    def merge(self, other):
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for level, items in enumerate(other.levels):
+            self.levels[level] = np.concatenate((self.levels[level], items))
+        self.count += other.count
+        self._compress()
+
+    def quantile(self, q):
+        """
+        Estimated q-quantile (q may be an array).
+        """
+        items = np.concatenate(self.levels)
+        if not items.size:
+            return math.nan
+        weights = np.concatenate([np.full(len(items), 2.0 ** level) for level, items in enumerate(self.levels)])
+        order = np.argsort(items)
+        cumulative = np.cumsum(weights[order])
+        ranks = np.asarray(q) * cumulative[-1]
+        index = np.minimum(np.searchsorted(cumulative, ranks, side="left"), len(items) - 1)
+        return items[order][index]
+
+
+class SessionSummary:
+    """
+    Streaming summary of finished sessions: ruin and win-goal counters, and
+    OnlineStats plus a QuantileSketch of the final bankroll, session length
+    (rounds) and maximum drawdown.
+    """
+    METRICS = ("final", "rounds", "drawdown")
+
+    def __init__(self, k=200, seed=None):
+        self.sessions = 0
+        self.ruined = 0
+        self.reached_goal = 0
+        self.stats = {metric: OnlineStats() for metric in self.METRICS}
+        self.sketches = {metric: QuantileSketch(k, seed) for metric in self.METRICS}
+
+    def add(self, final, rounds, drawdown, ruined, reached_goal):
+        """
+        Records a group of finished sessions (arrays of equal length).
+        """
+        self.sessions += len(final)
+        self.ruined += int(np.count_nonzero(ruined))
+        self.reached_goal += int(np.count_nonzero(reached_goal))
+        for metric, values in zip(self.METRICS, (final, rounds, drawdown)):
+            self.stats[metric].update(values)
+            self.sketches[metric].update(values)
+
+    def merge(self, other):
+        self.sessions += other.sessions
+        self.ruined += other.ruined
+        self.reached_goal += other.reached_goal
+        for metric in self.METRICS:
+            self.stats[metric].merge(other.stats[metric])
+            self.sketches[metric].merge(other.sketches[metric])
+
+    def as_dict(self, quantiles=(0.05, 0.25, 0.5, 0.75, 0.95)):
+        """
+        :return: Dictionary with sessions, risk_of_ruin, goal_rate and per metric
+                 the OnlineStats fields plus the requested quantiles
+        """
+        result = {
+            "sessions": self.sessions,
+            "risk_of_ruin": self.ruined / self.sessions if self.sessions else 0.0,
+            "goal_rate": self.reached_goal / self.sessions if self.sessions else 0.0,
+        }
+        for metric in self.METRICS:
+            values = self.sketches[metric].quantile(quantiles)
+            result[metric] = dict(self.stats[metric].as_dict(),
+                                  quantiles={q: float(value) for q, value in zip(quantiles, np.atleast_1d(values))})
+        return result
+
+
+def round_pool(rounds, num_decks=6, penetration=0.75, hit_soft_17=False, blackjack_payout=1.5, seed=None):
+    """
+    Plays rounds with one basic-strategy seat and records the Hi-Lo true
+    count each round was dealt at and its net result per unit bet.
+
+    :param rounds: Number of rounds to record
+    :return: Tuple of (int8 true counts, float64 net units) arrays
+    """
+    bus = EventBus()
+    deck = Deck(num_decks, penetration, seed=seed, count_systems=(HI_LO,))
+    game = BlackJack(num_decks, penetration, hit_soft_17, bus, deck=deck)
+    game.add_player(Player("Pool", 10 ** 12, bus, ChartStrategy.preset(hit_soft_17)))
+    true_counts = np.empty(rounds, dtype=np.int8)
+    units = np.empty(rounds)
+    for index in range(rounds):
+        # A shoe at the cut card is reshuffled before the deal
+        true_count = 0 if deck.cut_card_reached else deck.true_count(HI_LO)
+        true_counts[index] = max(-MAX_COUNT, min(MAX_COUNT, int(true_count)))
+        units[index] = sum(play_round(game, 1, blackjack_payout=blackjack_payout))
+    return true_counts, units
+
+
+def bet_table(spread=None):
+    """
+    Bet in units per true count from -MAX_COUNT to MAX_COUNT.
+
+    :param spread: Dictionary of true count -> units bet at that count and above;
+                   counts below the lowest key bet its units. None bets 1 unit flat.
+    :return: float64 array indexed by true count + MAX_COUNT
+    """
+    if not spread:
+        return np.ones(2 * MAX_COUNT + 1)
+    counts = sorted(spread)
+    bets = np.full(2 * MAX_COUNT + 1, float(spread[counts[0]]))
+    for count in counts:
+        bets[max(count, -MAX_COUNT) + MAX_COUNT:] = spread[count]
+    return bets
+
+
+def run_sessions(pool, sessions, bankroll, max_rounds, spread=None, win_goal=None, batch_size=100_000,
+                 seed=None, summary=None):
+    """
+    Plays sessions vectorized across a batch at a time.
+
+    :param pool: (true counts, net units) arrays as returned by round_pool
+    :param sessions: Number of sessions
+    :param bankroll: Starting bankroll in units
+    :param max_rounds: Most rounds per session
+    :param spread: Bet spread, see bet_table
+    :param win_goal: Optional bankroll at which a session stops as won
+    :param batch_size: Sessions played side by side
+    :param seed: Seed for the round draws
+    :param summary: SessionSummary to add to (a new one if None)
+    :return: SessionSummary
+    """
+    true_counts, units = pool
+    bet_by_round = bet_table(spread)[true_counts.astype(np.intp) + MAX_COUNT]
+    min_bet = bet_table(spread).min()
+    worst_loss = max(1.0, -float(units.min()))  # Units lost per unit bet in the pool's worst round
+    rng = np.random.default_rng(seed)
+    summary = summary if summary is not None else SessionSummary(seed=seed)
+    goal = math.inf if win_goal is None else win_goal
+
+    remaining = sessions
+    while remaining:
+        size = min(batch_size, remaining)
+        remaining -= size
+        bank = np.full(size, float(bankroll))
+        peak = bank.copy()
+        drawdown = np.zeros(size)
+        for played in range(1, max_rounds + 1):
+            picks = rng.integers(len(units), size=len(bank))
+            bank += np.minimum(bet_by_round[picks], bank / worst_loss) * units[picks]
+            np.maximum(bank, 0, out=bank)  # Rounding only
+            np.maximum(peak, bank, out=peak)
+            np.maximum(drawdown, peak - bank, out=drawdown)
+            ruined = bank < min_bet
+            won = bank >= goal
+            done = ruined | won
+            if done.any():
+                summary.add(bank[done], np.full(np.count_nonzero(done), played), drawdown[done],
+                            ruined[done], won[done])
+                keep = ~done
+                bank, peak, drawdown = bank[keep], peak[keep], drawdown[keep]
+                if not len(bank):
+                    break
+        if len(bank):
+            summary.add(bank, np.full(len(bank), max_rounds), drawdown, np.zeros(len(bank), bool),
+                        np.zeros(len(bank), bool))
+    return summary
@@ -0,0 +1,197 @@
+﻿"""
+Benchmark suite for the deck, hand, player and full-round hot paths.
+
+    python bench.py                          # run and print JSON
+    python bench.py --output baseline.json   # save the results
+    python bench.py --compare baseline.json  # flag regressions against a baseline
+
+Every benchmark is timed in repeats of at least --min-time seconds and the
+fastest repeat is reported. In compare mode the exit code is 1 if any
+benchmark got slower than the baseline by more than --threshold.
+"""
+import argparse
+import json
+import platform
+import sys
+import time
+
+from BJack import BlackJack
+from card import CARDS
+from cardPack import Deck
+from events import EventBus
+from hand import Hand
+from player import Player
+from rounds import play_round
+
+SILENT = EventBus()
+
+
+def measure(operation, min_time=0.2, repeats=3):
+    """
+    Times an operation.
+
+    :param operation: Callable without arguments
+    :param min_time: Minimum seconds per repeat
+    :param repeats: Number of repeats
+    :return: Dictionary with ops_per_sec and sec_per_op of the fastest repeat
+    """
+    # Find a loop count that runs for at least min_time
+    loops = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(loops):
+            operation()
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time:
+            break
+        loops *= 2
+    best = elapsed / loops
+    for _ in range(repeats - 1):
+        started = time.perf_counter()
+        for _ in range(loops):
+            operation()
+        best = min(best, (time.perf_counter() - started) / loops)
+    return {"ops_per_sec": 1 / best, "sec_per_op": best}
+
+
+def deck_benchmarks():
+    deck = Deck()
+
+    def draw():
+        if not deck.remaining_cards():
+            deck.reset()
+        deck.draw()
+
+    def recycle():
+        while deck.remaining_cards():
+            deck.draw()
+        deck.recycle_discard_pile()
+
+    return {
+        "deck_construction": Deck,
+        "deck_shuffle": deck.shuffle,
+        "deck_reset": deck.reset,
+        "deck_recycle_discard_pile": recycle,
+        "deck_draw": draw,
+    }
+
+
+def hand_benchmarks(sizes=(2, 5, 10)):
+    benchmarks = {}
+    for size in sizes:
+        cards = [CARDS[card_id] for card_id in range(0, 52, 52 // size)][:size]
+        hand = Hand()
+
+        def add_cards(cards=cards, hand=hand):
+            hand.reset()
+            for card in cards:
+                hand.add_card(card)
+
+        filled = Hand()
+        for card in cards:
+            filled.add_card(card)
+        benchmarks[f"hand_add_card_{size}"] = add_cards
+        benchmarks[f"hand_get_total_{size}"] = filled.get_total
+    return benchmarks
+
+
+def player_benchmarks():
+    deck = Deck()
+    player = Player("Bench", 0, SILENT)
+
+    def draw_card():
+        if deck.remaining_cards() < 2:
+            deck.reset()
+        player.reset_hands()
+        player.draw_card(deck, 2)
+
+    return {"player_draw_card": draw_card}
+
+
+def round_benchmarks(seats=(1, 7, 100)):
+    benchmarks = {}
+    for count in seats:
+        game = BlackJack(max(6, count // 4), 0.75, bus=SILENT)
+        for seat in range(count):
+            game.add_player(Player(f"Seat {seat}", 10 ** 12, SILENT))
+        benchmarks[f"round_{count}_seats"] = lambda game=game: play_round(game)
+    return benchmarks
+
+
+def run(min_time=0.2, repeats=3, only=None):
+    """
+    Runs every benchmark.
+
+    :param min_time: Minimum seconds per repeat
+    :param repeats: Number of repeats per benchmark
+    :param only: Optional substring; only benchmarks with it in their name are run
+    :return: Report dictionary with meta data and results by benchmark name
+    """
+    benchmarks = {}
+    for group in (deck_benchmarks, hand_benchmarks, player_benchmarks, round_benchmarks):
+        benchmarks.update(group())
+    results = {}
+    for name, operation in benchmarks.items():
+        if only is None or only in name:
+            results[name] = measure(operation, min_time, repeats)
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "machine": platform.machine(),
+            "time": time.time(),
+        },
+        "results": results,
+    }
+
+
+def compare(report, baseline, threshold=0.10):
+    """
+    Compares a report against a baseline report.
+
+    :param threshold: Allowed relative slowdown before a benchmark counts as a regression
+    :return: Dictionary of benchmark name -> {baseline, current, change, regression}
+    """
+    changes = {}
+    for name, result in report["results"].items():
+        if name not in baseline["results"]:
+            continue
+        before = baseline["results"][name]["ops_per_sec"]
+        change = result["ops_per_sec"] / before - 1
+        changes[name] = {
+            "baseline": before,
+            "current": result["ops_per_sec"],
+            "change": change,
+            "regression": change < -threshold,
+        }
+    return changes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the BlackJack hot paths.")
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    parser.add_argument("--compare", help="Baseline JSON report to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Allowed slowdown (0.10 = 10%%)")
+    parser.add_argument("--min-time", type=float, default=0.2, help="Minimum seconds per repeat")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--only", help="Only run benchmarks whose name contains this")
+    args = parser.parse_args(argv)
+
+    report = run(args.min_time, args.repeats, args.only)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as file:
+            report["comparison"] = compare(report, json.load(file), args.threshold)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2)
+    print(json.dumps(report, indent=2))
+
+    regressions = [name for name, change in report.get("comparison", {}).items() if change["regression"]]
+    if regressions:
+        print(f"Regressions: {', '.join(regressions)}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,13 +1,86 @@
-﻿class Card:
+﻿VALUES = ("2", "3", "4", "5", "6", "7", "8", "9", "10", "J", "Q", "K", "A")
+SUITS = ("spades", "diamonds", "clubs", "hearts")
+
+
+class Card:
     """
     Represents a single playing card with a value and a suit.
+    Cards are flyweights: there is exactly one instance for every value/suit
+    pair, so Card("10", "hearts") returns the shared card from the card table.
     """
+    __slots__ = ("id", "value", "suit", "rank", "points", "is_ace", "slot")
+
+    def __new__(cls, value: str, suit: str):
+        try:
+            return _BY_NAME[value, suit]
+        except KeyError:
+            raise ValueError(f"Invalid card: {value} of {suit}") from None
+
     def __init__(self, value: str, suit: str):
-        self.value = value  # Value of the card (2-10, J, Q, K, A)
-        self.suit = suit  # Suit of the card (spades, diamonds, clubs, hearts)
+        # Attributes are filled in once when the card table is built
+        pass
+
+    @staticmethod
+    def from_id(card_id):
+        """
+        Returns the card with the given id (0-51).
+        """
+        return CARDS[card_id]
+
+    def __reduce__(self):
+        # Keep cards singletons across pickling (e.g. process pools)
+        return Card.from_id, (self.id,)
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
 
     def __repr__(self):
         """
         String representation of the card for display.
         """
         return f"{self.value} of {self.suit}"
+
+
+def _build_card(card_id, value, suit):
+    card = object.__new__(Card)
+    card.id = card_id  # Small int id: rank * 4 + suit
+    card.value = value  # Value of the card (2-10, J, Q, K, A)
+    card.suit = suit  # Suit of the card (spades, diamonds, clubs, hearts)
+    card.rank = card_id // 4  # Index into VALUES
+    card.is_ace = value == "A"
+    if value.isdigit():  # Numeric cards (2-10)
+        card.points = int(value)
+    elif card.is_ace:  # Aces count 11, hands adjust them down to 1
+        card.points = 11
+    else:  # Face cards (J, Q, K)
+        card.points = 10
+    card.slot = 0 if card.is_ace else card.points - 1  # Index in composition vectors
+    return card
+
+
+# The 52 card singletons, indexed by card id
+CARDS = tuple(
+    _build_card(rank * len(SUITS) + suit_index, value, suit)
+    for rank, value in enumerate(VALUES)
+    for suit_index, suit in enumerate(SUITS)
+)
+_BY_NAME = {(card.value, card.suit): card for card in CARDS}
+
+# Composition vectors count cards by blackjack value: A, 2, 3, ..., 9, ten-valued
+VALUE_SLOTS = 10
+
+
+def value_composition(cards):
+    """
+    Counts cards by blackjack value.
+
+    :param cards: Iterable of Card objects
+    :return: Tuple of VALUE_SLOTS counts (A, 2-9, ten-valued)
+    """
+    counts = [0] * VALUE_SLOTS
+    for card in cards:
+        counts[card.slot] += 1
+    return tuple(counts)
@@ -1,29 +1,252 @@
-﻿import itertools
+﻿import hashlib
 import random
-from card import Card
+from array import array
+from collections import deque
+from card import Card, CARDS, SUITS, VALUES
+
+
+def round_seed(seed, round_number):
+    """
+    Derives the shuffle seed of one round from a table seed, so any round can
+    be rebuilt without replaying the rounds before it.
+
+    :param seed: Seed of the table
+    :param round_number: Number of the round (1 for the first)
+    :return: Integer seed
+    """
+    digest = hashlib.blake2b(f"{seed}:{round_number}".encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
 
 
 class Deck:
     """
     Represents a deck of playing cards. Handles shuffling, drawing,
     resetting, and recycling cards.
+
+    A deck can also be a multi-deck shoe: num_decks sets how many 52-card
+    decks it holds and penetration the fraction dealt before the cut card
+    comes out. Cards are kept as ids in a preallocated array; the undealt
+    cards are the first remaining_cards() entries, with the top card last.
+
+    Every deck shuffles with its own generator: pass rng (a random.Random or
+    a numpy.random.Generator) or a seed for a reproducible deck.
+
+    The deck also keeps per-card and per-rank counts of its undealt cards and
+    the running count of every tracked counting system, all updated in O(1)
+    as cards come and go.
+
+    A lazy deck shuffles on draw: shuffle() only marks the undealt cards as
+    unshuffled, and each draw does the next step of the same Fisher-Yates
+    shuffle, swapping a random unshuffled card to the top. With a
+    random.Random generator the cards dealt are exactly those of an eager
+    deck on the same generator state; the generator is just left at a
+    different state when a shoe is not dealt to the end.
+
+    A deck created with shuffle=False starts in order and leaves its
+    generator untouched, for callers that load saved cards right away.
     """
 
-    def __init__(self):
-        # Initialize the deck with all possible cards (52 cards total)
-        num = ["2", "3", "4", "5", "6", "7", "8", "9", "10", "J", "Q", "K", "A"]
-        symbol = ["spades", "diamonds", "clubs", "hearts"]
-        self.cards = [Card(value, suit) for value, suit in itertools.product(num, symbol)]
+    def __init__(self, num_decks=1, penetration=None, rng=None, seed=None, count_systems=(), lazy=False, shuffle=True):
+        if num_decks < 1:
+            raise ValueError("A shoe needs at least one deck.")
+        if penetration is not None and not 0 < penetration <= 1:
+            raise ValueError("Penetration must be between 0 and 1.")
+        self.num_decks = num_decks
+        self.penetration = penetration
+
+        # Initialize the shoe with num_decks full decks (52 cards each)
+        self._full = array("B", range(len(CARDS))) * num_decks
+        self._ids = array("B", self._full)
+        self._top = len(self._ids)  # Number of undealt cards
+        self._cut = len(self._full) - int(len(self._full) * penetration) if penetration else 0
+
+        # Random generator used for shuffling, and shoe orders prepared in bulk
+        self.rng = rng if rng is not None else random.Random(seed)
+        self._numpy_rng = hasattr(self.rng, "bit_generator")
+        self._prepared = deque()
+
+        # Lazy decks keep the bottom _unshuffled undealt cards unshuffled until drawn
+        self.lazy = lazy
+        self._unshuffled = 0
+
+        # Undealt cards per card id and per rank, and running counts per system
+        self._full_id_counts = array("H", [num_decks]) * len(CARDS)
+        self._full_rank_counts = array("H", [num_decks * len(SUITS)]) * len(VALUES)
+        self._id_counts = array("H", self._full_id_counts)
+        self._rank_counts = array("H", self._full_rank_counts)
+        self._counters = {}
+        for system in count_systems:
+            self.track(system)
 
         # A pile to hold discarded cards
         self.discard_pile = []
 
         # Shuffle the deck on initialization
-        self.shuffle()
+        if shuffle:
+            self.shuffle()
+
+    @property
+    def cards(self):
+        """
+        The undealt cards as Card objects, bottom first (the top card is last).
+        A lazy deck finishes its shuffle first.
+        """
+        self.finish_shuffle()
+        return [CARDS[card_id] for card_id in self._ids[:self._top]]
+
+    @cards.setter
+    def cards(self, cards):
+        # A new array, not a slice assignment that would silently resize the old one
+        self._ids = array("B", [card.id for card in cards])
+        self._top = len(self._ids)
+        self._unshuffled = 0
+        self._recount()
+
+    def load(self, ids, top, discard_pile=(), unshuffled=0):
+        """
+        Replaces the deck's cards with saved ones, without shuffling.
+
+        :param ids: Card ids of the shoe array (undealt cards first, top card at top - 1),
+                    as any iterable or buffer of ints; copied once into the deck's array
+        :param top: Number of undealt cards
+        :param discard_pile: Card objects in the discard pile
+        :param unshuffled: Number of bottom cards a lazy deck has not shuffled yet
+        """
+        self._ids = array("B", ids)
+        self._top = top
+        self._unshuffled = unshuffled
+        self.discard_pile[:] = discard_pile
+        self._prepared.clear()
+        self._recount()
+
+    def _recount(self):
+        """
+        Rebuilds the card counts and running counts from the undealt cards.
+        """
+        for index in range(len(self._id_counts)):
+            self._id_counts[index] = 0
+        for index in range(len(self._rank_counts)):
+            self._rank_counts[index] = 0
+        for card_id in self._ids[:self._top]:
+            self._id_counts[card_id] += 1
+            self._rank_counts[card_id >> 2] += 1
+        # Initial count plus the tags of every card that is not in the deck
+        for system in self._counters:
+            self._counters[system] = (system.initial(self.num_decks) + self.num_decks * sum(system.tags_by_id)
+                                      - sum(system.tags_by_id[card_id] for card_id in self._ids[:self._top]))
+
+    def track(self, system):
+        """
+        Starts keeping the running count of a counting system.
+
+        :param system: counting.CountSystem, e.g. counting.HI_LO
+        """
+        self._counters[system] = 0
+        self._recount()
+
+    def running_count(self, system):
+        """
+        Running count of a tracked system.
+        """
+        return self._counters[system]
+
+    def true_count(self, system):
+        """
+        Running count of a tracked system per deck left in the shoe.
+        """
+        decks_left = self._top / len(CARDS)
+        return self._counters[system] / decks_left if decks_left else float(self._counters[system])
+
+    def rank_counts(self):
+        """
+        Undealt cards per rank, in card.VALUES order.
+        """
+        return tuple(self._rank_counts)
+
+    def composition(self):
+        """
+        Undealt cards by blackjack value (A, 2-9, ten-valued), as used by
+        dealer_probabilities and the EV engine.
+        """
+        counts = self._rank_counts
+        return (counts[12],) + tuple(counts[:8]) + (counts[8] + counts[9] + counts[10] + counts[11],)
+
+    @property
+    def cut_card_reached(self):
+        """
+        True once the deck has been dealt down to the cut card. A deck with
+        no penetration set has its cut card at the bottom: True only once
+        it is empty.
+        """
+        return self._top <= self._cut
+
+    def seed(self, seed):
+        """
+        Reseeds the deck's generator and drops prepared shuffles.
+
+        :param seed: New seed
+        """
+        if self._numpy_rng:
+            self.rng = type(self.rng)(type(self.rng.bit_generator)(seed))
+        else:
+            self.rng.seed(seed)
+        self._prepared.clear()
+
+    def _randbelow(self):
+        """
+        :return: Function of n drawing a uniform integer in [0, n) from the deck's generator
+        """
+        return self.rng.integers if self._numpy_rng else self.rng.randrange
 
     def shuffle(self):
-        """Shuffles the deck of cards."""
-        random.shuffle(self.cards)
+        """Shuffles the undealt cards in place (a lazy deck shuffles them as they are drawn)."""
+        if self.lazy:
+            self._unshuffled = self._top
+            return
+        self._unshuffled = 0
+        if self._numpy_rng:
+            import numpy as np
+            self.rng.shuffle(np.frombuffer(self._ids, dtype=np.uint8, count=self._top))
+            return
+        # The steps of random.shuffle, restricted to the undealt cards
+        ids = self._ids
+        below = self.rng.randrange
+        for i in range(self._top - 1, 0, -1):
+            j = below(i + 1)
+            ids[i], ids[j] = ids[j], ids[i]
+
+    def finish_shuffle(self):
+        """
+        Runs the rest of a lazy deck's pending shuffle, so the order of the
+        undealt cards is fixed.
+        """
+        ids = self._ids
+        below = self._randbelow()
+        for i in range(self._unshuffled - 1, 0, -1):
+            j = below(i + 1)
+            ids[i], ids[j] = ids[j], ids[i]
+        self._unshuffled = 0
+
+    def prepare_shuffles(self, count):
+        """
+        Generates shuffled orders of the full shoe in bulk. The next count
+        calls to reset() use them instead of shuffling on the spot.
+
+        :param count: Number of shoe orders to prepare
+        """
+        if self._numpy_rng:
+            import numpy as np
+            full = np.frombuffer(self._full, dtype=np.uint8)
+            orders = self.rng.permuted(np.broadcast_to(full, (count, full.size)), axis=1)
+            self._prepared.extend(array("B", order.tobytes()) for order in orders)
+            return
+        below = self.rng.randrange
+        for _ in range(count):
+            ids = array("B", self._full)
+            for i in range(len(ids) - 1, 0, -1):
+                j = below(i + 1)
+                ids[i], ids[j] = ids[j], ids[i]
+            self._prepared.append(ids)
 
     def draw(self):
         """
@@ -31,9 +254,24 @@ class Deck:
 
         :return: Card object drawn from the deck
         """
-        if not self.cards:
+        if not self._top:
             raise ValueError("Deck is empty")
-        card = self.cards.pop()  # Remove the top card
+        self._top -= 1  # Remove the top card
+        top = self._top
+        if top < self._unshuffled:
+            # Lazy deck: the next Fisher-Yates step picks the top card
+            if top:
+                ids = self._ids
+                j = self._randbelow()(top + 1)
+                ids[top], ids[j] = ids[j], ids[top]
+            self._unshuffled = top
+        card_id = self._ids[top]
+        self._id_counts[card_id] -= 1
+        self._rank_counts[card_id >> 2] -= 1
+        if self._counters:
+            for system in self._counters:
+                self._counters[system] += system.tags_by_id[card_id]
+        card = CARDS[card_id]
         self.discard_pile.append(card)  # Move it to the discard pile
         return card
 
@@ -43,26 +281,41 @@ class Deck:
 
         :param card: Card object to add
         """
-        if card not in itertools.product(
-                ["2", "3", "4", "5", "6", "7", "8", "9", "10", "J", "Q", "K", "A"],
-                ["spades", "diamonds", "clubs", "hearts"]
-        ):
+        if not isinstance(card, Card) or self._id_counts[card.id] >= self.num_decks:
             raise ValueError("Invalid card.")
-        self.cards.append(card)
+        self._push(card.id)
+
+    def _push(self, card_id):
+        # Reuses the dealt slots of the array; only grows if more cards come
+        # back than the shoe holds
+        if self._top < len(self._ids):
+            self._ids[self._top] = card_id
+        else:
+            self._ids.append(card_id)
+        self._top += 1
+        self._id_counts[card_id] += 1
+        self._rank_counts[card_id >> 2] += 1
+        if self._counters:
+            for system in self._counters:
+                self._counters[system] -= system.tags_by_id[card_id]
 
     def reset(self):
         """
-        Resets the deck to its full 52-card state and shuffles it.
+        Resets the deck to its full state and shuffles it.
         """
-        self.cards = [
-            Card(value, suit)
-            for value, suit in itertools.product(
-                ["2", "3", "4", "5", "6", "7", "8", "9", "10", "J", "Q", "K", "A"],
-                ["spades", "diamonds", "clubs", "hearts"]
-            )
-        ]
         self.discard_pile.clear()  # Clear the discard pile
-        self.shuffle()
+        if self._prepared:
+            self._ids[:] = self._prepared.popleft()
+            self._top = len(self._ids)
+            self._unshuffled = 0
+        else:
+            self._ids[:] = self._full
+            self._top = len(self._ids)
+            self.shuffle()
+        self._id_counts[:] = self._full_id_counts
+        self._rank_counts[:] = self._full_rank_counts
+        for system in self._counters:
+            self._counters[system] = system.initial(self.num_decks)
 
     def remaining_cards(self):
         """
@@ -70,7 +323,7 @@ class Deck:
 
         :return: Integer count of remaining cards
         """
-        return len(self.cards)
+        return self._top
 
     def recycle_discard_pile(self):
         """
@@ -79,6 +332,7 @@ class Deck:
         """
         if not self.discard_pile:
             raise ValueError("No cards in the discard pile to recycle.")
-        self.cards.extend(self.discard_pile)
+        for card in self.discard_pile:
+            self._push(card.id)
         self.discard_pile.clear()
         self.shuffle()
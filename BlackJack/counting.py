@@ -0,0 +1,43 @@
+﻿"""
+Card counting systems for Deck.track. A system gives every card value a
+tag; the running count is the initial count plus the tags of every card
+that has left the deck.
+"""
+from card import CARDS
+
+
+class CountSystem:
+    """
+    A card counting system.
+
+    :param name: Name of the system
+    :param tags: Tag per composition slot (A, 2, 3, ..., 9, ten-valued)
+    :param initial_per_deck: Initial running count per deck in the shoe
+    :param initial_offset: Constant added to the initial running count
+    """
+
+    def __init__(self, name, tags, initial_per_deck=0, initial_offset=0):
+        self.name = name
+        self.tags = tuple(tags)
+        self.tags_by_id = tuple(self.tags[card.slot] for card in CARDS)  # Tag per card id
+        self.initial_per_deck = initial_per_deck
+        self.initial_offset = initial_offset
+
+    def initial(self, num_decks):
+        """
+        Running count of a freshly shuffled shoe.
+        """
+        return self.initial_offset + self.initial_per_deck * num_decks
+
+    def __repr__(self):
+        return f"CountSystem({self.name})"
+
+
+#                      A   2  3  4  5  6  7  8   9  T
+HI_LO = CountSystem("Hi-Lo", (-1, 1, 1, 1, 1, 1, 0, 0, 0, -1))
+# Unbalanced: starts at 4 - 4 per deck so the pivot lands near zero
+KO = CountSystem("KO", (-1, 1, 1, 1, 1, 1, 1, 0, 0, -1), initial_per_deck=-4, initial_offset=4)
+OMEGA_II = CountSystem("Omega II", (0, 1, 1, 2, 2, 2, 1, 0, -1, -2))
+
+# Built-in systems by name; snapshots save tracked systems by name
+SYSTEMS = {system.name: system for system in (HI_LO, KO, OMEGA_II)}
@@ -1,24 +1,126 @@
-﻿from hand import Hand
+﻿from functools import lru_cache
+
+import events
+from hand import Hand
+
+# Order of the outcome probabilities returned by dealer_probabilities
+OUTCOMES = (17, 18, 19, 20, 21, "bust", "blackjack")
+BUST = 5
+BLACKJACK = 6
 
 class Dealer:
-    def __init__(self, saldo):
+    """
+    The dealer's side of the table. Plays a single hand by the house rule:
+    draw to 17, and also hit soft 17 when hit_soft_17 is set (H17).
+    """
+    def __init__(self, saldo=0, hit_soft_17=False, bus=None):
         self.saldo = saldo
-        self.hand = [Hand()]
+        self.hit_soft_17 = hit_soft_17
+        self.hand = Hand()
+        self.bus = bus if bus is not None else events.default_bus  # Reports an empty deck
+
+    def must_hit(self):
+        """
+        Checks if the house rule makes the dealer draw another card.
+
+        :return: True if the dealer has to hit
+        """
+        total = self.hand.get_total()
+        return total < 17 or (self.hit_soft_17 and total == 17 and self.hand.is_soft())
 
-    def deal_self(self):
-        hand = self.hand[0]
-        while hand.get_total() < 17:
+    def deal_self(self, deck):
+        """
+        Draws cards until the dealer has to stand.
+
+        :param deck: Deck object to draw cards from
+        :return: Final total of the dealer's hand
+        """
+        while self.must_hit() and self.draw_card(deck):
             pass
+        return self.get_total()
+
+    def draw_card(self, deck):
+        """
+        Draws one card to the dealer's hand. An empty deck is reported like
+        a player's draw: a DECK_EMPTY event and no card.
 
+        :param deck: Deck object to draw cards from
+        :return: True if a card was drawn
+        """
+        if not deck.remaining_cards():
+            self.bus.emit(events.DECK_EMPTY, player_id=None)
+            return False
+        self.hand.add_card(deck.draw())
+        return True
 
-    def draw_card(self):
-        pass
+    def upcard(self):
+        """
+        Returns the dealer's face-up (first) card, or None before the deal.
+        """
+        return self.hand.cards[0] if self.hand.cards else None
 
     def get_total(self):
-        pass
+        return self.hand.get_total()
 
     def reset_hand(self):
-        pass
+        self.hand.reset()
 
     def pay_money(self, money):
-        pass
+        """
+        Pays money out of the house balance (negative to collect).
+
+        :param money: Amount to pay
+        """
+        self.saldo -= money
+
+
+def dealer_probabilities(upcard_slot, composition, hit_soft_17=False):
+    """
+    Exact probabilities of the dealer's final result given the upcard and the
+    cards left in the shoe (including the unseen hole card).
+
+    Results are memoized on (upcard, composition) in a bounded LRU cache, so
+    pass the composition as a tuple.
+
+    :param upcard_slot: Composition index of the upcard (0 for Ace, points - 1 otherwise)
+    :param composition: Tuple of remaining card counts by value (see card.value_composition)
+    :param hit_soft_17: Dealer hits soft 17
+    :return: Tuple of probabilities in OUTCOMES order (17, 18, 19, 20, 21, bust, blackjack)
+    """
+    return _dealer_table(upcard_slot, composition, hit_soft_17)
+
+
+@lru_cache(maxsize=65536)
+def _dealer_table(upcard_slot, composition, hit_soft_17):
+    return _finish(upcard_slot + 1, upcard_slot == 0, True, composition, hit_soft_17)
+
+
+@lru_cache(maxsize=262144)
+def _finish(hard, has_ace, first_card, composition, hit_soft_17):
+    """
+    Outcome probabilities for a dealer hand with the given hard total that still
+    has to draw from composition. first_card is True while only the upcard is known.
+    """
+    remaining = sum(composition)
+    if not remaining:
+        raise ValueError("Shoe ran out during dealer play.")
+    result = [0.0] * len(OUTCOMES)
+    for slot, count in enumerate(composition):
+        if not count:
+            continue
+        probability = count / remaining
+        new_hard = hard + slot + 1
+        new_ace = has_ace or slot == 0
+        soft = new_ace and new_hard <= 11
+        total = new_hard + 10 if soft else new_hard
+        if first_card and total == 21:
+            result[BLACKJACK] += probability
+        elif total > 21:
+            result[BUST] += probability
+        elif total > 17 or (total == 17 and not (soft and hit_soft_17)):
+            result[total - 17] += probability
+        else:
+            rest = composition[:slot] + (count - 1,) + composition[slot + 1:]
+            for index, outcome in enumerate(_finish(new_hard, new_ace, False, rest, hit_soft_17)):
+                result[index] += probability * outcome
+    return tuple(result)
@@ -0,0 +1,155 @@
+﻿"""
+Structured game events. The table, players and helper checks report what
+happens through an EventBus instead of printing, and the bus hands every
+event to its sinks:
+
+    NullSink     - drop everything (silent mode; a bus with no sinks costs one check)
+    ConsoleSink  - print the classic console messages
+    JsonlSink    - append events to a JSON lines file, written in batches
+
+default_bus prints to the console, as the game always has.
+"""
+import json
+import time
+
+PLAYER_ADDED = "player_added"
+PLAYER_EXISTS = "player_exists"
+PLAYER_REMOVED = "player_removed"
+PLAYER_NOT_FOUND = "player_not_found"
+BET_PLACED = "bet_placed"
+BET_REJECTED = "bet_rejected"
+HAND_DEALT = "hand_dealt"
+CARD_DEALT = "card_dealt"
+DECK_EMPTY = "deck_empty"
+HAND_KEPT = "hand_kept"
+CHECK_FAILED = "check_failed"
+
+# Console messages; events without one are not shown on the console
+MESSAGES = {
+    PLAYER_ADDED: "Player {name} has been added to the game.",
+    PLAYER_EXISTS: "Player {name} is already in the game.",
+    PLAYER_REMOVED: "Player with ID {player_id} has been removed.",
+    PLAYER_NOT_FOUND: "No player with ID {player_id} found.",
+    BET_PLACED: "{name} placed a bet of {amount}.",
+    BET_REJECTED: "{message}",
+    HAND_DEALT: "{name}'s Hand: {cards} (Total: {total})",
+    DECK_EMPTY: "No more cards in the deck.",
+    HAND_KEPT: "for safety purposes plz dont delete last hand",
+    CHECK_FAILED: "{message}",
+}
+
+
+class Event:
+    """
+    A single event: its kind, when it happened and its fields.
+    """
+    __slots__ = ("kind", "time", "fields")
+
+    def __init__(self, kind, fields):
+        self.kind = kind
+        self.time = time.time()
+        self.fields = fields
+
+    def message(self):
+        """
+        Console message for the event, or None if it has none.
+        """
+        template = MESSAGES.get(self.kind)
+        return template.format(**self.fields) if template is not None else None
+
+    def as_dict(self):
+        return dict(self.fields, event=self.kind, time=self.time)
+
+    def __repr__(self):
+        return f"Event({self.kind}, {self.fields})"
+
+
+class NullSink:
+    """Drops every event."""
+
+    def handle(self, event):
+        pass
+
+    def close(self):
+        pass
+
+
+class ConsoleSink:
+    """Prints events that have a console message."""
+
+    def handle(self, event):
+        message = event.message()
+        if message is not None:
+            print(message)
+
+    def close(self):
+        pass
+
+
+class JsonlSink:
+    """
+    Writes events as JSON lines to a file. Lines are buffered and written
+    batch_size at a time; call flush() or close() to write the rest.
+    """
+
+    def __init__(self, path, batch_size=1000):
+        self.file = open(path, "a", encoding="utf-8")
+        self.batch_size = batch_size
+        self.buffer = []
+
+    def handle(self, event):
+        self.buffer.append(json.dumps(event.as_dict(), default=str))
+        if len(self.buffer) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self.buffer:
+            self.file.write("\n".join(self.buffer) + "\n")
+            self.buffer.clear()
+        self.file.flush()
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+
+class EventBus:
+    """
+    Passes events to a list of sinks. With no sinks (or only NullSinks)
+    the bus is disabled and emit returns right away.
+    """
+
+    def __init__(self, *sinks):
+        self.sinks = []
+        self.enabled = False
+        for sink in sinks:
+            self.subscribe(sink)
+
+    def subscribe(self, sink):
+        self.sinks.append(sink)
+        self.enabled = any(not isinstance(s, NullSink) for s in self.sinks)
+
+    def unsubscribe(self, sink):
+        self.sinks.remove(sink)
+        self.enabled = any(not isinstance(s, NullSink) for s in self.sinks)
+
+    def emit(self, kind, **fields):
+        """
+        Sends an event to every sink.
+
+        :param kind: Event kind, one of the constants in this module
+        :param fields: Event data
+        """
+        if not self.enabled:
+            return
+        event = Event(kind, fields)
+        for sink in self.sinks:
+            sink.handle(event)
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
+
+
+# Bus used when no other bus is given; keeps the classic console output
+default_bus = EventBus(ConsoleSink())
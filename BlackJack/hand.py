@@ -1,12 +1,126 @@
-﻿class Hand:
+﻿class CardList(list):
+    """
+    List of cards that keeps the running totals of its hand up to date,
+    so the totals stay correct even when hand.cards is edited directly.
+    """
+    __slots__ = ("_hand",)
+
+    def __init__(self, hand, cards=()):
+        super().__init__(cards)
+        self._hand = hand
+
+    def append(self, card):
+        list.append(self, card)
+        self._hand._count(card, 1)
+
+    def extend(self, cards):
+        for card in cards:
+            self.append(card)
+
+    def __iadd__(self, cards):
+        self.extend(cards)
+        return self
+
+    def __imul__(self, count):
+        list.__imul__(self, count)
+        self._hand._recount()
+        return self
+
+    def insert(self, index, card):
+        list.insert(self, index, card)
+        self._hand._count(card, 1)
+
+    def pop(self, index=-1):
+        card = list.pop(self, index)
+        self._hand._count(card, -1)
+        return card
+
+    def remove(self, card):
+        list.remove(self, card)
+        self._hand._count(card, -1)
+
+    def clear(self):
+        list.clear(self)
+        self._hand._recount()
+
+    def __setitem__(self, index, value):
+        list.__setitem__(self, index, value)
+        self._hand._recount()
+
+    def __delitem__(self, index):
+        list.__delitem__(self, index)
+        self._hand._recount()
+
+    def __reduce__(self):
+        # Rebuilt from a plain list, so the cards are not replayed through append before _hand is set
+        return CardList, (self._hand, list(self))
+
+
+class Hand:
     """
     Represents a single hand of cards for a player in Blackjack.
     Manages cards, bet size, and hand state (busted, etc.).
+    Totals are kept incrementally as cards come and go, so reading them is O(1).
     """
     def __init__(self, bet=0):
-        self.cards = []  # List to store Card objects
+        self._cards = CardList(self)  # List to store Card objects
         self.bet = bet  # Bet amount for this hand
         self.busted = False  # Track if the hand is busted
+        self.hard_total = 0  # Total with every Ace counted as 1
+        self.aces = 0  # Number of Aces in the hand
+        self.soft = False  # True if an Ace currently counts as 11
+        self.blackjack = False  # Two-card 21 that did not come from a split
+        self.from_split = False  # Hand was created by splitting a pair
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_cards"] = list(self._cards)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._cards = CardList(self, state["_cards"])
+        self._recount()
+
+    @property
+    def cards(self):
+        return self._cards
+
+    @cards.setter
+    def cards(self, cards):
+        self._cards = CardList(self, cards)
+        self._recount()
+
+    def _count(self, card, sign):
+        """
+        Adds (sign=1) or removes (sign=-1) a card from the running totals.
+        """
+        if card.is_ace:
+            self.hard_total += sign
+            self.aces += sign
+        else:
+            self.hard_total += sign * card.points
+        self._update_state()
+
+    def _recount(self):
+        """
+        Rebuilds the running totals from scratch after a bulk change.
+        """
+        self.hard_total = 0
+        self.aces = 0
+        for card in self._cards:
+            if card.is_ace:
+                self.hard_total += 1
+                self.aces += 1
+            else:
+                self.hard_total += card.points
+        self._update_state()
+
+    def _update_state(self):
+        # At most one Ace can count as 11 without busting
+        self.soft = self.aces > 0 and self.hard_total <= 11
+        self.blackjack = self.soft and self.hard_total == 11 and len(self._cards) == 2 and not self.from_split
+        self.busted = self.hard_total > 21
 
     def add_card(self, card):
         """
@@ -14,48 +128,34 @@
 
         :param card: Card object to add to the hand
         """
-        self.cards.append(card)
-        if self.get_total() > 21:
-            self.busted = True
+        self._cards.append(card)
 
     def get_value(self, card_index):
-        value = self.cards[card_index].value
-
-        if value.isdigit():  # Numeric cards (2-10)
-            return int(value)
-        elif value == "A":  # Aces
-            return 11
-        else:  # Face cards (J, Q, K)
-            return 10
+        # Precomputed on the card: 2-10 face value, J/Q/K 10, A 11
+        return self._cards[card_index].points
 
 
 
     def get_cards(self):
-        return self.cards
+        return self._cards
 
     def get_total(self):
         """
-        Calculates the total value of the hand, adjusting for Aces.
+        Returns the total value of the hand, counting an Ace as 11 when it fits.
 
         :return: Integer total value of the hand
         """
-        total = 0
-        aces = 0
-        for card in self.cards:
-            if card.value.isdigit():  # Numeric cards (2-10)
-                total += int(card.value)
-            elif card.value == "A":  # Aces
-                total += 11
-                aces += 1
-            else:  # Face cards (J, Q, K)
-                total += 10
+        if self.soft:
+            return self.hard_total + 10
+        return self.hard_total
 
-        # Adjust Aces from 11 to 1 if necessary
-        while total > 21 and aces > 0:
-            total -= 10
-            aces -= 1
+    def is_soft(self):
+        """
+        Checks if the hand is soft (an Ace is counted as 11).
 
-        return total
+        :return: True if soft, False otherwise
+        """
+        return self.soft
 
     def is_busted(self):
         """
@@ -63,20 +163,78 @@
 
         :return: True if busted, False otherwise
         """
-        if self.get_total() > 21:
-            self.busted = True
         return self.busted
 
     def reset(self):
         """
         Resets the hand to its initial state.
         """
-        self.cards.clear()
+        self.from_split = False
+        self._cards.clear()
         self.bet = 0
-        self.busted = False
 
     def __repr__(self):
         """
         String representation of the hand.
         """
         return f"Hand({self.cards}, Bet: {self.bet}, Busted: {self.busted})"
+
+
+class HandPool:
+    """
+    Free list of retired hands, kept per table. Players seated at the table
+    take the hands for their splits from it and give them back when their
+    hands are reset, so a hand and its card list are allocated once and
+    reused round after round.
+
+    :param factory: Called with the bet to make a hand when none is free
+    """
+
+    def __init__(self, factory=Hand):
+        self.factory = factory
+        self.free = []  # Retired hands, already reset; the last one is handed out first
+        self.hits = 0  # Hands handed out from the free list
+        self.misses = 0  # Hands that had to be allocated
+        self.released = 0  # Hands given back
+
+    def acquire(self, bet=0):
+        """
+        Returns a reset hand, reusing a retired one if there is any.
+
+        :param bet: Bet amount for the hand
+        :return: Hand object
+        """
+        if self.free:
+            self.hits += 1
+            hand = self.free.pop()
+            hand.bet = bet
+            return hand
+        hand = self.factory(bet)
+        self.misses += 1
+        return hand
+
+    def release(self, hand):
+        """
+        Resets a hand that is no longer used and keeps it for reuse.
+
+        :param hand: Hand object
+        """
+        hand.reset()
+        self.released += 1
+        self.free.append(hand)
+
+    def counters(self, rounds=0):
+        """
+        :param rounds: Rounds played with the pool
+        :return: Dictionary with hits, misses, hit_rate, released, free and
+                 avoided_per_round (allocations saved per round)
+        """
+        acquired = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / acquired if acquired else 0.0,
+            "released": self.released,
+            "free": len(self.free),
+            "avoided_per_round": self.hits / rounds if rounds else 0.0,
+        }
@@ -0,0 +1,283 @@
+﻿"""
+Append-only, columnar hand history.
+
+Every finished hand is one fixed-width row. Each column is a raw
+little-endian numpy file in the history directory (round.bin, bet.bin,
+cards.bin, ...); COLUMNS gives the dtype and width of each. HistoryWriter
+buffers rows as flat tuples (card and action columns as bytes, which the
+garbage collector does not have to track) and converts and appends them
+batch_size rows at a time, so numpy only runs once per batch.
+
+HistoryReader memory-maps the columns and answers aggregate queries with
+vectorized scans over chunks of rows, so even very large histories are
+never loaded into Python objects.
+
+    game = BlackJack(6, 0.75, history=HistoryWriter("history"))
+    ...play rounds...
+    game.history.close()
+    HistoryReader("history").win_rate_by_upcard()
+"""
+import json
+import os
+
+import numpy as np
+
+from card import CARDS, VALUE_SLOTS
+
+MAX_CARDS = 12
+MAX_ACTIONS = 16
+NO_CARD = 255
+
+# Action codes of the actions column (0 pads)
+ACTIONS = {"hit": 1, "stay": 2, "double": 3, "split": 4}
+
+# Outcome codes of the outcome column
+LOSS = 0
+PUSH = 1
+WIN = 2
+BLACKJACK = 3
+
+# name -> (dtype, values per row)
+COLUMNS = {
+    "round": ("<i8", 1),
+    "player_id": ("<i8", 1),
+    "hand_index": ("u1", 1),
+    "bet": ("<f8", 1),  # Final bet, after doubling
+    "net": ("<f8", 1),  # Amount won (negative if lost)
+    "outcome": ("u1", 1),
+    "start_total": ("u1", 1),  # Total of the first two cards
+    "start_soft": ("u1", 1),
+    "total": ("u1", 1),
+    "cards": ("u1", MAX_CARDS),  # Card ids, padded with NO_CARD
+    "actions": ("u1", MAX_ACTIONS),  # Action codes, padded with 0
+    "upcard": ("u1", 1),  # Card id of the dealer's upcard
+    "dealer_total": ("u1", 1),
+    "dealer_cards": ("u1", MAX_CARDS),
+}
+SCHEMA_FILE = "schema.json"
+SCHEMA_VERSION = 1
+
+# Composition slot (A, 2, ..., 9, ten-valued) of every card id
+SLOT_BY_ID = np.array([card.slot for card in CARDS], dtype=np.intp)
+
+
+def _schema():
+    return {"version": SCHEMA_VERSION, "columns": {name: list(spec) for name, spec in COLUMNS.items()}}
+
+
+def _column_path(directory, name):
+    return os.path.join(directory, name + ".bin")
+
+
+def _row_size(name):
+    dtype, width = COLUMNS[name]
+    return np.dtype(dtype).itemsize * width
+
+
+def _complete_rows(directory):
+    """
+    Rows present in every column file; a crash mid-flush leaves some columns longer.
+    """
+    rows = None
+    for name in COLUMNS:
+        path = _column_path(directory, name)
+        count = os.path.getsize(path) // _row_size(name) if os.path.exists(path) else 0
+        rows = count if rows is None else min(rows, count)
+    return rows
+
+
+def _start(cards):
+    """
+    Total and softness of the first two cards.
+    """
+    if len(cards) < 2:
+        return 0, False
+    first, second = cards[0], cards[1]
+    hard = (1 if first.is_ace else first.points) + (1 if second.is_ace else second.points)
+    soft = (first.is_ace or second.is_ace) and hard <= 11
+    return (hard + 10 if soft else hard), soft
+
+
+class HistoryWriter:
+    """
+    Appends finished hands to a history directory. Reopening a history cuts
+    every column back to the rows complete in all of them, so rows appended
+    after a torn batch stay aligned.
+
+    :param directory: History directory (created if missing)
+    :param batch_size: Rows buffered before they are written out
+    """
+
+    def __init__(self, directory, batch_size=65536):
+        self.directory = directory
+        self.batch_size = batch_size
+        os.makedirs(directory, exist_ok=True)
+        schema_path = os.path.join(directory, SCHEMA_FILE)
+        if os.path.exists(schema_path):
+            with open(schema_path, encoding="utf-8") as file:
+                if json.load(file) != _schema():
+                    raise ValueError(f"{directory} holds a history with another schema.")
+            rows = _complete_rows(directory)
+            for name in COLUMNS:
+                path = _column_path(directory, name)
+                if os.path.exists(path) and os.path.getsize(path) > rows * _row_size(name):
+                    os.truncate(path, rows * _row_size(name))
+        else:
+            with open(schema_path, "w", encoding="utf-8") as file:
+                json.dump(_schema(), file)
+        self.pending = []  # Buffered rows, as tuples in COLUMNS order
+        self.written = 0  # Rows written by this writer
+
+    def record_round(self, game, results, actions=None):
+        """
+        Buffers one row per hand of a finished round.
+
+        :param game: BlackJack instance at the end of the round
+        :param results: Net amounts won, one per hand in table order
+        :param actions: Dictionary of (player_id, hand_index) -> action names
+        """
+        dealer = game.dealer.hand
+        dealer_ids = [card.id for card in dealer.cards[:MAX_CARDS]]
+        upcard = dealer_ids[0] if dealer_ids else NO_CARD
+        dealer_total = dealer.get_total()
+        dealer_ids = bytes(dealer_ids + [NO_CARD] * (MAX_CARDS - len(dealer_ids)))
+        actions = actions or {}
+        results = iter(results)
+        pending = self.pending
+        for player in game.players.values():
+            for hand_index, hand in enumerate(player.hands):
+                net = next(results)
+                cards = hand.cards
+                ids = [card.id for card in cards[:MAX_CARDS]]
+                ids = bytes(ids + [NO_CARD] * (MAX_CARDS - len(ids)))
+                start_total, start_soft = _start(cards)
+                codes = [ACTIONS[name] for name in actions.get((player.id, hand_index), ())[:MAX_ACTIONS]]
+                codes = bytes(codes + [0] * (MAX_ACTIONS - len(codes)))
+                if net > 0:
+                    outcome = BLACKJACK if hand.blackjack else WIN
+                else:
+                    outcome = LOSS if net < 0 or hand.busted else PUSH
+                pending.append((
+                    game.round_number, player.id, hand_index, hand.bet, net, outcome, start_total, start_soft,
+                    hand.get_total(), ids, codes, upcard, dealer_total, dealer_ids,
+                ))
+        if len(pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Appends the buffered rows to the column files.
+        """
+        if not self.pending:
+            return
+        for (name, (dtype, width)), values in zip(COLUMNS.items(), zip(*self.pending)):
+            if width > 1:
+                column = np.frombuffer(b"".join(values), dtype)
+            else:
+                column = np.array(values, dtype)
+            with open(_column_path(self.directory, name), "ab") as file:
+                column.tofile(file)
+        self.written += len(self.pending)
+        self.pending = []
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class HistoryReader:
+    """
+    Memory-mapped, read-only view of a history directory.
+
+    :param directory: History directory
+    :param chunk_rows: Rows per vectorized scan step
+    """
+
+    def __init__(self, directory, chunk_rows=1 << 20):
+        with open(os.path.join(directory, SCHEMA_FILE), encoding="utf-8") as file:
+            if json.load(file) != _schema():
+                raise ValueError(f"{directory} holds a history with another schema.")
+        self.directory = directory
+        self.chunk_rows = chunk_rows
+        self.columns = {}
+        rows = self.rows = _complete_rows(directory)  # Ignore a torn final batch
+        for name, (dtype, width) in COLUMNS.items():
+            shape = (rows, width) if width > 1 else (rows,)
+            if rows:
+                self.columns[name] = np.memmap(_column_path(directory, name), dtype, "r", shape=shape)
+            else:
+                self.columns[name] = np.zeros(shape, dtype)
+
+    def __len__(self):
+        return self.rows
+
+    def _chunks(self, *names):
+        """
+        Yields tuples of column slices, chunk_rows rows at a time.
+        """
+        for start in range(0, self.rows, self.chunk_rows):
+            stop = start + self.chunk_rows
+            yield tuple(self.columns[name][start:stop] for name in names)
+
+    def win_rate_by_upcard(self):
+        """
+        Hands won (including blackjacks) per dealer upcard value.
+
+        :return: Dictionary of upcard value ("A", "2", ..., "9", "T") -> {hands, win_rate}
+        """
+        hands = np.zeros(VALUE_SLOTS, np.int64)
+        wins = np.zeros(VALUE_SLOTS, np.int64)
+        for upcard, outcome in self._chunks("upcard", "outcome"):
+            dealt = upcard != NO_CARD  # Rounds recorded without a dealer hand have no upcard
+            slots = SLOT_BY_ID[upcard[dealt]]
+            outcome = outcome[dealt]
+            hands += np.bincount(slots, minlength=VALUE_SLOTS)
+            wins += np.bincount(slots, weights=outcome >= WIN, minlength=VALUE_SLOTS).astype(np.int64)
+        labels = ("A", "2", "3", "4", "5", "6", "7", "8", "9", "T")
+        return {
+            labels[slot]: {"hands": int(hands[slot]), "win_rate": wins[slot] / hands[slot]}
+            for slot in range(VALUE_SLOTS) if hands[slot]
+        }
+
+    def ev_by_start_total(self, soft=None):
+        """
+        Expected result per unit bet by the total of the first two cards.
+
+        :param soft: Only soft (True) or hard (False) starting hands; both if None
+        :return: Dictionary of starting total -> {hands, ev}
+        """
+        hands = np.zeros(22, np.int64)
+        net = np.zeros(22)
+        bet = np.zeros(22)
+        for start_total, start_soft, chunk_net, chunk_bet in self._chunks("start_total", "start_soft", "net", "bet"):
+            if soft is not None:
+                keep = start_soft == soft
+                start_total, chunk_net, chunk_bet = start_total[keep], chunk_net[keep], chunk_bet[keep]
+            hands += np.bincount(start_total, minlength=22)
+            net += np.bincount(start_total, weights=chunk_net, minlength=22)
+            bet += np.bincount(start_total, weights=chunk_bet, minlength=22)
+        return {
+            total: {"hands": int(hands[total]), "ev": net[total] / bet[total] if bet[total] else 0.0}
+            for total in range(22) if hands[total]
+        }
+
+    def net_by_player(self):
+        """
+        Total amount won per player.
+
+        :return: Dictionary of player ID -> {hands, net}
+        """
+        totals = {}
+        for player_id, net in self._chunks("player_id", "net"):
+            ids, inverse = np.unique(player_id, return_inverse=True)
+            counts = np.bincount(inverse, minlength=len(ids))
+            sums = np.bincount(inverse, weights=net, minlength=len(ids))
+            for index, pid in enumerate(ids.tolist()):
+                hands, total = totals.get(pid, (0, 0.0))
+                totals[pid] = (hands + int(counts[index]), total + float(sums[index]))
+        return {pid: {"hands": hands, "net": net} for pid, (hands, net) in sorted(totals.items())}
@@ -0,0 +1,196 @@
+﻿"""
+Opt-in latency instrumentation and profiling for the table.
+
+enable() swaps the timed BlackJack and Deck methods for wrappers that count
+calls and record their latency in log2-bucketed histograms; disable() puts
+the original methods back, so instrumentation costs nothing while it is off.
+By default the methods are swapped on the classes, which times every table
+in the process; enable(game=...) times only that table and its deck.
+
+    instrument.enable()
+    ...play...
+    instrument.registry.snapshot()            # dict
+    instrument.registry.write_prometheus(path)  # Prometheus text format
+    instrument.disable()
+
+profiled() and profile_rounds() run cProfile around a block or N rounds.
+"""
+import contextlib
+import cProfile
+import functools
+import pstats
+import time
+
+from BJack import BlackJack
+from cardPack import Deck
+from rounds import play_round
+
+# Methods timed by enable()
+TIMED_METHODS = {
+    BlackJack: ("add_pot", "double", "split", "hit", "stay", "start_game", "sum_of_hands"),
+    Deck: ("draw", "shuffle"),
+}
+
+
+class Histogram:
+    """
+    Call count and latency histogram with power-of-two nanosecond buckets:
+    bucket b counts calls that took less than 2**b ns (and at least 2**(b-1)).
+    """
+    __slots__ = ("count", "total_ns", "buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.total_ns = 0
+        self.buckets = [0] * 64
+
+    def record(self, ns):
+        self.count += 1
+        self.total_ns += ns
+        self.buckets[ns.bit_length()] += 1
+
+
+class Registry:
+    """
+    Histograms by operation name.
+    """
+
+    def __init__(self):
+        self.histograms = {}
+
+    def histogram(self, name):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = Histogram()
+        return histogram
+
+    def reset(self):
+        self.histograms.clear()
+
+    def snapshot(self):
+        """
+        Current counts and latencies.
+
+        :return: Dictionary of operation name -> count, total_seconds, mean_seconds and
+                 buckets (upper bound in seconds -> calls)
+        """
+        return {
+            name: {
+                "count": histogram.count,
+                "total_seconds": histogram.total_ns / 1e9,
+                "mean_seconds": histogram.total_ns / histogram.count / 1e9 if histogram.count else 0.0,
+                "buckets": {
+                    (1 << bucket) / 1e9: calls for bucket, calls in enumerate(histogram.buckets) if calls
+                },
+            }
+            for name, histogram in self.histograms.items()
+        }
+
+    def prometheus(self, metric="blackjack_operation_seconds"):
+        """
+        The histograms in the Prometheus text exposition format.
+        """
+        lines = [f"# HELP {metric} Latency of BlackJack operations.", f"# TYPE {metric} histogram"]
+        for name, histogram in sorted(self.histograms.items()):
+            label = f'operation="{name}"'
+            used = [bucket for bucket, calls in enumerate(histogram.buckets) if calls]
+            cumulative = 0
+            for bucket in range(used[-1] + 1 if used else 0):
+                cumulative += histogram.buckets[bucket]
+                lines.append(f'{metric}_bucket{{{label},le="{(1 << bucket) / 1e9:.9g}"}} {cumulative}')
+            lines.append(f'{metric}_bucket{{{label},le="+Inf"}} {histogram.count}')
+            lines.append(f"{metric}_sum{{{label}}} {histogram.total_ns / 1e9:.9g}")
+            lines.append(f"{metric}_count{{{label}}} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        with open(path, "w", encoding="utf-8") as file:
+            file.write(self.prometheus())
+
+
+# Registry used when enable() is not given one
+registry = Registry()
+
+# (class or instance, method name) -> method replaced by enable()
+_originals = {}
+
+
+def _timed(method, name, target):
+    clock = time.perf_counter_ns
+    record = target.histogram(name).record
+
+    @functools.wraps(method)
+    def timed(*args, **kwargs):
+        started = clock()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            record(clock() - started)
+
+    return timed
+
+
+def enable(target=None, game=None):
+    """
+    Starts timing the instrumented methods.
+
+    :param target: Registry to record into (defaults to instrument.registry)
+    :param game: BlackJack instance to time on its own; None times every table
+    """
+    if _originals:
+        disable()
+    target = target if target is not None else registry
+    for cls, methods in TIMED_METHODS.items():
+        owner = cls if game is None else game if cls is BlackJack else game.deck
+        for method_name in methods:
+            method = getattr(owner, method_name)
+            _originals[owner, method_name] = method
+            setattr(owner, method_name, _timed(method, f"{cls.__name__}.{method_name}", target))
+
+
+def disable():
+    """
+    Restores the original, untimed methods.
+    """
+    for (owner, method_name), method in _originals.items():
+        if isinstance(owner, type):
+            setattr(owner, method_name, method)
+        else:
+            delattr(owner, method_name)  # The class method shows through again
+    _originals.clear()
+
+
+def is_enabled():
+    return bool(_originals)
+
+
+@contextlib.contextmanager
+def profiled(path=None):
+    """
+    Runs cProfile around the block. Yields the profiler; dumps the stats to
+    path (for pstats / snakeviz) if given.
+    """
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        if path is not None:
+            profiler.dump_stats(path)
+
+
+def profile_rounds(game, rounds, path=None, **rules):
+    """
+    Profiles rounds played with rounds.play_round.
+
+    :param game: BlackJack instance with players seated
+    :param rounds: Number of rounds to play
+    :param path: Optional file to dump the profile to
+    :param rules: Passed on to play_round
+    :return: pstats.Stats of the run
+    """
+    with profiled(path) as profiler:
+        for _ in range(rounds):
+            play_round(game, **rules)
+    return pstats.Stats(profiler)
@@ -0,0 +1,253 @@
+﻿"""
+Durable player balances: a Ledger logs every balance change to a local
+SQLite database in WAL mode, so players can be rebuilt after a restart.
+
+    ledger = Ledger("bankroll.db", flush_interval=0.05, batch_size=512)
+    game = BlackJack(6, 0.75, ledger=ledger)
+    ...
+    players = ledger.players()  # After a restart: player_id -> Player
+    wallet = ledger.wallet()    # and the Wallet of the WalletPlayer seats
+
+Every balance change of every player type reaches the ledger through
+Player._record, which queues the row the player describes with
+ledger_row(). A Player's (or SeatView's) balance is its own, so the ledger
+keeps its latest balance by player ID. A WalletPlayer's balance is the
+shared account's, so its rows change the account instead: an account starts
+at the balance seen when it is first recorded and then moves by the amount
+of every change, whatever order the tables' rows arrive in.
+
+Changes are not written on the calling thread. record() only appends the
+change to a pending queue, and a background writer thread group-commits
+them: it wakes every flush_interval seconds, or as soon as batch_size
+changes are pending, and commits what is pending in transactions of at most
+batch_size changes. Those two settings, plus SQLite's synchronous level,
+trade durability for latency. A crash loses at most the changes of the last
+flush_interval; with synchronous="NORMAL" a power loss can also roll back
+the last commits, "FULL" syncs every commit. The queue is bounded: record()
+blocks while queue_size changes are pending. flush() waits until everything
+recorded so far is committed.
+"""
+import sqlite3
+import threading
+from collections import deque
+from contextlib import closing
+
+from hand import Hand
+from player import Player
+from wallet import Wallet
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS players (player_id INTEGER PRIMARY KEY, name TEXT NOT NULL, saldo REAL NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS accounts (account_id PRIMARY KEY, balance REAL NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS changes (seq INTEGER PRIMARY KEY, player_id INTEGER, account_id, "
+    "amount REAL NOT NULL, saldo REAL NOT NULL, reason TEXT NOT NULL)",
+)
+INSERT_CHANGE = "INSERT INTO changes (player_id, account_id, amount, saldo, reason) VALUES (?, ?, ?, ?, ?)"
+UPSERT_PLAYER = ("INSERT INTO players (player_id, name, saldo) VALUES (?, ?, ?) "
+                 "ON CONFLICT (player_id) DO UPDATE SET name = excluded.name, saldo = excluded.saldo")
+UPSERT_ACCOUNT = ("INSERT INTO accounts (account_id, balance) VALUES (?1, ?2) "
+                  "ON CONFLICT (account_id) DO UPDATE SET balance = balance + ?3")
+
+
+class Ledger:
+    """
+    Write-behind log of player balances in a SQLite database.
+
+    :param path: Database file
+    :param flush_interval: Longest time in seconds a change waits to be committed
+    :param batch_size: Most changes per transaction
+    :param queue_size: Most changes waiting to be written; record() blocks beyond that
+    :param synchronous: SQLite synchronous level ("OFF", "NORMAL" or "FULL")
+    """
+
+    def __init__(self, path, flush_interval=0.05, batch_size=512, queue_size=65536, synchronous="NORMAL"):
+        if synchronous not in ("OFF", "NORMAL", "FULL"):
+            raise ValueError("synchronous must be OFF, NORMAL or FULL.")
+        self.path = path
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+        self.synchronous = synchronous
+        self.error = None  # First error of the writer thread
+        self._pending = deque()  # Changes and flush markers for the writer; appends are thread-safe
+        self._wake = threading.Event()  # Wakes the writer before the interval is up
+        self._room = threading.Condition()  # Notified after the writer drained the queue
+        self._closed = False
+        with closing(self._connect()) as connection:
+            connection.execute("PRAGMA journal_mode=WAL")  # Stored in the file, kept by every connection
+            for statement in SCHEMA:
+                connection.execute(statement)
+            connection.commit()
+        self._writer = threading.Thread(target=self._run, name="ledger-writer", daemon=True)
+        self._writer.start()
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path)
+        connection.execute(f"PRAGMA synchronous={self.synchronous}")
+        return connection
+
+    def _check(self):
+        if self.error is not None:
+            raise RuntimeError("Ledger writer failed.") from self.error
+        if self._closed:
+            raise ValueError("Ledger is closed.")
+
+    def record(self, player, amount, reason):
+        """
+        Queues a change of a player's balance; the player's balance must
+        already include it.
+
+        :param player: Player (or SeatView, WalletPlayer) whose balance changed
+        :param amount: Amount added (negative for deductions)
+        :param reason: Short description, such as "bet", "double" or "settle"
+        """
+        self._check()
+        pending = self._pending
+        pending.append(player.ledger_row(amount, reason))
+        if len(pending) >= self.batch_size:
+            if not self._wake.is_set():
+                self._wake.set()
+            if len(pending) >= self.queue_size:
+                with self._room:
+                    self._room.wait_for(lambda: len(pending) < self.queue_size or self.error is not None)
+
+    def flush(self):
+        """
+        Waits until every change recorded so far is committed.
+        """
+        self._check()
+        done = threading.Event()
+        self._pending.append(done)
+        self._wake.set()
+        done.wait()
+        self._check()
+
+    def close(self):
+        """
+        Commits the remaining changes and stops the writer thread.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        self._pending.append(None)
+        self._wake.set()
+        self._writer.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _run(self):
+        connection = self._connect()
+        stop = False
+        while not stop:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            stop = self._drain(connection)
+        connection.close()
+
+    def _drain(self, connection):
+        """
+        Commits everything pending, batch_size changes per transaction, then
+        releases the flush() calls waiting on it.
+
+        :return: True once close() was called
+        """
+        pending = self._pending
+        batch, waiters = [], []
+        stop = False
+        while pending and not stop:
+            item = pending.popleft()
+            if item is None:
+                stop = True
+            elif isinstance(item, threading.Event):
+                waiters.append(item)
+            else:
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    self._commit(connection, batch)
+                    batch = []
+        self._commit(connection, batch)
+        for waiter in waiters:
+            waiter.set()
+        with self._room:
+            self._room.notify_all()
+        return stop
+
+    def _commit(self, connection, batch):
+        if batch and self.error is None:
+            try:
+                self._write(connection, batch)
+            except sqlite3.Error as error:
+                self.error = error
+
+    @staticmethod
+    def _write(connection, batch):
+        # One transaction per batch; players keep their latest balance of the batch
+        with connection:
+            connection.executemany(INSERT_CHANGE, [(player_id, account_id, amount, saldo, reason)
+                                                   for player_id, account_id, _, amount, saldo, reason in batch])
+            connection.executemany(UPSERT_PLAYER, list({
+                player_id: (player_id, name, saldo)
+                for player_id, _, name, _, saldo, _ in batch if player_id is not None
+            }.values()))
+            connection.executemany(UPSERT_ACCOUNT, [(account_id, saldo, amount)
+                                                    for _, account_id, _, amount, saldo, _ in batch
+                                                    if account_id is not None])
+
+    def players(self, bus=None):
+        """
+        Rebuilds every player in the ledger with its last committed balance
+        and its original ID. The players log to this ledger again.
+
+        :param bus: Event bus for the players
+        :return: Dictionary of player_id -> Player
+        """
+        if not self._closed:
+            self.flush()
+        players = {}
+        with closing(self._connect()) as connection:
+            for player_id, name, saldo in connection.execute("SELECT player_id, name, saldo FROM players"):
+                player = Player.from_state(player_id, name, saldo, [Hand()], bus)
+                player.ledger = self
+                players[player_id] = player
+        return players
+
+    def accounts(self):
+        """
+        Last committed balance of every wallet account in the ledger.
+
+        :return: Dictionary of account_id -> balance
+        """
+        if not self._closed:
+            self.flush()
+        with closing(self._connect()) as connection:
+            return dict(connection.execute("SELECT account_id, balance FROM accounts"))
+
+    def wallet(self, stripes=64):
+        """
+        Rebuilds a Wallet with every account in the ledger. Money reserved for
+        a round that never settled is not in the ledger, so it is back.
+
+        :param stripes: Number of locks of the new wallet
+        :return: Wallet object
+        """
+        wallet = Wallet(stripes)
+        for account_id, balance in self.accounts().items():
+            wallet.open(account_id, balance)
+        return wallet
+
+    def changes(self, player_id):
+        """
+        Committed changes of a player, oldest first.
+
+        :param player_id: ID of the player
+        :return: List of (amount, saldo, reason) tuples
+        """
+        if not self._closed:
+            self.flush()
+        with closing(self._connect()) as connection:
+            return connection.execute("SELECT amount, saldo, reason FROM changes WHERE player_id = ? ORDER BY seq",
+                                      (player_id,)).fetchall()
@@ -0,0 +1,117 @@
+﻿"""
+Local load generator for server.py. Every client sits alone at its own
+table and plays rounds as fast as it can (bet, hit to 17, stay), timing
+each request from send to reply.
+
+    python loadtest.py --port 8765 --clients 200 --rounds 50
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import time
+
+
+class Client:
+    """
+    A connection that matches replies to requests by id and collects latencies.
+    """
+
+    def __init__(self, reader, writer, latencies):
+        self.reader = reader
+        self.writer = writer
+        self.latencies = latencies
+        self.ids = itertools.count(1)
+        self.waiting = {}
+        self.listener = asyncio.create_task(self.listen())
+
+    async def listen(self):
+        while True:
+            line = await self.reader.readline()
+            if not line:
+                break
+            message = json.loads(line)
+            future = self.waiting.pop(message.get("id"), None)
+            if future is not None:
+                future.set_result(message)
+
+    async def call(self, op, **fields):
+        request_id = next(self.ids)
+        future = asyncio.get_running_loop().create_future()
+        self.waiting[request_id] = future
+        started = time.perf_counter()
+        self.writer.write((json.dumps(dict(fields, op=op, id=request_id)) + "\n").encode())
+        reply = await future
+        self.latencies.append(time.perf_counter() - started)
+        return reply
+
+    async def close(self):
+        self.listener.cancel()
+        self.writer.close()
+
+
+async def play(open_connection, rounds, bet, latencies):
+    reader, writer = await open_connection()
+    client = Client(reader, writer, latencies)
+    await client.call("join", name="load", saldo=bet * rounds * 10)
+    played = 0
+    for _ in range(rounds):
+        state = await client.call("bet", amount=bet)
+        hand = state["hands"][0]
+        while hand["open"] and hand["total"] < 17:
+            hand = (await client.call("hit"))["hands"][0]
+        if hand["open"]:
+            await client.call("stay")
+        played += 1
+    await client.close()
+    return played
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+async def run(host="127.0.0.1", port=8765, path=None, clients=100, rounds=20, bet=10):
+    """
+    Runs the load test against a running server.
+
+    :return: Dictionary with rounds, seconds, rounds_per_sec and p50/p99 latency in milliseconds
+    """
+    if path is not None:
+        def open_connection():
+            return asyncio.open_unix_connection(path)
+    else:
+        def open_connection():
+            return asyncio.open_connection(host, port)
+    latencies = []
+    started = time.perf_counter()
+    played = await asyncio.gather(*(play(open_connection, rounds, bet, latencies) for _ in range(clients)))
+    seconds = time.perf_counter() - started
+    return {
+        "rounds": sum(played),
+        "seconds": seconds,
+        "rounds_per_sec": sum(played) / seconds,
+        "actions": len(latencies),
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test a local BlackJack server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", help="Unix socket path (instead of TCP)")
+    parser.add_argument("--clients", type=int, default=100)
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--bet", type=int, default=10)
+    args = parser.parse_args()
+    report = asyncio.run(run(args.host, args.port, args.unix, args.clients, args.rounds, args.bet))
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
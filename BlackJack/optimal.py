@@ -0,0 +1,173 @@
+﻿"""
+Composition-dependent expected values for the player's decisions.
+
+Values are exact for the cards actually left in the deck (plus the dealer's
+unseen hole card) and are given in units of the hand's original bet. Hit
+sequences are explored recursively; every subproblem is cached on
+(upcard, total, soft, composition), so a position reached by different hit
+orders is only ever computed once.
+
+Rules follow BlackJack: a dealer blackjack beats every non-blackjack hand,
+doubling draws exactly one card, and a split plays each card as a new hand
+(split Aces get one card each, no resplitting).
+"""
+from functools import lru_cache
+
+from dealer import BLACKJACK, BUST, dealer_probabilities
+
+ACTIONS = ("stay", "hit", "double", "split")
+
+
+def _add(total, soft, slot):
+    """
+    Total and soft flag after drawing a card with the given composition slot.
+    """
+    if soft:
+        total += slot + 1
+        if total > 21:
+            return total - 10, False
+        return total, True
+    if slot == 0 and total <= 10:
+        return total + 11, True
+    return total + slot + 1, False
+
+
+def _remove(composition, slot):
+    return composition[:slot] + (composition[slot] - 1,) + composition[slot + 1:]
+
+
+@lru_cache(maxsize=1 << 20)
+def stand_value(upcard, total, composition, hit_soft_17=False):
+    """
+    Expected value of standing on a total against the dealer's upcard.
+
+    :param upcard: Composition slot of the dealer's upcard
+    :param total: Player total (21 or less)
+    :param composition: Tuple of remaining card counts by value
+    :param hit_soft_17: Dealer hits soft 17
+    :return: Expected value per unit bet
+    """
+    outcomes = dealer_probabilities(upcard, composition, hit_soft_17)
+    value = outcomes[BUST] - outcomes[BLACKJACK]
+    for dealer_total, probability in zip(range(17, 22), outcomes):
+        if total > dealer_total:
+            value += probability
+        elif total < dealer_total:
+            value -= probability
+    return value
+
+
+@lru_cache(maxsize=1 << 20)
+def hit_value(upcard, total, soft, composition, hit_soft_17=False):
+    """
+    Expected value of hitting once and then playing on optimally (stand or hit).
+
+    :param upcard: Composition slot of the dealer's upcard
+    :param total: Player total
+    :param soft: True if an Ace in the hand counts as 11
+    :param composition: Tuple of remaining card counts by value
+    :param hit_soft_17: Dealer hits soft 17
+    :return: Expected value per unit bet
+    """
+    remaining = sum(composition)
+    value = 0.0
+    for slot, count in enumerate(composition):
+        if not count:
+            continue
+        new_total, new_soft = _add(total, soft, slot)
+        if new_total > 21:
+            value -= count
+            continue
+        rest = _remove(composition, slot)
+        value += count * max(
+            stand_value(upcard, new_total, rest, hit_soft_17),
+            hit_value(upcard, new_total, new_soft, rest, hit_soft_17),
+        )
+    return value / remaining
+
+
+def double_value(upcard, total, soft, composition, hit_soft_17=False):
+    """
+    Expected value of doubling: twice the bet on exactly one more card.
+    """
+    remaining = sum(composition)
+    value = 0.0
+    for slot, count in enumerate(composition):
+        if not count:
+            continue
+        new_total, _ = _add(total, soft, slot)
+        if new_total > 21:
+            value -= count
+        else:
+            value += count * stand_value(upcard, new_total, _remove(composition, slot), hit_soft_17)
+    return 2 * value / remaining
+
+
+def split_value(upcard, pair_slot, composition, hit_soft_17=False):
+    """
+    Expected value of splitting a pair, for both hands together.
+    Both hands are valued against the same composition.
+    """
+    start_total, start_soft = _add(0, False, pair_slot)
+    remaining = sum(composition)
+    value = 0.0
+    for slot, count in enumerate(composition):
+        if not count:
+            continue
+        total, soft = _add(start_total, start_soft, slot)
+        rest = _remove(composition, slot)
+        hand_value = stand_value(upcard, total, rest, hit_soft_17)
+        if pair_slot != 0:
+            hand_value = max(hand_value, hit_value(upcard, total, soft, rest, hit_soft_17))
+        value += count * hand_value
+    return 2 * value / remaining
+
+
+def action_values(game, player_id, hand_index=0):
+    """
+    Expected value of every legal action for one of a player's hands.
+
+    :param game: BlackJack instance after start_game
+    :param player_id: ID of the player
+    :param hand_index: index of a hand
+    :return: Dictionary mapping action names (as BlackJack methods) to expected values
+    """
+    hand = game.players[player_id].hands[hand_index]
+    dealer_cards = game.dealer.hand.cards
+    upcard = dealer_cards[0].slot
+    hit_soft_17 = game.dealer.hit_soft_17
+    composition = game.deck.composition()
+    # The hole card is unseen, so it still counts as left in the shoe
+    for card in dealer_cards[1:]:
+        composition = composition[:card.slot] + (composition[card.slot] + 1,) + composition[card.slot + 1:]
+    total = hand.get_total()
+    soft = hand.is_soft()
+
+    if hand.is_busted():
+        return {"stay": -1.0}
+    if hand.blackjack:
+        blackjack = dealer_probabilities(upcard, composition, hit_soft_17)[BLACKJACK]
+        return {"stay": 1.5 * (1 - blackjack)}
+
+    values = {
+        "stay": stand_value(upcard, total, composition, hit_soft_17),
+        "hit": hit_value(upcard, total, soft, composition, hit_soft_17),
+    }
+    if len(hand.cards) == 2:
+        values["double"] = double_value(upcard, total, soft, composition, hit_soft_17)
+        if hand.get_value(0) == hand.get_value(1) and not hand.from_split:  # No resplitting
+            values["split"] = split_value(upcard, hand.cards[0].slot, composition, hit_soft_17)
+    return values
+
+
+def best_action(game, player_id, hand_index=0):
+    """
+    The action with the highest expected value for a hand.
+
+    :param game: BlackJack instance after start_game
+    :param player_id: ID of the player
+    :param hand_index: index of a hand
+    :return: Name of the BlackJack method to call ("stay", "hit", "double" or "split")
+    """
+    values = action_values(game, player_id, hand_index)
+    return max(values, key=values.get)
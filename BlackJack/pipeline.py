@@ -0,0 +1,174 @@
+﻿"""
+Streaming round pipeline: round sources yield one record (a flat dict) per
+round, aggregate() passes them through to aggregators on the way, and the
+writers stream them out as JSONL or CSV. Every stage handles one record at
+a time, so memory stays flat however many rounds are played.
+
+    summary = Summary()
+    with JsonlWriter(sys.stdout) as writer:
+        for record in aggregate(table_rounds(game, 10_000), summary):
+            writer.write(record)
+    summary.result()
+
+Sources stop early once their stop event (a threading.Event) is set.
+"""
+import csv
+import json
+import math
+
+from rounds import play_round
+
+
+def _stopped(stop):
+    return stop is not None and stop.is_set()
+
+
+def table_rounds(game, count=None, bet=1, stand_on=17, blackjack_payout=1.5, stop=None):
+    """
+    Plays rounds with rounds.play_round and yields a record per round.
+
+    :param game: BlackJack instance with players seated
+    :param count: Number of rounds (None to play until stopped)
+    :param stop: Optional threading.Event that ends the stream
+    :return: Generator of dicts with round, hands, wagered, net, dealer_total and dealer_cards
+    """
+    played = 0
+    while (count is None or played < count) and not _stopped(stop):
+        results = play_round(game, bet, stand_on, blackjack_payout)
+        dealer = game.dealer.hand
+        played += 1
+        yield {
+            "round": game.round_number,
+            "hands": len(results),
+            "wagered": sum(hand.bet for player in game.players.values() for hand in player.hands),
+            "net": sum(results),
+            "dealer_total": dealer.get_total(),
+            "dealer_cards": " ".join(f"{card.value}{card.suit[0]}" for card in dealer.cards),
+        }
+
+
+def vector_rounds(count=None, seed=None, batch_size=10_000, num_decks=1, stop=None, **rules):
+    """
+    Plays rounds in batches with the vectorized simulator (one fresh shoe
+    per round) and yields a record per round. Needs NumPy.
+
+    :param count: Number of rounds (None to play until stopped)
+    :param seed: Seed for numpy.random.default_rng
+    :param batch_size: Rounds per batch
+    :param num_decks: Decks per shoe
+    :param stop: Optional threading.Event that ends the stream
+    :param rules: Passed on to simulator.simulate_batch
+    :return: Generator of dicts with round, hands, wagered and net
+    """
+    import numpy as np
+    import simulator
+
+    rng = np.random.default_rng(seed)
+    played = 0
+    while (count is None or played < count) and not _stopped(stop):
+        size = batch_size if count is None else min(batch_size, count - played)
+        for net in simulator.simulate_batch(simulator.shuffled_shoes(rng, size, num_decks), **rules).tolist():
+            if _stopped(stop):
+                return
+            played += 1
+            yield {"round": played, "hands": 1, "wagered": 1, "net": net}
+
+
+def aggregate(records, *aggregators):
+    """
+    Feeds every record to the aggregators and passes it on.
+    """
+    for record in records:
+        for aggregator in aggregators:
+            aggregator.add(record)
+        yield record
+
+
+class Summary:
+    """
+    Running totals of a stream of round records.
+    """
+
+    def __init__(self):
+        self.rounds = 0
+        self.hands = 0
+        self.wagered = 0
+        self.net = 0
+        self._mean = 0.0  # Welford mean and squared deviations of the net per round
+        self._m2 = 0.0
+
+    def add(self, record):
+        net = record["net"]
+        self.rounds += 1
+        self.hands += record["hands"]
+        self.wagered += record["wagered"]
+        self.net += net
+        delta = net - self._mean
+        self._mean += delta / self.rounds
+        self._m2 += delta * (net - self._mean)
+
+    def result(self):
+        """
+        :return: Dictionary with rounds, hands, wagered, net, ev (net per unit wagered),
+                 mean and stdev of the net per round
+        """
+        return {
+            "rounds": self.rounds,
+            "hands": self.hands,
+            "wagered": self.wagered,
+            "net": self.net,
+            "ev": self.net / self.wagered if self.wagered else 0.0,
+            "mean": self._mean,
+            "stdev": math.sqrt(self._m2 / (self.rounds - 1)) if self.rounds > 1 else 0.0,
+        }
+
+
+class JsonlWriter:
+    """
+    Writes records as JSON lines, flushing every flush_every records.
+
+    :param file: Open text file
+    """
+
+    def __init__(self, file, flush_every=1000):
+        self.file = file
+        self.flush_every = flush_every
+        self.pending = 0
+
+    def write(self, record):
+        self.file.write(json.dumps(record, separators=(",", ":")) + "\n")
+        self.pending += 1
+        if self.pending >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        self.file.flush()
+        self.pending = 0
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class CsvWriter(JsonlWriter):
+    """
+    Writes records as CSV rows under a header taken from the first record.
+    """
+
+    def __init__(self, file, flush_every=1000):
+        super().__init__(file, flush_every)
+        self.writer = None
+
+    def write(self, record):
+        if self.writer is None:
+            self.writer = csv.DictWriter(self.file, fieldnames=list(record), lineterminator="\n")
+            self.writer.writeheader()
+        self.writer.writerow(record)
+        self.pending += 1
+        if self.pending >= self.flush_every:
+            self.flush()
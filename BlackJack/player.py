@@ -1,17 +1,72 @@
-﻿from hand import Hand
+﻿import threading
+
+import events
+from hand import Hand
+
+
+class IdAllocator:
+    """
+    Hands out unique, increasing IDs; safe to use from many threads.
+
+    :param start: First ID
+    """
+
+    def __init__(self, start=1):
+        self._next = start
+        self._lock = threading.Lock()
+
+    def next(self):
+        with self._lock:
+            new_id = self._next
+            self._next += 1
+            return new_id
+
+    def skip_past(self, used_id):
+        """
+        Makes sure an ID that is already in use is never handed out.
+        """
+        with self._lock:
+            self._next = max(self._next, used_id + 1)
+
 
 class Player:
     """
     Represents a player in the game. Manages their hand, balance, and betting.
     """
-    id_counter = 1  # Class-level counter to assign unique player IDs
+    ids = IdAllocator()  # Shared allocator for unique player IDs
+    pool = None  # HandPool of the table the player is seated at, if any
+    ledger = None  # ledger.Ledger that logs the player's balance changes, if any
 
-    def __init__(self, name, saldo):
-        self.id = Player.id_counter
-        Player.id_counter += 1
+    def __init__(self, name, saldo, bus=None, strategy=None):
+        self.id = Player.ids.next()
         self.name = name
         self.saldo = saldo  # Player's balance
         self.hands = [Hand()]  # List of Hand objects
+        self.bus = bus if bus is not None else events.default_bus  # Event bus for player events
+        self.strategy = strategy  # strategy.Strategy that plays the seat automatically, if any
+
+    @classmethod
+    def from_state(cls, player_id, name, saldo, hands, bus=None, strategy=None):
+        """
+        Rebuilds a saved player with its original ID.
+
+        :param player_id: ID of the player
+        :param name: Name of the player
+        :param saldo: Player's balance
+        :param hands: List of Hand objects
+        :param bus: Event bus for player events
+        :param strategy: Strategy that plays the seat automatically
+        :return: Player object
+        """
+        player = cls.__new__(cls)
+        player.id = player_id
+        Player.ids.skip_past(player_id)  # Keep new IDs unique
+        player.name = name
+        player.saldo = saldo
+        player.hands = hands
+        player.bus = bus if bus is not None else events.default_bus
+        player.strategy = strategy
+        return player
 
     def draw_card(self, deck, num=1, hand_index=0):
         """
@@ -25,8 +80,10 @@ class Player:
             if deck.remaining_cards() > 0:
                 card = deck.draw()
                 self.hands[hand_index].add_card(card)
+                if self.bus.enabled:
+                    self.bus.emit(events.CARD_DEALT, player_id=self.id, hand_index=hand_index, card=card)
             else:
-                print("No more cards in the deck.")
+                self.bus.emit(events.DECK_EMPTY, player_id=self.id)
                 break
 
     def add_hand(self, bet=0):
@@ -36,10 +93,22 @@ class Player:
         :param bet: Bet amount for the new hand
         :return: Index of the new hand
         """
-        new_hand = Hand(bet)
-        self.hands.append(new_hand)
+        self.hands.append(self._acquire_hand(bet))
         return len(self.hands) - 1
 
+    def _acquire_hand(self, bet):
+        """
+        A new hand for add_hand, from the table's hand pool when seated.
+        """
+        return self.pool.acquire(bet) if self.pool is not None else Hand(bet)
+
+    def _release_hand(self, hand):
+        """
+        Takes back a hand removed from the player's hands.
+        """
+        if self.pool is not None:
+            self.pool.release(hand)
+
     def delete_hand(self, hand_index):
         """
         Deletes a specific hand by index.
@@ -49,31 +118,58 @@ class Player:
         if hand_index < 0 or hand_index >= len(self.hands):
             raise IndexError("Invalid hand index.")
         if len(self.hands) == 1:
-            print("for safety purposes plz dont delete last hand")
+            self.bus.emit(events.HAND_KEPT, player_id=self.id)
         else:
-            del self.hands[hand_index]
+            self._release_hand(self.hands.pop(hand_index))
 
     def reset_hands(self):
         """
         Resets the player's hands for a new game.
-        Keeps only the first hand and clears its state.
+        Keeps only the first hand and clears its state; the others go back to
+        the table's hand pool.
         """
         # Clear all hands except the first one
         while len(self.hands) > 1:
-            self.hands.pop(len(self.hands)-1)  # Always delete the last hand for simplicity
+            self._release_hand(self.hands.pop(len(self.hands)-1))  # Always delete the last hand for simplicity
 
         # Reset the first hand
         self.hands[0].reset()
 
-    def add_money(self, amount):
+    def add_money(self, amount, reason="add_money"):
         """
         Updates the player's balance.
 
         :param amount: Amount to add (negative for deductions)
+        :param reason: What the change is for, as logged to the player's ledger
         """
         if self.saldo + amount < 0:
             raise ValueError("Insufficient funds.")
         self.saldo += amount
+        self._record(amount, reason)
+
+    def _record(self, amount, reason):
+        """
+        Logs a change of the balance to the player's ledger, if it has one.
+        Every balance change of every player type goes through here.
+        """
+        if self.ledger is not None:
+            self.ledger.record(self, amount, reason)
+
+    def ledger_row(self, amount, reason):
+        """
+        Row of a balance change for the ledger; the balance is the player's own.
+
+        :return: Tuple of (player_id, account_id, name, amount, balance after it, reason)
+        """
+        return self.id, None, self.name, amount, self.saldo, reason
+
+    def settle(self, payout):
+        """
+        Collects the payout of a settled round (bets were already deducted).
+
+        :param payout: Amount paid back, stakes included
+        """
+        self.add_money(payout, "settle")
 
     def show_hands(self):
         """
@@ -92,11 +188,12 @@ class Player:
         :return: Bet amount if valid, -1 if the bet is invalid
         """
         if bet_amount > self.saldo:
-            print("Insufficient funds for this bet.")
+            self.bus.emit(events.BET_REJECTED, player_id=self.id, message="Insufficient funds for this bet.")
             return -1
         elif bet_amount <= 0:
-            print("Bet amount must be greater than zero.")
+            self.bus.emit(events.BET_REJECTED, player_id=self.id, message="Bet amount must be greater than zero.")
             return -1
         else:
             self.saldo -= bet_amount
+            self._record(-bet_amount, "bet")
             return bet_amount
@@ -0,0 +1,40 @@
+﻿"""
+Plays complete rounds at a BlackJack table with a fixed strategy: every
+hand hits until it reaches stand_on or the shoe runs out (seats with a strategy are played by
+strategy.autoplay instead), the table's dealer plays out its hand and
+BlackJack.settle pays out. Used by the simulation runners.
+"""
+from strategy import autoplay
+
+
+def play_round(game, bet=1, stand_on=17, blackjack_payout=1.5):
+    """
+    Deals, plays and settles one round for every player at the table.
+
+    :param game: BlackJack instance
+    :param bet: Bet placed on every player's hand
+    :param stand_on: Player hits while below this total
+    :param blackjack_payout: Payout for a player blackjack
+    :return: List of net amounts won, one per hand
+    """
+    for player in game.players.values():
+        player.reset_hands()
+    game.start_game()
+    for player in game.players.values():
+        game.add_pot(player.id, bet)
+
+    deck = game.deck
+    bots = False
+    for player in game.players.values():
+        if player.strategy is not None:
+            bots = True
+            continue
+        for index, hand in enumerate(player.hands):
+            if not hand.blackjack:
+                while hand.get_total() < stand_on and deck.remaining_cards():
+                    game.hit(player.id, index)
+    if bots:
+        autoplay(game)
+
+    game.play_dealer()
+    return game.settle(blackjack_payout)
@@ -0,0 +1,178 @@
+﻿"""
+Parallel Monte Carlo runner. Shards rounds into fixed-size chunks and plays
+them on a process pool. Each worker keeps one BlackJack table per set of
+table rules and reuses it from chunk to chunk, reseeding and resetting its
+shoe in place rather than building a new table, deck and player.
+
+Every chunk gets a seed spawned from one numpy SeedSequence, keyed by the
+chunk number, so a run gives the same results for any number of workers.
+Workers only send back merged Stats, never per-round data.
+"""
+import random
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from BJack import BlackJack
+from cardPack import Deck
+from events import EventBus
+from player import Player
+from rounds import play_round
+
+# Table rules of a chunk with their defaults, and the tables of this process by their values
+TABLE_RULES = (("num_decks", 6), ("penetration", 0.75), ("hit_soft_17", False), ("lazy_shuffle", False),
+               ("bankroll", 10 ** 12))
+_tables = {}
+
+
+class Stats:
+    """
+    Mergeable round statistics: outcome counts plus running mean and
+    variance of the net result (Welford/Chan).
+    """
+
+    def __init__(self):
+        self.rounds = 0
+        self.wins = 0
+        self.losses = 0
+        self.pushes = 0
+        self.net = 0.0
+        self.mean = 0.0
+        self.m2 = 0.0  # Sum of squared deviations from the mean
+
+    def add(self, result):
+        """
+        Adds the net result of one hand.
+
+        :param result: Net amount won (negative for a loss)
+        """
+        if result > 0:
+            self.wins += 1
+        elif result < 0:
+            self.losses += 1
+        else:
+            self.pushes += 1
+        self.rounds += 1
+        self.net += result
+        delta = result - self.mean
+        self.mean += delta / self.rounds
+        self.m2 += delta * (result - self.mean)
+
+    def merge(self, other):
+        """
+        Merges another Stats into this one.
+
+        :param other: Stats to merge
+        """
+        if not other.rounds:
+            return
+        rounds = self.rounds + other.rounds
+        delta = other.mean - self.mean
+        self.mean += delta * other.rounds / rounds
+        self.m2 += other.m2 + delta * delta * self.rounds * other.rounds / rounds
+        self.rounds = rounds
+        self.wins += other.wins
+        self.losses += other.losses
+        self.pushes += other.pushes
+        self.net += other.net
+
+    @property
+    def variance(self):
+        """
+        Population variance of the net result per hand.
+        """
+        return self.m2 / self.rounds if self.rounds else 0.0
+
+    def as_dict(self):
+        return {
+            "rounds": self.rounds,
+            "wins": self.wins,
+            "losses": self.losses,
+            "pushes": self.pushes,
+            "net": self.net,
+            "mean": self.mean,
+            "variance": self.variance,
+        }
+
+
+def chunk_seeds(seed, chunks):
+    """
+    Derives an independent integer seed for every chunk.
+
+    :param seed: Seed of the whole run
+    :param chunks: Number of chunks
+    :return: List of integer seeds, one per chunk
+    """
+    return [int(child.generate_state(1, np.uint64)[0]) for child in np.random.SeedSequence(seed).spawn(chunks)]
+
+
+def _table(table_rules, seed):
+    """
+    Returns this process's table for the given rules, ready to play as if
+    new: a reused table has its shoe reseeded and reset and its player's
+    balance restored, which deals exactly what a fresh deck would.
+
+    :param table_rules: Values of TABLE_RULES
+    :param seed: Seed for the table's shuffles
+    :return: BlackJack instance with one player seated
+    """
+    num_decks, penetration, hit_soft_17, lazy_shuffle, bankroll = table_rules
+    game = _tables.get(table_rules)
+    if game is None:
+        bus = EventBus()  # Workers run silent
+        deck = Deck(num_decks, penetration, random.Random(seed), lazy=lazy_shuffle)
+        game = _tables[table_rules] = BlackJack(num_decks, penetration, hit_soft_17, bus, deck=deck)
+        game.add_player(Player("Sim", bankroll, bus))
+        return game
+    game.deck.seed(seed)
+    game.deck.reset()
+    for player in game.players.values():
+        player.reset_hands()
+        player.saldo = bankroll
+    return game
+
+
+def run_chunk(rounds, seed, rules):
+    """
+    Plays rounds on this process's table. Runs inside a worker process.
+
+    :param rounds: Number of rounds to play
+    :param seed: Seed for the table's shuffles
+    :param rules: Dictionary with num_decks, penetration, hit_soft_17, lazy_shuffle, bankroll and play_round
+                  options
+    :return: Stats of the chunk
+    """
+    rules = dict(rules)
+    stats = Stats()
+    game = _table(tuple(rules.pop(name, default) for name, default in TABLE_RULES), seed)
+    for _ in range(rounds):
+        for result in play_round(game, **rules):
+            stats.add(result)
+    return stats
+
+
+def run(rounds, seed=0, workers=None, chunk_size=10_000, progress=None, **rules):
+    """
+    Plays rounds across a process pool and merges the results.
+
+    :param rounds: Total number of rounds
+    :param seed: Seed of the whole run
+    :param workers: Number of worker processes (defaults to the CPU count)
+    :param chunk_size: Rounds per chunk
+    :param progress: Optional callback called as progress(rounds_done, rounds) after every chunk
+    :param rules: num_decks, penetration, hit_soft_17, lazy_shuffle, bankroll and play_round options
+                  (bet, stand_on, ...)
+    :return: Merged Stats
+    """
+    sizes = [min(chunk_size, rounds - start) for start in range(0, rounds, chunk_size)]
+    seeds = chunk_seeds(seed, len(sizes))
+    total = Stats()
+    done = 0
+    with ProcessPoolExecutor(workers) as pool:
+        # Merge in chunk order so float sums do not depend on scheduling
+        for size, stats in zip(sizes, pool.map(run_chunk, sizes, seeds, [rules] * len(sizes))):
+            total.merge(stats)
+            done += size
+            if progress is not None:
+                progress(done, rounds)
+    return total
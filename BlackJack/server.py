@@ -0,0 +1,364 @@
+﻿"""
+Multi-table BlackJack server. Runs any number of tables in one asyncio
+event loop and takes player actions over TCP or a Unix socket.
+
+The protocol is newline-delimited JSON. Every request has an "op" and may
+carry an "id" that is echoed in the reply:
+
+    {"id": 1, "op": "join", "table": "t1", "name": "Alice", "saldo": 500}
+    {"id": 2, "op": "bet", "amount": 10}
+    {"id": 3, "op": "hit", "hand": 0}        (also "stay", "double", "split")
+
+A round starts once every player at the table has bet, or action_timeout
+seconds after the first bet: players who have not bet by then are unseated
+and the round starts without them. When a player does not act within
+action_timeout seconds, their open hands are stayed for them; every player
+has their own deadline, renewed by their own actions only. A
+player who leaves during a round has their hands stayed and settled with
+the round before they are removed.
+Replies and table events for a connection are queued and written together
+once per event loop pass.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import time
+
+from BJack import ERRORS, BlackJack
+from events import EventBus
+from player import Player
+
+
+class ActionError(Exception):
+    """Raised for a request that is not allowed in the current table state."""
+
+
+class Session:
+    """
+    One client connection. Outgoing messages are batched per loop pass.
+    """
+
+    def __init__(self, writer):
+        self.writer = writer
+        self.outbox = []
+        self.table = None
+        self.player = None
+
+    def send(self, message):
+        self.outbox.append(json.dumps(message, separators=(",", ":")))
+        if len(self.outbox) == 1:
+            asyncio.get_running_loop().call_soon(self.flush)
+
+    def flush(self):
+        if self.outbox and not self.writer.is_closing():
+            self.writer.write(("\n".join(self.outbox) + "\n").encode())
+        self.outbox.clear()
+
+
+class Table:
+    """
+    A BlackJack game plus the round bookkeeping the server needs: pending
+    bets, which hands still have to act, the action deadline of every
+    player with open hands and the deadline of the betting phase.
+    """
+
+    def __init__(self, table_id, action_timeout, num_decks=6, penetration=0.75, hit_soft_17=False, bus=None):
+        self.table_id = table_id
+        self.action_timeout = action_timeout
+        self.bus = bus if bus is not None else EventBus()  # Tables run headless by default
+        self.game = BlackJack(num_decks, penetration, hit_soft_17, self.bus)
+        self.sessions = {}  # player_id -> Session
+        self.bets = {}  # player_id -> bet for the next round
+        self.open_hands = set()  # (player_id, hand_index) still to act
+        self.in_round = False
+        self.deadlines = {}  # player_id -> action deadline, for players with open hands
+        self.betting_deadline = None  # When the round starts without the players who have not bet
+        self.leaving = set()  # Players who left during the round, removed once it is settled
+
+    def seat(self, session, name, saldo):
+        player = Player(name, saldo, self.bus)
+        self.game.add_player(player)
+        self.sessions[player.id] = session
+        return player
+
+    @property
+    def deadline(self):
+        """
+        The earliest action or betting deadline, or None when nothing is waiting.
+        """
+        deadline = min(self.deadlines.values(), default=None)
+        if self.betting_deadline is not None and (deadline is None or self.betting_deadline < deadline):
+            return self.betting_deadline
+        return deadline
+
+    def leave(self, player_id):
+        self.bets.pop(player_id, None)
+        self.sessions.pop(player_id, None)
+        if self.in_round:
+            # The bets are on the table: stay the hands and settle them with the round
+            self.close_hands(player_id)
+            self.leaving.add(player_id)
+            self.maybe_finish()
+        else:
+            self.game.remove_player(player_id)
+            if not self.bets:
+                self.betting_deadline = None
+            self.maybe_start()
+
+    def unseat(self, player_id):
+        """
+        Removes a player who did not bet in time; their connection stays open
+        and may join again.
+        """
+        session = self.sessions.pop(player_id)
+        session.send({"event": "timeout", "table": self.table_id})
+        session.table = session.player = None
+        self.game.remove_player(player_id)
+
+    def bet(self, player_id, amount):
+        player = self.game.players[player_id]
+        if self.in_round:
+            raise ActionError("round in progress")
+        if amount <= 0 or amount > player.saldo:
+            raise ActionError("invalid bet")
+        self.bets[player_id] = amount
+        if self.betting_deadline is None:
+            self.betting_deadline = time.monotonic() + self.action_timeout
+        self.maybe_start()
+
+    def maybe_start(self):
+        if self.in_round or not self.sessions or len(self.bets) < len(self.sessions):
+            return
+        for player in self.game.players.values():
+            player.reset_hands()
+        self.game.start_game()
+        for player_id, amount in self.bets.items():
+            self.game.add_pot(player_id, amount)
+        self.bets.clear()
+        self.betting_deadline = None
+        self.in_round = True
+        self.open_hands = {
+            (player_id, 0) for player_id, player in self.game.players.items() if not player.hands[0].blackjack
+        }
+        deadline = time.monotonic() + self.action_timeout
+        self.deadlines = {player_id: deadline for player_id, _ in self.open_hands}
+        self.broadcast_state()
+        self.maybe_finish()
+
+    def act(self, player_id, action, hand_index):
+        if (player_id, hand_index) not in self.open_hands:
+            raise ActionError("hand is not waiting for an action")
+        if action not in ("hit", "stay", "double", "split"):
+            raise ActionError(f"unknown action {action}")
+        ok, error, total, busted = self.game.apply_actions(((player_id, hand_index, action, 0),))
+        if not ok:
+            raise ActionError(ERRORS[error])
+        if action == "hit":
+            done = busted or total == 21
+        elif action == "split":
+            self.open_hands.add((player_id, len(self.game.players[player_id].hands) - 1))
+            done = False
+        else:
+            done = True
+        if done:
+            self.open_hands.discard((player_id, hand_index))
+        if any(key[0] == player_id for key in self.open_hands):
+            self.deadlines[player_id] = time.monotonic() + self.action_timeout
+        else:
+            self.deadlines.pop(player_id, None)
+
+    def close_hands(self, player_id):
+        self.open_hands = {key for key in self.open_hands if key[0] != player_id}
+        self.deadlines.pop(player_id, None)
+
+    def expire(self, now=None):
+        """
+        Stays the open hands of every player whose action deadline has passed.
+        Once the betting deadline has passed, unseats the players who have
+        not bet and starts the round.
+
+        :param now: time.monotonic() value to compare the deadlines with
+        """
+        now = time.monotonic() if now is None else now
+        if self.betting_deadline is not None and self.betting_deadline < now:
+            for player_id in [player_id for player_id in self.sessions if player_id not in self.bets]:
+                self.unseat(player_id)
+            self.maybe_start()
+        for player_id in [player_id for player_id, deadline in self.deadlines.items() if deadline < now]:
+            session = self.sessions.get(player_id)
+            if session is not None:
+                session.send({"event": "timeout", "table": self.table_id})
+            self.close_hands(player_id)
+        self.maybe_finish()
+
+    def maybe_finish(self):
+        if not self.in_round or self.open_hands:
+            return None
+        self.game.play_dealer()
+        dealer = self.game.dealer.hand
+        nets = iter(self.game.settle())
+        results = {
+            player_id: [next(nets) for _ in player.hands] for player_id, player in self.game.players.items()
+        }
+        self.in_round = False
+        self.deadlines.clear()
+        for player_id in self.leaving:
+            self.game.remove_player(player_id)
+        self.leaving.clear()
+        for player_id, session in self.sessions.items():
+            session.send({
+                "event": "round_over",
+                "table": self.table_id,
+                "dealer": [card.id for card in dealer.cards],
+                "results": results[player_id],
+                "saldo": self.game.players[player_id].saldo,
+            })
+        return results
+
+    def state(self, player_id):
+        player = self.game.players[player_id]
+        upcard = self.game.dealer.upcard()
+        return {
+            "table": self.table_id,
+            "in_round": self.in_round,
+            "saldo": player.saldo,
+            "dealer": [upcard.id] if self.in_round and upcard is not None else [],
+            "hands": [
+                {
+                    "cards": [card.id for card in hand.cards],
+                    "total": hand.get_total(),
+                    "bet": hand.bet,
+                    "busted": hand.busted,
+                    "open": (player_id, index) in self.open_hands,
+                }
+                for index, hand in enumerate(player.hands)
+            ],
+        }
+
+    def broadcast_state(self):
+        for player_id, session in self.sessions.items():
+            session.send(dict(self.state(player_id), event="state"))
+
+
+class GameServer:
+    """
+    Hosts tables in one event loop and serves the JSON line protocol.
+    """
+
+    def __init__(self, action_timeout=30.0, **rules):
+        self.action_timeout = action_timeout
+        self.rules = rules  # num_decks, penetration, hit_soft_17 and bus for new tables
+        self.tables = {}
+        self.server = None
+        self._watcher = None
+        self._table_ids = itertools.count(1)
+
+    async def start(self, host="127.0.0.1", port=0, path=None):
+        """
+        Starts listening on TCP (host, port) or on a Unix socket path.
+
+        :return: The address actually bound
+        """
+        if path is not None:
+            self.server = await asyncio.start_unix_server(self.handle, path=path)
+        else:
+            self.server = await asyncio.start_server(self.handle, host, port)
+        self._watcher = asyncio.create_task(self.watch_timeouts())
+        return self.server.sockets[0].getsockname()
+
+    async def close(self):
+        self._watcher.cancel()
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def watch_timeouts(self):
+        interval = min(1.0, self.action_timeout / 4)
+        while True:
+            await asyncio.sleep(interval)
+            now = time.monotonic()
+            for table in self.tables.values():
+                if table.deadline is not None and table.deadline < now:
+                    table.expire(now)
+
+    def table(self, table_id):
+        if table_id is None:
+            table_id = f"t{next(self._table_ids)}"
+        if table_id not in self.tables:
+            self.tables[table_id] = Table(table_id, self.action_timeout, **self.rules)
+        return self.tables[table_id]
+
+    async def handle(self, reader, writer):
+        session = Session(writer)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                self.dispatch(session, line)
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            if session.table is not None:
+                session.table.leave(session.player.id)
+            writer.close()
+
+    def dispatch(self, session, line):
+        request_id = None
+        try:
+            request = json.loads(line)
+            request_id = request.get("id")
+            reply = self.apply(session, request)
+            reply["ok"] = True
+        except (ActionError, ValueError, KeyError, TypeError) as error:
+            reply = {"ok": False, "error": str(error)}
+        if request_id is not None:
+            reply["id"] = request_id
+        session.send(reply)
+
+    def apply(self, session, request):
+        op = request["op"]
+        if op == "join":
+            if session.table is not None:
+                raise ActionError("already seated")
+            table = self.table(request.get("table"))
+            session.player = table.seat(session, request.get("name", "player"), request.get("saldo", 1000))
+            session.table = table
+            return {"player_id": session.player.id, "table": table.table_id}
+        if session.table is None:
+            raise ActionError("join a table first")
+        table = session.table
+        player_id = session.player.id
+        if op == "bet":
+            table.bet(player_id, request["amount"])
+        elif op in ("hit", "stay", "double", "split"):
+            table.act(player_id, op, request.get("hand", 0))
+            table.maybe_finish()
+        elif op != "state":
+            raise ActionError(f"unknown op {op}")
+        return table.state(player_id)
+
+
+async def serve(host, port, path, action_timeout):
+    server = GameServer(action_timeout)
+    address = await server.start(host, port, path)
+    print(f"Serving BlackJack on {address}")
+    await server.server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the multi-table BlackJack server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", help="Unix socket path (instead of TCP)")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Per-action timeout in seconds")
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port, args.unix, args.timeout))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+﻿"""
+Headless simulator. Streams one record per round as JSONL or CSV and
+prints a summary to stderr when done:
+
+    python -m BlackJack --rounds 100000 --players 3 --strategy basic > rounds.jsonl
+    python -m BlackJack --engine vector --rounds 1000000 --format csv --output rounds.csv
+
+With --rounds 0 it plays until interrupted. Ctrl-C (SIGINT) stops after the
+current round; everything written so far is flushed and the summary covers
+the rounds played. The table engine never imports NumPy; only the vector
+engine does.
+"""
+import argparse
+import json
+import signal
+import sys
+import threading
+
+from pipeline import CsvWriter, JsonlWriter, Summary, aggregate, table_rounds, vector_rounds
+
+
+def build_records(args, stop):
+    rounds = args.rounds or None
+    if args.engine == "vector":
+        return vector_rounds(rounds, args.seed, num_decks=args.decks, stop=stop, stand_on=args.stand_on,
+                             hit_soft_17=args.hit_soft_17, blackjack_payout=args.blackjack_payout)
+
+    from BJack import BlackJack
+    from cardPack import Deck
+    from events import EventBus
+    from player import Player
+
+    strategy = None
+    if args.strategy == "basic":
+        from strategy import ChartStrategy
+        strategy = ChartStrategy.preset(args.hit_soft_17)
+    bus = EventBus()  # Run silent
+    deck = Deck(args.decks, args.penetration, seed=args.seed, lazy=args.lazy_shuffle)
+    game = BlackJack(args.decks, args.penetration, args.hit_soft_17, bus, deck=deck)
+    for seat in range(args.players):
+        game.add_player(Player(f"Seat {seat + 1}", 10 ** 12, bus, strategy))
+    return table_rounds(game, rounds, args.bet, args.stand_on, args.blackjack_payout, stop)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulate BlackJack rounds and stream the results.")
+    parser.add_argument("--rounds", type=int, default=10_000, help="Rounds to play (0 = until interrupted)")
+    parser.add_argument("--engine", choices=("table", "vector"), default="table",
+                        help="table plays BlackJack objects; vector uses the NumPy batch simulator")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--players", type=int, default=1)
+    parser.add_argument("--decks", type=int, default=6)
+    parser.add_argument("--penetration", type=float, default=0.75)
+    parser.add_argument("--bet", type=float, default=1)
+    parser.add_argument("--stand-on", type=int, default=17, help="Fixed strategy: hit below this total")
+    parser.add_argument("--strategy", choices=("fixed", "basic"), default="fixed")
+    parser.add_argument("--hit-soft-17", action="store_true")
+    parser.add_argument("--blackjack-payout", type=float, default=1.5)
+    parser.add_argument("--lazy-shuffle", action="store_true")
+    parser.add_argument("--format", choices=("jsonl", "csv"), default="jsonl")
+    parser.add_argument("--output", help="Output file (defaults to stdout)")
+    parser.add_argument("--flush-every", type=int, default=1000, help="Records between flushes")
+    args = parser.parse_args(argv)
+
+    stop = threading.Event()
+    previous = signal.signal(signal.SIGINT, lambda signum, frame: stop.set())
+    file = open(args.output, "w", newline="", encoding="utf-8") if args.output else sys.stdout
+    summary = Summary()
+    try:
+        writer_class = CsvWriter if args.format == "csv" else JsonlWriter
+        with writer_class(file, args.flush_every) as writer:
+            for record in aggregate(build_records(args, stop), summary):
+                writer.write(record)
+    finally:
+        signal.signal(signal.SIGINT, previous)
+        if file is not sys.stdout:
+            file.close()
+    result = summary.result()
+    result["interrupted"] = stop.is_set()
+    print(json.dumps(result), file=sys.stderr)
+    return 130 if stop.is_set() else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,143 @@
+﻿"""
+Vectorized round simulator. Plays whole batches of rounds at once with
+NumPy, one freshly shuffled shoe per round.
+
+Rounds follow the same rules as Hand and BlackJack: every shoe row is dealt
+from its end like Deck.draw, the player gets two cards and then the dealer
+two, the player hits until reaching stand_on (or doubles on the listed hard
+totals), and the dealer draws to 17. There is no hole-card peek, so a dealer
+blackjack beats everything except a player blackjack.
+"""
+import numpy as np
+from card import CARDS
+
+
+# Per card id lookups: value with Aces as 1, and the Ace flag
+HARD_POINTS = np.array([1 if card.is_ace else card.points for card in CARDS], dtype=np.int16)
+ACES = np.array([card.is_ace for card in CARDS], dtype=np.int16)
+
+
+def shuffled_shoes(rng, rounds, num_decks=1):
+    """
+    Builds one independently shuffled shoe per round.
+
+    :param rng: numpy.random.Generator
+    :param rounds: Number of shoes (rows) to build
+    :param num_decks: Decks per shoe
+    :return: uint8 array of card ids, shape (rounds, 52 * num_decks); the top card is last
+    """
+    shoe = np.tile(np.arange(len(CARDS), dtype=np.uint8), num_decks)
+    return rng.permuted(np.broadcast_to(shoe, (rounds, shoe.size)), axis=1)
+
+
+def hand_totals(hard, aces):
+    """
+    Best totals for arrays of hard totals and Ace counts (one Ace counts 11 if it fits).
+    """
+    return hard + 10 * ((aces > 0) & (hard <= 11))
+
+
+def _draw(shoes, rows, pos, hard, aces):
+    card = shoes[rows, pos[rows]]
+    pos[rows] -= 1
+    hard[rows] += HARD_POINTS[card]
+    aces[rows] += ACES[card]
+
+
+def simulate_batch(shoes, stand_on=17, double_on=(), hit_soft_17=False, blackjack_payout=1.5):
+    """
+    Plays one round per shoe row for a single player with a one unit bet.
+
+    :param shoes: Array of card ids as returned by shuffled_shoes
+    :param stand_on: Player hits while below this total
+    :param double_on: Hard two-card totals the player doubles on
+    :param hit_soft_17: Dealer hits soft 17 (H17) instead of standing (S17)
+    :param blackjack_payout: Payout for a player blackjack
+    :return: Float array of net units won per round
+    """
+    n = shoes.shape[0]
+    top = shoes.shape[1] - 1
+    everyone = np.arange(n)
+    pos = np.full(n, top, dtype=np.intp)
+    p_hard = np.zeros(n, dtype=np.int16)
+    p_aces = np.zeros(n, dtype=np.int16)
+    d_hard = np.zeros(n, dtype=np.int16)
+    d_aces = np.zeros(n, dtype=np.int16)
+
+    # Deal: two cards to the player, then two to the dealer
+    _draw(shoes, everyone, pos, p_hard, p_aces)
+    _draw(shoes, everyone, pos, p_hard, p_aces)
+    _draw(shoes, everyone, pos, d_hard, d_aces)
+    _draw(shoes, everyone, pos, d_hard, d_aces)
+    p_natural = (p_aces > 0) & (p_hard == 11)
+    d_natural = (d_aces > 0) & (d_hard == 11)
+
+    # Player: double on the listed hard totals, otherwise hit to stand_on
+    bet = np.ones(n)
+    doubled = ~p_natural & (p_aces == 0) & np.isin(p_hard, double_on)
+    rows = np.flatnonzero(doubled)
+    _draw(shoes, rows, pos, p_hard, p_aces)
+    bet[rows] = 2
+
+    rows = np.flatnonzero(~p_natural & ~doubled & (hand_totals(p_hard, p_aces) < stand_on))
+    while rows.size:
+        _draw(shoes, rows, pos, p_hard, p_aces)
+        rows = rows[hand_totals(p_hard[rows], p_aces[rows]) < stand_on]
+
+    # Dealer draws to 17
+    rows = everyone
+    while rows.size:
+        total = hand_totals(d_hard[rows], d_aces[rows])
+        hits = total < 17
+        if hit_soft_17:
+            hits |= (total == 17) & (d_hard[rows] == 7) & (d_aces[rows] > 0)
+        rows = rows[hits]
+        _draw(shoes, rows, pos, d_hard, d_aces)
+
+    # Settle against the dealer
+    p_total = hand_totals(p_hard, p_aces)
+    d_total = hand_totals(d_hard, d_aces)
+    net = np.sign(p_total - d_total) * bet
+    net[d_total > 21] = bet[d_total > 21]
+    net[p_total > 21] = -bet[p_total > 21]
+    net[d_natural] = -bet[d_natural]
+    net[p_natural] = blackjack_payout
+    net[p_natural & d_natural] = 0
+    return net
+
+
+def simulate(rounds, seed=None, batch_size=100_000, num_decks=1, **rules):
+    """
+    Simulates rounds in batches and summarizes the results.
+
+    :param rounds: Total number of rounds
+    :param seed: Seed for numpy.random.default_rng
+    :param batch_size: Rounds played per batch
+    :param num_decks: Decks per shoe
+    :param rules: Passed on to simulate_batch
+    :return: Dictionary with rounds, wins, losses, pushes, net, mean and variance
+    """
+    rng = np.random.default_rng(seed)
+    wins = losses = pushes = 0
+    net = squares = 0.0
+    done = 0
+    while done < rounds:
+        size = min(batch_size, rounds - done)
+        result = simulate_batch(shuffled_shoes(rng, size, num_decks), **rules)
+        wins += int(np.count_nonzero(result > 0))
+        losses += int(np.count_nonzero(result < 0))
+        pushes += int(np.count_nonzero(result == 0))
+        net += float(result.sum())
+        squares += float(np.square(result).sum())
+        done += size
+    mean = net / rounds if rounds else 0.0
+    variance = squares / rounds - mean * mean if rounds else 0.0
+    return {
+        "rounds": rounds,
+        "wins": wins,
+        "losses": losses,
+        "pushes": pushes,
+        "net": net,
+        "mean": mean,
+        "variance": variance,
+    }
@@ -0,0 +1,226 @@
+﻿"""
+Compact, versioned binary snapshots of a whole BlackJack table.
+
+A snapshot holds the table rules and round number, the shoe as card ids
+(plus the discard pile, the lazy-shuffle state and the state of a
+random.Random shuffler), the
+dealer's hand and every player's ID, name, saldo and hands (bet, busted and
+split flags, card ids). All integers are little-endian.
+
+restore() reads the buffer through a memoryview with struct.unpack_from,
+building the deck unshuffled and copying the shoe's card ids once, straight
+from the buffer into the deck's array; restoring one snapshot many times
+gives independent "what-if" continuations of the same table.
+
+The state of a numpy Generator shuffler is not saved: a deck restored from
+such a table shuffles with a fresh random.Random, so its later rounds do not
+replay the original's.
+
+The counting systems tracked on the deck are saved by name; their running
+counts follow from the undealt cards, so the restored deck recomputes them.
+Only the systems in counting.SYSTEMS can be saved.
+"""
+import math
+import random
+import struct
+
+from card import CARDS
+from cardPack import Deck
+from counting import SYSTEMS
+from hand import Hand
+from player import Player
+
+MAGIC = b"BJAK"
+VERSION = 1
+
+HEADER = struct.Struct("<4sH")
+TABLE = struct.Struct("<Hd?qIII")  # num_decks, penetration, hit_soft_17, round_number, capacity, top, discards
+RNG_STATE = struct.Struct("<B625Id")  # version, Mersenne Twister state, gauss_next (NaN if None)
+LAZY = struct.Struct("<?I")  # lazy, unshuffled
+PLAYER = struct.Struct("<qH")  # id, name length
+HAND = struct.Struct("<BB")  # flags, card count
+COUNT = struct.Struct("<I")
+BYTE = struct.Struct("<B")
+NUMBER = struct.Struct("<B8s")  # kind (0 int, 1 float), value
+
+BUSTED = 1
+FROM_SPLIT = 2
+
+NO_SEED = 0
+INT_SEED = 1
+STR_SEED = 2
+
+
+def _pack_number(out, value):
+    if isinstance(value, int):
+        out += NUMBER.pack(0, struct.pack("<q", value))
+    else:
+        out += NUMBER.pack(1, struct.pack("<d", value))
+
+
+def _unpack_number(view, offset):
+    kind, raw = NUMBER.unpack_from(view, offset)
+    value = struct.unpack("<q" if kind == 0 else "<d", raw)[0]
+    return value, offset + NUMBER.size
+
+
+def _pack_text(out, text):
+    data = text.encode("utf-8")
+    out += struct.pack("<H", len(data))
+    out += data
+
+
+def _pack_hand(out, hand):
+    _pack_number(out, hand.bet)
+    flags = (BUSTED if hand.busted else 0) | (FROM_SPLIT if hand.from_split else 0)
+    out += HAND.pack(flags, len(hand.cards))
+    out += bytes(card.id for card in hand.cards)
+
+
+def _unpack_hand(view, offset):
+    bet, offset = _unpack_number(view, offset)
+    flags, count = HAND.unpack_from(view, offset)
+    offset += HAND.size
+    hand = Hand(bet)
+    hand.from_split = bool(flags & FROM_SPLIT)
+    hand.cards = [CARDS[card_id] for card_id in view[offset:offset + count]]
+    hand.busted = bool(flags & BUSTED)
+    return hand, offset + count
+
+
+def snapshot(game):
+    """
+    Saves a table.
+
+    :param game: BlackJack instance
+    :return: bytes
+    """
+    deck = game.deck
+    for system in deck._counters:
+        if SYSTEMS.get(system.name) is not system:
+            raise ValueError(f"Cannot save the counting system {system.name}; only built-in systems can be saved.")
+    out = bytearray(HEADER.pack(MAGIC, VERSION))
+    penetration = math.nan if deck.penetration is None else deck.penetration
+    out += TABLE.pack(deck.num_decks, penetration, game.dealer.hit_soft_17, game.round_number,
+                      len(deck._ids), deck.remaining_cards(), len(deck.discard_pile))
+    out += LAZY.pack(deck.lazy, deck._unshuffled)
+    out += BYTE.pack(len(deck._counters))
+    for system in deck._counters:
+        _pack_text(out, system.name)
+    if game.seed is None:
+        out += BYTE.pack(NO_SEED)
+    else:
+        out += BYTE.pack(INT_SEED if isinstance(game.seed, int) else STR_SEED)
+        _pack_text(out, str(game.seed))
+    out += deck._ids
+    out += bytes(card.id for card in deck.discard_pile)
+
+    if isinstance(deck.rng, random.Random):
+        version, state, gauss = deck.rng.getstate()
+        out += BYTE.pack(1)
+        out += RNG_STATE.pack(version, *state, math.nan if gauss is None else gauss)
+    else:
+        out += BYTE.pack(0)  # Other generators are not saved
+
+    _pack_number(out, game.dealer.saldo)
+    _pack_hand(out, game.dealer.hand)
+
+    out += COUNT.pack(len(game.players))
+    for player in game.players.values():
+        name = player.name.encode("utf-8")
+        out += PLAYER.pack(player.id, len(name))
+        out += name
+        _pack_number(out, player.saldo)
+        out += BYTE.pack(len(player.hands))
+        for hand in player.hands:
+            _pack_hand(out, hand)
+    return bytes(out)
+
+
+def restore(buf, bus=None, cls=None):
+    """
+    Rebuilds a table from a snapshot.
+
+    :param buf: bytes-like snapshot
+    :param bus: Event bus for the restored table and players
+    :param cls: Table class to build (defaults to BlackJack)
+    :return: BlackJack instance
+    """
+    if cls is None:
+        from BJack import BlackJack as cls
+    view = memoryview(buf).cast("B")
+    magic, version = HEADER.unpack_from(view, 0)
+    if magic != MAGIC:
+        raise ValueError("Not a BlackJack snapshot.")
+    if version != VERSION:
+        raise ValueError(f"Unsupported snapshot version {version}.")
+    offset = HEADER.size
+    num_decks, penetration, hit_soft_17, round_number, capacity, top, discards = TABLE.unpack_from(view, offset)
+    offset += TABLE.size
+    lazy, unshuffled = LAZY.unpack_from(view, offset)
+    offset += LAZY.size
+    systems = view[offset]
+    offset += 1
+    count_systems = []
+    for _ in range(systems):
+        length = struct.unpack_from("<H", view, offset)[0]
+        offset += 2
+        name = str(view[offset:offset + length], "utf-8")
+        offset += length
+        if name not in SYSTEMS:
+            raise ValueError(f"Unknown counting system {name}.")
+        count_systems.append(SYSTEMS[name])
+
+    seed_kind = view[offset]
+    offset += 1
+    seed = None
+    if seed_kind != NO_SEED:
+        length = struct.unpack_from("<H", view, offset)[0]
+        offset += 2
+        seed = str(view[offset:offset + length], "utf-8")
+        offset += length
+        if seed_kind == INT_SEED:
+            seed = int(seed)
+
+    ids = view[offset:offset + capacity]
+    offset += capacity
+    discard_pile = [CARDS[card_id] for card_id in view[offset:offset + discards]]
+    offset += discards
+
+    rng_state = None
+    if view[offset]:
+        fields = RNG_STATE.unpack_from(view, offset + 1)
+        gauss = None if math.isnan(fields[-1]) else fields[-1]
+        rng_state = (fields[0], fields[1:-1], gauss)
+        offset += RNG_STATE.size
+    offset += 1
+
+    rng = random.Random()
+    if rng_state is not None:
+        rng.setstate(rng_state)
+    deck = Deck(num_decks, None if math.isnan(penetration) else penetration, rng, count_systems=count_systems,
+                lazy=lazy, shuffle=False)
+    deck.load(ids, top, discard_pile, unshuffled)
+    game = cls(num_decks, deck.penetration, hit_soft_17, bus, seed, deck=deck)
+    game.round_number = round_number
+
+    game.dealer.saldo, offset = _unpack_number(view, offset)
+    game.dealer.hand, offset = _unpack_hand(view, offset)
+
+    players = COUNT.unpack_from(view, offset)[0]
+    offset += COUNT.size
+    for _ in range(players):
+        player_id, length = PLAYER.unpack_from(view, offset)
+        offset += PLAYER.size
+        name = str(view[offset:offset + length], "utf-8")
+        offset += length
+        saldo, offset = _unpack_number(view, offset)
+        count = view[offset]
+        offset += 1
+        hands = []
+        for _ in range(count):
+            hand, offset = _unpack_hand(view, offset)
+            hands.append(hand)
+        player = game.players[player_id] = Player.from_state(player_id, name, saldo, hands, game.bus)
+        player.pool = game.hand_pool
+    return game
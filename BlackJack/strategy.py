@@ -0,0 +1,345 @@
+﻿"""
+Lookup-table strategies for automated players.
+
+A strategy chart gives an action for every player hand and dealer upcard.
+compile_chart turns it into a flat table of action codes indexed by
+
+    ((total * 2 + soft) * 2 + pair) * 10 + upcard slot
+
+so every decision is one table lookup. Charts are CSV files: a header row
+with the upcards and one row per hand, labelled H<total>, S<total> or
+P<card> (pairs), with the codes H (hit), S (stay), D (double, else hit),
+Ds (double, else stay) and P (split):
+
+    hand,2,3,4,5,6,7,8,9,T,A
+    H12,H,H,S,S,S,H,H,H,H,H
+    S18,S,Ds,Ds,Ds,Ds,S,S,H,H,H
+    P8,P,P,P,P,P,P,P,P,P,P
+
+Hands missing from a chart hit below hard 17 / soft 18 and stay otherwise;
+missing pairs play like the same total without splitting.
+
+Deviations change cells by true count. compile_deviations builds one table
+per whole true count, so the count only picks the table. A Player seat with
+a strategy is played by autoplay().
+"""
+import abc
+import csv
+
+from card import VALUE_SLOTS
+
+# Action codes in the compiled tables
+HIT = 1
+STAY = 2
+DOUBLE_HIT = 3
+DOUBLE_STAY = 4
+SPLIT = 5
+CODES = {"H": HIT, "S": STAY, "D": DOUBLE_HIT, "DS": DOUBLE_STAY, "P": SPLIT}
+
+# Action (BlackJack method name) per code, with and without doubling allowed
+ACTIONS = (None, "hit", "stay", "double", "double", "split")
+ACTIONS_NO_DOUBLE = (None, "hit", "stay", "hit", "stay", "split")
+
+UPCARDS = ("2", "3", "4", "5", "6", "7", "8", "9", "T", "A")
+SLOT_BY_UPCARD = {label: (0 if label == "A" else 9 if label == "T" else int(label) - 1) for label in UPCARDS}
+CELLS = 22 * 2 * 2 * VALUE_SLOTS
+
+# Basic strategy for a multi-deck shoe, dealer stands on soft 17, double after split
+BASIC_S17 = """\
+hand,2,3,4,5,6,7,8,9,T,A
+H8,H,H,H,H,H,H,H,H,H,H
+H9,H,D,D,D,D,H,H,H,H,H
+H10,D,D,D,D,D,D,D,D,H,H
+H11,D,D,D,D,D,D,D,D,D,H
+H12,H,H,S,S,S,H,H,H,H,H
+H13,S,S,S,S,S,H,H,H,H,H
+H14,S,S,S,S,S,H,H,H,H,H
+H15,S,S,S,S,S,H,H,H,H,H
+H16,S,S,S,S,S,H,H,H,H,H
+H17,S,S,S,S,S,S,S,S,S,S
+S13,H,H,H,D,D,H,H,H,H,H
+S14,H,H,H,D,D,H,H,H,H,H
+S15,H,H,D,D,D,H,H,H,H,H
+S16,H,H,D,D,D,H,H,H,H,H
+S17,H,D,D,D,D,H,H,H,H,H
+S18,S,Ds,Ds,Ds,Ds,S,S,H,H,H
+S19,S,S,S,S,S,S,S,S,S,S
+P2,P,P,P,P,P,P,H,H,H,H
+P3,P,P,P,P,P,P,H,H,H,H
+P4,H,H,H,P,P,H,H,H,H,H
+P5,D,D,D,D,D,D,D,D,H,H
+P6,P,P,P,P,P,H,H,H,H,H
+P7,P,P,P,P,P,P,H,H,H,H
+P8,P,P,P,P,P,P,P,P,P,P
+P9,P,P,P,P,P,S,P,P,S,S
+PT,S,S,S,S,S,S,S,S,S,S
+PA,P,P,P,P,P,P,P,P,P,P
+"""
+
+# Cells that differ when the dealer hits soft 17
+H17_CHANGES = {("H11", "A"): "D", ("S18", "2"): "Ds", ("S19", "6"): "Ds"}
+
+# Hi-Lo index plays (the "Illustrious 18" without insurance):
+# (hand, upcard, index, code, below). The code applies at true counts >= index,
+# or < index if below is set.
+ILLUSTRIOUS_18 = (
+    ("H16", "T", 0, "S", False),
+    ("H15", "T", 4, "S", False),
+    ("PT", "5", 5, "P", False),
+    ("PT", "6", 4, "P", False),
+    ("H10", "T", 4, "D", False),
+    ("H12", "3", 2, "S", False),
+    ("H12", "2", 3, "S", False),
+    ("H11", "A", 1, "D", False),
+    ("H9", "2", 1, "D", False),
+    ("H10", "A", 4, "D", False),
+    ("H9", "7", 3, "D", False),
+    ("H16", "9", 5, "S", False),
+    ("H13", "2", -1, "H", True),
+    ("H12", "4", 0, "H", True),
+    ("H12", "5", -2, "H", True),
+    ("H12", "6", -1, "H", True),
+    ("H13", "3", -2, "H", True),
+)
+
+
+def cell(total, soft, pair, upcard_slot):
+    """
+    Index of a hand and upcard in a compiled table.
+    """
+    return ((total * 2 + soft) * 2 + pair) * VALUE_SLOTS + upcard_slot
+
+
+def _row(label):
+    """
+    (total, soft, pair) of a chart row label such as H12, S18, P8 or PA.
+    """
+    kind, rank = label[0].upper(), label[1:].upper()
+    if kind == "P":
+        if rank == "A":
+            return 12, 1, 1
+        return (20 if rank == "T" else 2 * int(rank)), 0, 1
+    if kind not in "HS" or not rank.isdigit():
+        raise ValueError(f"Unknown chart row {label!r}.")
+    return int(rank), int(kind == "S"), 0
+
+
+def _code(text):
+    try:
+        return CODES[text.strip().upper()]
+    except KeyError:
+        raise ValueError(f"Unknown chart code {text!r}.") from None
+
+
+def parse_chart(lines):
+    """
+    Reads a CSV chart.
+
+    :param lines: Iterable of CSV lines (an open file or str.splitlines())
+    :return: Dictionary of (row label, upcard label) -> code text
+    """
+    reader = csv.reader(lines)
+    header = [label.strip().upper() for label in next(reader)[1:]]
+    for label in header:
+        if label not in SLOT_BY_UPCARD:
+            raise ValueError(f"Unknown upcard {label!r}.")
+    chart = {}
+    for row in reader:
+        if not row or not row[0].strip():
+            continue
+        label = row[0].strip().upper()
+        for upcard, text in zip(header, row[1:]):
+            chart[label, upcard] = text
+    return chart
+
+
+def compile_chart(chart):
+    """
+    Compiles a chart into a flat table of action codes.
+
+    :param chart: Dictionary of (row label, upcard label) -> code text, as from parse_chart
+    :return: bytearray of CELLS action codes
+    """
+    table = bytearray(CELLS)
+    for total in range(22):
+        for soft in (0, 1):
+            default = STAY if total >= (18 if soft else 17) else HIT
+            for slot in range(VALUE_SLOTS):
+                table[cell(total, soft, 0, slot)] = default
+
+    pairs = []
+    for (label, upcard), text in chart.items():
+        total, soft, pair = _row(label)
+        if pair:
+            pairs.append((total, soft, SLOT_BY_UPCARD[upcard], _code(text)))
+            continue
+        table[cell(total, soft, 0, SLOT_BY_UPCARD[upcard])] = _code(text)
+
+    # Pairs play like their total unless the chart says otherwise
+    for total in range(22):
+        for soft in (0, 1):
+            for slot in range(VALUE_SLOTS):
+                table[cell(total, soft, 1, slot)] = table[cell(total, soft, 0, slot)]
+    for total, soft, slot, code in pairs:
+        table[cell(total, soft, 1, slot)] = code
+    return table
+
+
+def compile_deviations(table, deviations, min_count=-10, max_count=10):
+    """
+    Builds one table per whole true count from min_count to max_count.
+
+    :param table: Compiled base table
+    :param deviations: Iterable of (row label, upcard label, index, code text, below)
+    :return: bytearray of (max_count - min_count + 1) * CELLS action codes
+    """
+    tables = bytearray()
+    for true_count in range(min_count, max_count + 1):
+        counted = bytearray(table)
+        for label, upcard, index, text, below in deviations:
+            if (true_count < index) if below else (true_count >= index):
+                total, soft, pair = _row(label)
+                counted[cell(total, soft, pair, SLOT_BY_UPCARD[upcard])] = _code(text)
+        tables += counted
+    return tables
+
+
+class Strategy(abc.ABC):
+    """
+    Decides the actions of an automated player. count_system is the
+    counting.CountSystem whose true count decide() needs, or None.
+    """
+    count_system = None
+
+    @abc.abstractmethod
+    def decide(self, hand, upcard, can_double=True, can_split=False, true_count=0):
+        """
+        Picks the next action for a hand.
+
+        :param hand: Hand to play
+        :param upcard: Dealer's upcard
+        :param can_double: Doubling is allowed
+        :param can_split: The hand is a pair that may be split
+        :param true_count: True count of count_system (truncated to a whole count)
+        :return: "hit", "stay", "double" or "split"
+        """
+
+
+class ChartStrategy(Strategy):
+    """
+    Strategy backed by compiled tables.
+
+    :param tables: One compiled table, or consecutive tables per true count
+    :param count_system: Counting system that picks the table, if there are several
+    :param min_count: True count of the first table
+    """
+
+    def __init__(self, tables, count_system=None, min_count=0):
+        if not tables or len(tables) % CELLS:
+            raise ValueError("Tables must hold a whole number of compiled charts.")
+        self.tables = bytes(tables)
+        self.count_system = count_system
+        self.min_count = min_count
+        self.max_offset = (len(tables) // CELLS - 1) * CELLS
+
+    @classmethod
+    def from_csv(cls, path, deviations=None, count_system=None, min_count=-10, max_count=10):
+        """
+        Loads a chart (and optional deviations for count_system) from CSV files.
+
+        :param path: Chart CSV file
+        :param deviations: Optional CSV file with rows of hand, upcard, index, code and "+"
+                           (at or above the index) or "-" (below it)
+        """
+        with open(path, newline="", encoding="utf-8") as file:
+            table = compile_chart(parse_chart(file))
+        if deviations is None:
+            return cls(table)
+        with open(deviations, newline="", encoding="utf-8") as file:
+            rows = [
+                (row[0].strip(), row[1].strip().upper(), int(row[2]), row[3], row[4].strip() == "-")
+                for row in csv.reader(file) if row and not row[0].startswith("#")
+            ]
+        return cls(compile_deviations(table, rows, min_count, max_count), count_system, min_count)
+
+    @classmethod
+    def preset(cls, hit_soft_17=False, deviations=(), count_system=None, min_count=-10, max_count=10):
+        """
+        Built-in basic strategy, optionally with deviations such as
+        ILLUSTRIOUS_18 (for counting.HI_LO).
+
+        :param hit_soft_17: Basic strategy for a dealer who hits soft 17
+        :param deviations: Iterable of (row label, upcard label, index, code text, below)
+        """
+        chart = parse_chart(BASIC_S17.splitlines())
+        if hit_soft_17:
+            chart.update(H17_CHANGES)
+        table = compile_chart(chart)
+        if not deviations:
+            return cls(table)
+        return cls(compile_deviations(table, deviations, min_count, max_count), count_system, min_count)
+
+    def decide(self, hand, upcard, can_double=True, can_split=False, true_count=0):
+        hard = hand.hard_total
+        if hard > 21:
+            return "stay"
+        soft = hand.aces > 0 and hard <= 11
+        offset = 0
+        if self.count_system is not None:
+            offset = min(max((int(true_count) - self.min_count) * CELLS, 0), self.max_offset)
+        code = self.tables[offset + ((((hard + 10 if soft else hard) * 2 + soft) * 2 + can_split) * VALUE_SLOTS)
+                           + upcard.slot]
+        return ACTIONS[code] if can_double else ACTIONS_NO_DOUBLE[code]
+
+
+def autoplay(game, max_hands=4):
+    """
+    Plays every hand of every seat that has a strategy, after the deal and
+    bets. A split pair of Aces gets one card per hand. An action that leaves
+    the hand as it was (a double or split the seat has no money or room for,
+    a hit on an empty shoe) is not offered again: the strategy decides anew
+    without it, and a hand that cannot hit stays.
+
+    :param game: BlackJack instance
+    :param max_hands: Most hands a seat may split into
+    """
+    deck = game.deck
+    upcard = game.dealer.upcard()
+    for player in list(game.players.values()):
+        strategy = player.strategy
+        if strategy is None:
+            continue
+        system = strategy.count_system
+        hands = player.hands
+        index = 0
+        while index < len(hands):
+            hand = hands[index]
+            refused = ()  # Actions that failed on this hand
+            while not hand.busted and not hand.blackjack and hand.get_total() < 21:
+                cards = hand.cards
+                if hand.from_split and cards[0].is_ace:
+                    break
+                two_cards = len(cards) == 2
+                can_double = two_cards and player.saldo >= hand.bet and "double" not in refused
+                can_split = (two_cards and player.saldo >= hand.bet and len(hands) < max_hands
+                             and cards[0].points == cards[1].points and "split" not in refused)
+                true_count = deck.true_count(system) if system is not None else 0
+                action = strategy.decide(hand, upcard, can_double, can_split, true_count)
+                before = (len(cards), hand.bet, len(hands))
+                if action == "hit":
+                    game.hit(player.id, index)
+                elif action == "double":
+                    game.double(player.id, index)
+                elif action == "split":
+                    game.split(player.id, index)
+                else:
+                    game.stay(player.id, index)
+                    break
+                if (len(hand.cards), hand.bet, len(hands)) == before:
+                    if action == "hit":
+                        game.stay(player.id, index)
+                        break
+                    refused += (action,)
+                elif action == "double":
+                    break
+            index += 1
@@ -0,0 +1,336 @@
+﻿"""
+Struct-of-arrays table state for very large tables.
+
+TableState keeps every seat's balance and every hand's bet, running totals,
+flags and cards in flat typed arrays. Hand ids are seat * hands_per_seat +
+hand number, and a hand's cards live in a fixed block of max_cards card ids.
+
+SeatView and HandView are thin views with the Player and Hand API, so a
+BlackJack table can seat them like ordinary players. Money is kept in whole
+amounts, in int64 columns. Views are created once
+with the state; dealing and totalling only touch the arrays.
+"""
+import math
+from array import array
+
+import events
+from card import CARDS
+from hand import HandPool
+from player import Player
+
+
+class CardsView:
+    """
+    List-like view of the cards of one hand.
+    """
+    __slots__ = ("_hand",)
+
+    def __init__(self, hand):
+        self._hand = hand
+
+    def __len__(self):
+        return self._hand.state.ncards[self._hand.hand_id]
+
+    def __getitem__(self, index):
+        return self._list()[index]
+
+    def __iter__(self):
+        return iter(self._list())
+
+    def __eq__(self, other):
+        return self._list() == list(other)
+
+    def _list(self):
+        hand = self._hand
+        start = hand.hand_id * hand.state.max_cards
+        return [CARDS[card_id] for card_id in hand.state.cards[start:start + len(self)]]
+
+    def append(self, card):
+        self._hand.add_card(card)
+
+    def pop(self, index=-1):
+        return self._hand.remove_card(index)
+
+    def clear(self):
+        self._hand.clear()
+
+    def __repr__(self):
+        return repr(self._list())
+
+
+class HandView:
+    """
+    Hand API over one hand slot of a TableState.
+    """
+    __slots__ = ("state", "hand_id", "_cards")
+
+    def __init__(self, state, hand_id):
+        self.state = state
+        self.hand_id = hand_id
+        self._cards = CardsView(self)
+
+    @property
+    def cards(self):
+        return self._cards
+
+    @property
+    def bet(self):
+        return self.state.bet[self.hand_id]
+
+    @bet.setter
+    def bet(self, amount):
+        self.state.bet[self.hand_id] = amount
+
+    @property
+    def busted(self):
+        return bool(self.state.busted[self.hand_id])
+
+    @busted.setter
+    def busted(self, busted):
+        self.state.busted[self.hand_id] = busted
+
+    @property
+    def from_split(self):
+        return bool(self.state.from_split[self.hand_id])
+
+    @from_split.setter
+    def from_split(self, from_split):
+        self.state.from_split[self.hand_id] = from_split
+
+    @property
+    def hard_total(self):
+        return self.state.hard[self.hand_id]
+
+    @property
+    def aces(self):
+        return self.state.aces[self.hand_id]
+
+    @property
+    def soft(self):
+        return self.state.is_soft(self.hand_id)
+
+    @property
+    def blackjack(self):
+        return self.state.is_blackjack(self.hand_id)
+
+    def add_card(self, card):
+        self.state.add_card(self.hand_id, card.id)
+
+    def remove_card(self, index=-1):
+        return CARDS[self.state.remove_card(self.hand_id, index)]
+
+    def clear(self):
+        self.state.clear_hand(self.hand_id)
+
+    def get_value(self, card_index):
+        return self._cards[card_index].points
+
+    def get_cards(self):
+        return self._cards
+
+    def get_total(self):
+        return self.state.total(self.hand_id)
+
+    def is_soft(self):
+        return self.state.is_soft(self.hand_id)
+
+    def is_busted(self):
+        return self.busted
+
+    def reset(self):
+        self.state.clear_hand(self.hand_id)
+        self.state.bet[self.hand_id] = 0
+
+    def __repr__(self):
+        return f"Hand({self.cards}, Bet: {self.bet}, Busted: {self.busted})"
+
+
+class SeatView(Player):
+    """
+    Player API over one seat of a TableState. The money, betting and
+    ledger logic is Player's; only the balance and the hands live in the
+    arrays. The seat's hand slots are its hand pool (slots), handed out in
+    order for splits and taken back as hands are removed.
+
+    Balances are whole amounts (int64): a fractional payout, such as 3:2 on
+    an odd bet, is rounded down.
+    """
+
+    def __init__(self, state, seat, name, saldo, bus=None, strategy=None):
+        self.id = Player.ids.next()
+        self.state = state
+        self.seat = seat
+        self.name = name
+        self.bus = bus if bus is not None else events.default_bus
+        self.strategy = strategy
+        self.saldo = saldo
+        first = seat * state.hands_per_seat
+        views = [HandView(state, hand_id) for hand_id in range(first, first + state.hands_per_seat)]
+        self.slots = HandPool(self._no_slot)
+        self.slots.free.extend(reversed(views[1:]))
+        self.hands = views[:1]  # Views of the hands in use
+        state.seat_hands[seat] = 1
+        state.clear_hand(first)
+
+    @staticmethod
+    def _no_slot(bet):
+        raise IndexError("No free hand slots for this seat.")
+
+    @property
+    def saldo(self):
+        return self.state.saldo[self.seat]
+
+    @saldo.setter
+    def saldo(self, saldo):
+        self.state.saldo[self.seat] = math.floor(saldo)
+
+    def draw_card(self, deck, num=1, hand_index=0):
+        hand_id = self.hands[hand_index].hand_id
+        state = self.state
+        for _ in range(num):
+            if state.ncards[hand_id] == state.max_cards:  # Checked before the card leaves the deck
+                raise IndexError("Hand is full.")
+            if deck.remaining_cards() > 0:
+                self.state.add_card(hand_id, deck.draw().id)
+            else:
+                self.bus.emit(events.DECK_EMPTY, player_id=self.id)
+                break
+
+    def _acquire_hand(self, bet):
+        hand = self.slots.acquire(bet)
+        self.state.seat_hands[self.seat] = len(self.hands) + 1
+        return hand
+
+    def _release_hand(self, hand):
+        self.slots.release(hand)
+        self.state.seat_hands[self.seat] = len(self.hands)
+
+    def delete_hand(self, hand_index):
+        if hand_index < 0 or hand_index >= len(self.hands):
+            raise IndexError("Invalid hand index.")
+        if len(self.hands) > 1:
+            # Shift the later hands down one slot, then free the last slot
+            for index in range(hand_index, len(self.hands) - 1):
+                self.state.copy_hand(self.hands[index + 1].hand_id, self.hands[index].hand_id)
+            hand_index = len(self.hands) - 1
+        super().delete_hand(hand_index)
+
+
+class TableState:
+    """
+    Flat typed arrays for every seat and hand of a table.
+
+    :param seats: Number of seats
+    :param hands_per_seat: Hand slots per seat (1 + allowed splits)
+    :param max_cards: Card slots per hand
+    """
+
+    def __init__(self, seats, hands_per_seat=4, max_cards=12):
+        self.seats = seats
+        self.hands_per_seat = hands_per_seat
+        self.max_cards = max_cards
+        hands = seats * hands_per_seat
+        self.saldo = array("q", bytes(8 * seats))
+        self.seat_hands = array("b", bytes(seats))  # Hands in use per seat
+        self.bet = array("q", bytes(8 * hands))
+        self.hard = array("h", bytes(2 * hands))  # Totals with Aces as 1
+        self.aces = array("b", bytes(hands))
+        self.ncards = array("b", bytes(hands))
+        self.busted = array("b", bytes(hands))
+        self.from_split = array("b", bytes(hands))
+        self.cards = array("B", bytes(hands * max_cards))
+        self.views = []  # SeatViews by seat
+
+    def add_seat(self, name, saldo, bus=None):
+        """
+        Seats a player and returns the SeatView for BlackJack.add_player.
+        """
+        if len(self.views) == self.seats:
+            raise IndexError("Table is full.")
+        view = SeatView(self, len(self.views), name, saldo, bus)
+        self.views.append(view)
+        return view
+
+    def add_card(self, hand_id, card_id):
+        count = self.ncards[hand_id]
+        if count == self.max_cards:
+            raise IndexError("Hand is full.")
+        self.cards[hand_id * self.max_cards + count] = card_id
+        self.ncards[hand_id] = count + 1
+        card = CARDS[card_id]
+        if card.is_ace:
+            self.hard[hand_id] += 1
+            self.aces[hand_id] += 1
+        else:
+            self.hard[hand_id] += card.points
+        if self.hard[hand_id] > 21:
+            self.busted[hand_id] = 1
+
+    def remove_card(self, hand_id, index=-1):
+        count = self.ncards[hand_id]
+        start = hand_id * self.max_cards
+        if index < 0:
+            index += count
+        if not 0 <= index < count:
+            raise IndexError("pop index out of range")
+        card_id = self.cards[start + index]
+        self.cards[start + index:start + count - 1] = self.cards[start + index + 1:start + count]
+        self.ncards[hand_id] = count - 1
+        card = CARDS[card_id]
+        if card.is_ace:
+            self.hard[hand_id] -= 1
+            self.aces[hand_id] -= 1
+        else:
+            self.hard[hand_id] -= card.points
+        return card_id
+
+    def clear_hand(self, hand_id):
+        self.ncards[hand_id] = 0
+        self.hard[hand_id] = 0
+        self.aces[hand_id] = 0
+        self.busted[hand_id] = 0
+        self.from_split[hand_id] = 0
+
+    def copy_hand(self, source, target):
+        for column in (self.bet, self.hard, self.aces, self.ncards, self.busted, self.from_split):
+            column[target] = column[source]
+        size = self.max_cards
+        self.cards[target * size:(target + 1) * size] = self.cards[source * size:(source + 1) * size]
+
+    def is_soft(self, hand_id):
+        return self.aces[hand_id] > 0 and self.hard[hand_id] <= 11
+
+    def is_blackjack(self, hand_id):
+        return (self.ncards[hand_id] == 2 and self.aces[hand_id] > 0 and self.hard[hand_id] == 11
+                and not self.from_split[hand_id])
+
+    def total(self, hand_id):
+        hard = self.hard[hand_id]
+        return hard + 10 if self.aces[hand_id] and hard <= 11 else hard
+
+    def deal(self, deck, cards=2):
+        """
+        Resets every seat to one hand and deals it cards, seat by seat.
+        """
+        per_seat = self.hands_per_seat
+        for seat, view in enumerate(self.views):
+            view.reset_hands()  # Split slots go back to the seat's pool
+            hand_id = seat * per_seat
+            for _ in range(cards):
+                self.add_card(hand_id, deck.draw().id)
+
+    def totals(self):
+        """
+        Totals of every hand in use, as an array indexed like hand ids
+        (unused slots are 0).
+        """
+        totals = array("h", bytes(2 * len(self.hard)))
+        per_seat = self.hands_per_seat
+        hard = self.hard
+        aces = self.aces
+        for seat in range(len(self.views)):
+            first = seat * per_seat
+            for hand_id in range(first, first + self.seat_hands[seat]):
+                total = hard[hand_id]
+                totals[hand_id] = total + 10 if aces[hand_id] and total <= 11 else total
+        return totals
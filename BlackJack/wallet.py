@@ -0,0 +1,236 @@
+﻿"""
+Shared wallet for players seated at several tables on different threads.
+
+A Wallet keeps one account per person. Every account lives behind one of a
+fixed set of striped locks, so tables working on different accounts do not
+wait for each other, and every operation on one account is atomic.
+
+Bets go through reserve/commit/release: reserving holds money for a round
+(it is no longer available to other tables but still in the balance),
+commit settles the held amount against the round's payout, and release
+returns it unspent.
+
+WalletPlayer is a Player seat whose money lives in a Wallet account, so the
+same account can be seated at many BlackJack tables at once:
+
+    wallet = Wallet()
+    wallet.open("alice", 500)
+    first.add_player(WalletPlayer("Alice", wallet, "alice"))
+    second.add_player(WalletPlayer("Alice", wallet, "alice"))
+"""
+import threading
+
+import events
+from hand import Hand
+from player import Player
+
+
+class Account:
+    __slots__ = ("balance", "reserved")
+
+    def __init__(self, balance):
+        self.balance = balance
+        self.reserved = 0  # Held for rounds in progress
+
+
+class Wallet:
+    """
+    Accounts with atomic, lock-striped operations.
+
+    :param stripes: Number of locks the accounts are spread over
+    """
+
+    def __init__(self, stripes=64):
+        self._locks = tuple(threading.Lock() for _ in range(stripes))
+        self._accounts = {}
+
+    def _lock(self, account_id):
+        return self._locks[hash(account_id) % len(self._locks)]
+
+    def _account(self, account_id):
+        try:
+            return self._accounts[account_id]
+        except KeyError:
+            raise KeyError(f"No account {account_id!r}.") from None
+
+    def open(self, account_id, balance=0):
+        """
+        Opens an account.
+
+        :param account_id: Hashable account ID
+        :param balance: Opening balance
+        """
+        with self._lock(account_id):
+            if account_id in self._accounts:
+                raise ValueError(f"Account {account_id!r} already exists.")
+            self._accounts[account_id] = Account(balance)
+
+    def balance(self, account_id):
+        """
+        Money in the account, including money reserved for rounds in progress.
+        """
+        return self._account(account_id).balance
+
+    def available(self, account_id):
+        """
+        Money in the account that is free to bet.
+        """
+        with self._lock(account_id):
+            account = self._account(account_id)
+            return account.balance - account.reserved
+
+    def deposit(self, account_id, amount):
+        if amount < 0:
+            raise ValueError("Amount must not be negative.")
+        with self._lock(account_id):
+            self._account(account_id).balance += amount
+
+    def withdraw(self, account_id, amount):
+        """
+        Takes money out of the account.
+
+        :return: True if the money was available and withdrawn
+        """
+        if amount < 0:
+            raise ValueError("Amount must not be negative.")
+        with self._lock(account_id):
+            account = self._account(account_id)
+            if account.balance - account.reserved < amount:
+                return False
+            account.balance -= amount
+            return True
+
+    def reserve(self, account_id, amount):
+        """
+        Holds money for a bet.
+
+        :return: True if the money was available and is now held
+        """
+        if amount < 0:
+            raise ValueError("Amount must not be negative.")
+        with self._lock(account_id):
+            account = self._account(account_id)
+            if account.balance - account.reserved < amount:
+                return False
+            account.reserved += amount
+            return True
+
+    def commit(self, account_id, amount, payout=0):
+        """
+        Settles held money: the held amount is spent and payout is paid in.
+
+        :param amount: Held amount to settle
+        :param payout: Amount won back, stakes included
+        """
+        with self._lock(account_id):
+            account = self._account(account_id)
+            if amount > account.reserved:
+                raise ValueError("Cannot commit more than is reserved.")
+            account.reserved -= amount
+            account.balance += payout - amount
+
+    def release(self, account_id, amount):
+        """
+        Returns held money unspent.
+        """
+        with self._lock(account_id):
+            account = self._account(account_id)
+            if amount > account.reserved:
+                raise ValueError("Cannot release more than is reserved.")
+            account.reserved -= amount
+
+    def total(self):
+        """
+        Consistent sum of all balances (takes every lock).
+
+        :return: Tuple of (total balance, total reserved)
+        """
+        for lock in self._locks:
+            lock.acquire()
+        try:
+            accounts = list(self._accounts.values())
+            return sum(account.balance for account in accounts), sum(account.reserved for account in accounts)
+        finally:
+            for lock in reversed(self._locks):
+                lock.release()
+
+
+class WalletPlayer(Player):
+    """
+    A player seat that bets from a shared Wallet account.
+
+    Deducting money (add_pot, double, split) reserves it in the wallet;
+    settle() commits the seat's reservations against the payout, and
+    reset_hands() releases reservations of a round that was never settled.
+
+    :param name: Name of the player
+    :param wallet: Wallet with the account
+    :param account_id: Account to bet from
+    :param bus: Event bus for player events
+    :param strategy: Strategy that plays the seat automatically
+    """
+
+    def __init__(self, name, wallet, account_id, bus=None, strategy=None):
+        self.id = Player.ids.next()
+        self.name = name
+        self.wallet = wallet
+        self.account_id = account_id
+        self.staked = 0  # Reserved by this seat in the current round
+        self.hands = [Hand()]
+        self.bus = bus if bus is not None else events.default_bus
+        self.strategy = strategy
+
+    @property
+    def saldo(self):
+        return self.wallet.available(self.account_id)
+
+    def add_money(self, amount, reason="add_money"):
+        """
+        Pays money in, or reserves it for the current round if negative.
+        Only deposits change the account's balance, so only they are logged
+        to the ledger; a reservation is logged when it is settled.
+
+        :param amount: Amount to add (negative for deductions)
+        :param reason: What the change is for, as logged to the player's ledger
+        """
+        if amount >= 0:
+            self.wallet.deposit(self.account_id, amount)
+            self._record(amount, reason)
+        elif self.wallet.reserve(self.account_id, -amount):
+            self.staked -= amount
+        else:
+            raise ValueError("Insufficient funds.")
+
+    def settle(self, payout):
+        self.wallet.commit(self.account_id, self.staked, payout)
+        self._record(payout - self.staked, "settle")
+        self.staked = 0
+
+    def ledger_row(self, amount, reason):
+        """
+        Row of a balance change for the ledger; the balance is the shared
+        account's, so the row is kept by account.
+        """
+        return None, self.account_id, self.name, amount, self.wallet.balance(self.account_id), reason
+
+    def release(self):
+        """
+        Returns the money reserved in the current round.
+        """
+        self.wallet.release(self.account_id, self.staked)
+        self.staked = 0
+
+    def reset_hands(self):
+        if self.staked:
+            self.release()
+        super().reset_hands()
+
+    def bet(self, bet_amount):
+        if bet_amount <= 0:
+            self.bus.emit(events.BET_REJECTED, player_id=self.id, message="Bet amount must be greater than zero.")
+            return -1
+        if not self.wallet.reserve(self.account_id, bet_amount):
+            self.bus.emit(events.BET_REJECTED, player_id=self.id, message="Insufficient funds for this bet.")
+            return -1
+        self.staked += bet_amount
+        return bet_amount
@@ -1,23 +1,25 @@
-﻿
+﻿import events
 
 
-def hand_index_check(hand_index, player):
+def _failed(bus, check, player, message):
+    if bus is None:
+        bus = events.default_bus
+    bus.emit(events.CHECK_FAILED, check=check, player_id=player.id, message=message)
+    return False
+
+def hand_index_check(hand_index, player, bus=None):
     if hand_index < 0 or hand_index >= len(player.hands):
-        print(f"Invalid hand index for {player.name}. Player has {len(player.hands)} hands.")
-        return False
+        return _failed(bus, "hand_index", player,
+                       f"Invalid hand index for {player.name}. Player has {len(player.hands)} hands.")
     return True
 
-def money_check(bet_amount, player):
-    if bet_amount > player.saldo:
-        print("insufficient funds")
-        return False
-    return True
+def money_failed(player, bus=None):
+    # Taking the money is the funds check, so this only reports a bet that could not be taken
+    return _failed(bus, "money", player, "insufficient funds")
 
-def split_check(player, hand_index):
+def split_check(player, hand_index, bus=None):
     if len(player.hands[hand_index].cards)>2:
-        print("hand too large")
-        return False
-    if player.hands[hand_index].get_value(0) == player.hands[hand_index].get_value(1):
-        print("different value pair")
-        return False
+        return _failed(bus, "split", player, "hand too large")
+    if player.hands[hand_index].get_value(0) != player.hands[hand_index].get_value(1):
+        return _failed(bus, "split", player, "different value pair")
     return True
\ No newline at end of file